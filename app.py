@@ -3,33 +3,263 @@
 Flask веб-приложение для отображения задач Jira из PostgreSQL
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, g
 from flask_cors import CORS
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
+import json
+import base64
+from decimal import Decimal, InvalidOperation
+from contextlib import contextmanager
+from functools import wraps
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timezone
 import calendar
+from db_pool import pg_config_from_env, process_pool
+import data_version
+from response_cache import process_cache
+from json_stream import iter_query, stream_object
+import compression
+from graph_layout import GraphLayout
+from graph_index import GraphIndex, ISSUES_SQL as GRAPH_ISSUES_SQL, LINKS_SQL as GRAPH_LINKS_SQL
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-DB_CONFIG = {
-    'host': os.getenv('PGHOST'),
-    'user': os.getenv('PGUSER'),
-    'password': os.getenv('PGPASSWORD'),
-    'database': os.getenv('PGDATABASE'),
-    'port': os.getenv('PGPORT', 5432)
-}
+DB_CONFIG = pg_config_from_env()
+
+# Подключений в пуле на процесс (воркер gunicorn); 0 - без пула,
+# новое подключение на каждый запрос
+PG_POOL_SIZE = int(os.getenv('PG_POOL_SIZE', 4))
+
+# Кэш готовых ответов агрегирующих маршрутов на процесс: число ответов
+# (0 - кэш отключен) и предельный объем
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+RESPONSE_CACHE_MAX_MB = int(os.getenv('RESPONSE_CACHE_MAX_MB', 64))
+
+# Сжатие ответов по Accept-Encoding (compression.py); 0 - выключить, если
+# ответы уже сжимает reverse proxy
+COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', '1') != '0'
+
+# Типы связей (link_type_name через запятую), которые означают блокировку:
+# по ним считаются блокеры, циклы и критический путь (graph_index.py)
+GRAPH_BLOCKING_LINK_TYPES = [
+    name.strip() for name in os.getenv('GRAPH_BLOCKING_LINK_TYPES', 'Blocks').split(',') if name.strip()
+]
+
+
+# Текущий спринт - активный (из последних начавшихся), в котором есть задачи;
+# если активного нет - последний по дате начала. Порядок совпадает с
+# индексом idx_sprints_current, поэтому это проход по индексу, а не по задачам
+CURRENT_SPRINT_SQL = """
+    SELECT s.id, s.name FROM jira_sprints s
+    WHERE EXISTS (SELECT 1 FROM jira_issues i WHERE i.sprint_id = s.id)
+    ORDER BY (s.state = 'ACTIVE') DESC, s.start_date DESC NULLS LAST, s.id DESC
+    LIMIT 1
+"""
 
 
 def get_db_connection():
     return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
 
 
+@contextmanager
+def db_connection():
+    """Подключение из пула процесса.
+
+    Подключение возвращается в пул и при исключении (незавершенная
+    транзакция откатывается), а оборванное - закрывается.
+    """
+    pool = process_pool(PG_POOL_SIZE, cursor_factory=RealDictCursor, **DB_CONFIG)
+    if pool is None:
+        conn = get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+    with pool.connection() as conn:
+        yield conn
+
+
+@contextmanager
+def db_cursor():
+    """Курсор (RealDictCursor) на подключении из пула процесса"""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            yield cursor
+
+
+def stream_response(fields, snapshot=False):
+    """Потоковый JSON-ответ (json_stream.py).
+
+    fields(conn) возвращает пары (ключ, значение) объекта ответа; значения
+    - обычно iter_query по тому же подключению. Подключение занято, пока
+    клиент не дочитает ответ. snapshot=True - все запросы из одного снимка
+    БД (REPEATABLE READ).
+    """
+    def generate():
+        with db_connection() as conn:
+            if snapshot:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            yield from stream_object(fields(conn))
+    return Response(generate(), mimetype='application/json')
+
+
+def sql_date(column, alias=None):
+    """Дата в формате format_date, посчитанная в SQL (для потоковых ответов)"""
+    return f"COALESCE(to_char({column}, 'DD.MM.YYYY HH24:MI'), '-') AS {alias or column}"
+
+
+class BadArgument(ValueError):
+    """Некорректный параметр запроса - ответ 400"""
+
+
+@app.errorhandler(BadArgument)
+def bad_argument(e):
+    return jsonify({'error': str(e)}), 400
+
+
+def int_arg(name, default, low=None, high=None):
+    """Целый параметр запроса, ограниченный [low, high]"""
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise BadArgument(f"{name} должен быть целым числом")
+    if low is not None:
+        value = max(low, value)
+    if high is not None:
+        value = min(value, high)
+    return value
+
+
+# Входит в ETag: после выкладки новой версии app.py (другой формат ответов)
+# браузеры не получат 304 на старые данные
+ETAG_SALT = f"{os.path.getmtime(__file__):.0f}"
+
+
+def read_versions(scopes):
+    """Версии областей данных: {scope: (version, changed_at)}.
+
+    None, если таблицы data_version еще нет (схема не обновлена) - тогда
+    ответы отдаются без ETag.
+    """
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT scope, version, changed_at FROM data_version WHERE scope = ANY(%s)",
+                (list(scopes),)
+            )
+            return {row['scope']: (row['version'], row['changed_at']) for row in cursor.fetchall()}
+    except psycopg2.ProgrammingError:
+        return None
+
+
+def response_cache():
+    return process_cache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_MB * 1024 * 1024, **DB_CONFIG)
+
+
+def versioned(*scopes, cache=False):
+    """Условный GET для маршрута, данные которого зависят от областей scopes.
+
+    ETag и Last-Modified строятся из data_version до выполнения запросов
+    маршрута; если у браузера актуальная копия (If-None-Match или
+    If-Modified-Since), сразу отвечаем 304 без обращения к таблицам.
+    Cache-Control: no-cache - браузер хранит ответ, но каждый раз сверяет его.
+
+    cache=True - готовый ответ сохраняется в кэше процесса
+    (response_cache.py) по маршруту, параметрам и ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = read_versions(scopes)
+            # Маршруту тоже могут понадобиться версии (см. get_graph_data)
+            g.data_versions = versions
+            if not versions:
+                return view(*args, **kwargs)
+
+            etag = '-'.join(
+                f"{scope}{versions[scope][0]}.{versions[scope][1].timestamp():.0f}"
+                for scope in scopes if scope in versions
+            ) + f"-{ETAG_SALT}"
+            last_modified = max(changed_at for _, changed_at in versions.values()).replace(microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                if since is not None and since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                not_modified = since is not None and last_modified <= since
+            responses = response_cache() if cache else None
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), etag)
+            cached = responses.get(key) if responses is not None and not not_modified else None
+            if not_modified:
+                response = Response(status=304)
+            else:
+                if cached is None:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if responses is not None:
+                        cached = responses.put(key, response.get_data(), response.mimetype, scopes)
+                if cached is not None:
+                    response = cached_response(responses, key, cached)
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_response(responses, key, entry):
+    """Ответ из кэша. Сжатый вариант тела считается один раз на способ
+    сжатия и хранится в кэше рядом с ответом."""
+    response = Response(entry.body, mimetype=entry.mimetype)
+    response.vary.add('Accept-Encoding')
+    encoding = compression.negotiate(request.accept_encodings) if COMPRESS_RESPONSES else None
+    if encoding is None or len(entry.body) < compression.MIN_SIZE:
+        return response
+    data = entry.variants.get(encoding)
+    if data is None:
+        data = compression.compress(entry.body, encoding, cached=True)
+        responses.add_variant(key, entry, encoding, data)
+    else:
+        compression.count_cached(encoding, len(entry.body), len(data))
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Сжимает ответы, которые еще не сжаты (из кэша они приходят готовыми)"""
+    if (not COMPRESS_RESPONSES or response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not compression.is_compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = compression.negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compression.compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < compression.MIN_SIZE:
+            return response
+        response.set_data(compression.compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
 def format_date(date_obj):
     if date_obj:
         return date_obj.strftime('%d.%m.%Y %H:%M')
@@ -47,128 +277,249 @@ def index():
     return render_template('index.html', v=datetime.now().timestamp())
 
 
+# Чем заменяется NULL в сортировке по updated_date
+NULL_DATE_SORT = '-infinity'
+
+# Сортировки таблицы задач: параметр sort -> выражение ORDER BY. NULL
+# заменяется значением, чтобы ключ страницы (значение, issue_key) всегда был
+# сравним; у каждого выражения есть индекс (выражение, issue_key) - idx_issues_page_*
+ISSUE_SORTS = {
+    'updated_date': f"COALESCE(updated_date, '{NULL_DATE_SORT}'::timestamp)",
+    'issue_key': 'issue_key',
+    'summary': "COALESCE(summary, '')",
+    'assignee': "COALESCE(assignee, '')",
+    'time_original_estimate': 'COALESCE(time_original_estimate, 0)',
+    'time_spent': 'COALESCE(time_spent, 0)',
+}
+
+# Фильтры: параметр запроса -> колонка (точное совпадение)
+ISSUE_FILTERS = {
+    'type': 'issue_type',
+    'status': 'status',
+    'priority': 'priority',
+    'sprint': 'sprint',
+    'assignee': 'assignee',
+}
+
+ISSUES_PAGE_SIZE = 100
+ISSUES_MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value, issue_key):
+    """Непрозрачный ключ следующей страницы: последнее значение сортировки и issue_key"""
+    if sort_value == datetime.min:
+        # '-infinity' (задача без updated_date) psycopg2 отдает как
+        # datetime.min, а это другая дата - сохраняем саму бесконечность
+        sort_value = NULL_DATE_SORT
+    elif isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    elif isinstance(sort_value, Decimal):
+        sort_value = str(sort_value)
+    raw = json.dumps([sort_value, issue_key], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor, sort):
+    """(значение сортировки, issue_key) из ключа страницы.
+
+    Значения приводятся к типу колонки sort; испорченный или подделанный
+    ключ - ValueError (до запроса к БД, а не ошибкой в keyset-запросе).
+    """
+    decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(decoded, list) or len(decoded) != 2:
+        raise ValueError('cursor должен быть парой [значение, ключ]')
+    sort_value, issue_key = decoded
+    # encode_cursor пишет все значения сортировки строками
+    if not isinstance(issue_key, str) or not isinstance(sort_value, str):
+        raise ValueError('cursor: значения должны быть строками')
+    if sort == 'updated_date':
+        if sort_value != NULL_DATE_SORT:
+            sort_value = datetime.fromisoformat(sort_value)
+    elif sort in ('time_original_estimate', 'time_spent'):
+        try:
+            sort_value = Decimal(sort_value)
+        except InvalidOperation:
+            raise ValueError(f"cursor: не число: {sort_value!r}")
+        if not sort_value.is_finite():
+            raise ValueError(f"cursor: не число: {sort_value!r}")
+    return sort_value, issue_key
+
+
 @app.route('/api/issues')
+@versioned(data_version.JIRA)
 def get_issues():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    """Страница задач с фильтрами и сортировкой.
+
+    Параметры: type, status, priority, sprint, assignee (точное совпадение),
+    q (подстрока ключа, описания или исполнителя), sort (ISSUE_SORTS,
+    по умолчанию updated_date), dir (asc/desc), limit, cursor (next_cursor
+    предыдущей страницы). Страницы по ключу (keyset): следующая страница
+    продолжает сортировку с последней строки, а не пропускает OFFSET строк.
+    """
+    sort = request.args.get('sort', 'updated_date')
+    if sort not in ISSUE_SORTS:
+        return jsonify({'error': f"Неизвестная сортировка: {sort}"}), 400
+    direction = request.args.get('dir', 'desc' if sort == 'updated_date' else 'asc').lower()
+    if direction not in ('asc', 'desc'):
+        return jsonify({'error': 'dir должен быть asc или desc'}), 400
+    limit = int_arg('limit', ISSUES_PAGE_SIZE, 1, ISSUES_MAX_PAGE_SIZE)
+
+    sort_expr = ISSUE_SORTS[sort]
+    order_exprs = ['issue_key'] if sort == 'issue_key' else [sort_expr, 'issue_key']
+    where, params = [], []
+    for arg, column in ISSUE_FILTERS.items():
+        value = request.args.get(arg)
+        if value:
+            where.append(f"{column} = %s")
+            params.append(value)
+    query = request.args.get('q', '').strip()
+    if query:
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        where.append("(issue_key ILIKE %s OR summary ILIKE %s OR assignee ILIKE %s)")
+        params.extend([pattern] * 3)
+    if request.args.get('cursor'):
+        try:
+            sort_value, last_key = decode_cursor(request.args['cursor'], sort)
+        except (ValueError, TypeError, InvalidOperation):
+            return jsonify({'error': 'Некорректный cursor'}), 400
+        comparison = '>' if direction == 'asc' else '<'
+        if sort == 'issue_key':
+            where.append(f"issue_key {comparison} %s")
+            params.append(last_key)
+        else:
+            # '-infinity' из ключа страницы - строка, тип задаем явно
+            placeholder = '%s::timestamp' if sort == 'updated_date' else '%s'
+            where.append(f"({sort_expr}, issue_key) {comparison} ({placeholder}, %s)")
+            params.extend([sort_value, last_key])
+
+    sql = f"""
         SELECT
             issue_key, issue_type, status, summary, assignee, priority,
-            created_date, updated_date, time_original_estimate, time_spent,
-            sprint, epic_link, labels, linked_issues, last_synced
+            {sql_date('created_date')}, {sql_date('updated_date')},
+            time_original_estimate, time_spent,
+            sprint, epic_link, labels, linked_issues, {sql_date('last_synced')},
+            {sort_expr} AS sort_value
         FROM jira_issues
-        ORDER BY updated_date DESC
-    """)
-    issues = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    for issue in issues:
-        issue['created_date'] = format_date(issue['created_date'])
-        issue['updated_date'] = format_date(issue['updated_date'])
-        issue['last_synced']  = format_date(issue['last_synced'])
-    return jsonify(issues)
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {', '.join(f'{expr} {direction.upper()}' for expr in order_exprs)}
+        LIMIT %s
+    """
+    params.append(limit + 1)
+
+    # Страница отдается потоком; лишняя (limit + 1) строка только говорит,
+    # что есть следующая страница, - next_cursor строится по последней отданной
+    page = {'last': None, 'next_cursor': None}
+
+    def issues(conn):
+        for index, issue in enumerate(iter_query(conn, 'issues_page', sql, tuple(params))):
+            if index == limit:
+                page['next_cursor'] = encode_cursor(*page['last'])
+                break
+            page['last'] = (issue.pop('sort_value'), issue['issue_key'])
+            yield issue
+
+    return stream_response(lambda conn: [
+        ('issues', issues(conn)),
+        ('next_cursor', lambda: page['next_cursor']),
+    ])
+
+
+def issue_filters_data(cursor):
+    """Значения для выпадающих фильтров таблицы задач"""
+    filters = {}
+    for arg, column in ISSUE_FILTERS.items():
+        cursor.execute(f"""
+            SELECT DISTINCT {column} AS value FROM jira_issues
+            WHERE {column} IS NOT NULL ORDER BY {column}
+        """)
+        filters[arg] = [row['value'] for row in cursor.fetchall()]
+    filters['sprint'].reverse()
+    return filters
+
+
+@app.route('/api/issue-filters')
+@versioned(data_version.JIRA)
+def get_issue_filters():
+    with db_cursor() as cursor:
+        return jsonify(issue_filters_data(cursor))
 
 
 @app.route('/api/current-sprint-issues')
+@versioned(data_version.JIRA)
 def get_current_sprint_issues():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT sprint FROM jira_issues
-        WHERE sprint IS NOT NULL
-        GROUP BY sprint
-        ORDER BY CAST(SUBSTR(sprint, STRPOS(sprint, '#') + 1) AS INTEGER) DESC
-        LIMIT 1
-    """)
-    current_sprint = cursor.fetchone()
-    if not current_sprint:
-        cursor.close()
-        conn.close()
-        return jsonify({'error': 'Нет данных по спринтам', 'issues': []})
-    sprint_name = current_sprint['sprint']
-    cursor.execute("""
-        SELECT
-            issue_key, issue_type, status, summary, assignee, priority,
-            time_original_estimate, time_spent, sprint, linked_issues
-        FROM jira_issues
-        WHERE sprint = %s
-        ORDER BY
-            CASE
-                WHEN status = 'В работе' THEN 1
-                WHEN status = 'Открыто'  THEN 2
-                WHEN status = 'Готово'   THEN 3
-                ELSE 4
-            END, updated_date DESC
-    """, (sprint_name,))
-    issues = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with db_cursor() as cursor:
+        cursor.execute(CURRENT_SPRINT_SQL)
+        current_sprint = cursor.fetchone()
+        if not current_sprint:
+            return jsonify({'error': 'Нет данных по спринтам', 'issues': []})
+        sprint_name = current_sprint['name']
+        cursor.execute("""
+            SELECT
+                issue_key, issue_type, status, summary, assignee, priority,
+                time_original_estimate, time_spent, sprint, linked_issues
+            FROM jira_issues
+            WHERE sprint_id = %s
+            ORDER BY
+                CASE
+                    WHEN status = 'В работе' THEN 1
+                    WHEN status = 'Открыто'  THEN 2
+                    WHEN status = 'Готово'   THEN 3
+                    ELSE 4
+                END, updated_date DESC
+        """, (current_sprint['id'],))
+        issues = cursor.fetchall()
     return jsonify({'sprint_name': sprint_name, 'issues': issues})
 
 
-@app.route('/api/statistics')
-def get_statistics():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as total FROM jira_issues")
-    total = cursor.fetchone()['total']
-    cursor.execute("""
-        SELECT status, COUNT(*) as count FROM jira_issues
-        GROUP BY status ORDER BY count DESC
-    """)
+def statistics_data(cursor):
+    # Все цифры - из сводок rollup_*, которые jira_sync.py пересчитывает
+    # после записи, а не агрегаты по jira_issues на каждый запрос
+    cursor.execute("SELECT issues, links FROM rollup_totals")
+    totals = cursor.fetchone()
+    total, total_links = totals['issues'], totals['links']
+    cursor.execute("SELECT status, count FROM rollup_status ORDER BY count DESC")
     by_status = cursor.fetchall()
-    cursor.execute("""
-        SELECT issue_type, COUNT(*) as count FROM jira_issues
-        GROUP BY issue_type ORDER BY count DESC
-    """)
+    cursor.execute("SELECT issue_type, count FROM rollup_type ORDER BY count DESC")
     by_type = cursor.fetchall()
     cursor.execute("""
-        SELECT sprint, COUNT(*) as count,
-               ROUND(SUM(time_original_estimate), 2) as total_estimate,
-               ROUND(SUM(time_spent), 2) as total_spent
-        FROM jira_issues WHERE sprint IS NOT NULL
+        SELECT sprint, SUM(total_tasks)::int as count,
+               ROUND(SUM(total_estimate), 2) as total_estimate,
+               ROUND(SUM(total_spent), 2) as total_spent
+        FROM rollup_sprint WHERE sprint IS NOT NULL
         GROUP BY sprint ORDER BY sprint DESC
     """)
     by_sprint = cursor.fetchall()
-    cursor.execute("SELECT COUNT(*) as total FROM jira_issue_links")
-    total_links = cursor.fetchone()['total']
-    cursor.close()
-    conn.close()
-    return jsonify({
+    return {
         'total': total, 'total_links': total_links,
         'by_status': by_status, 'by_type': by_type, 'by_sprint': by_sprint
-    })
+    }
 
 
-@app.route('/api/current-sprint-stats')
-def get_current_sprint_stats():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT stats.* FROM (
-            SELECT sprint,
-                COUNT(*) as total_tasks,
-                COUNT(CASE WHEN status = 'Готово'   THEN 1 END) as completed_tasks,
-                COUNT(CASE WHEN status = 'В работе' THEN 1 END) as in_progress_tasks,
-                COUNT(CASE WHEN status = 'Открыто'  THEN 1 END) as open_tasks,
-                COALESCE(SUM(time_original_estimate), 0) as total_estimated,
-                COALESCE(SUM(time_spent), 0) as total_spent,
-                COALESCE(SUM(CASE WHEN status = 'Готово' THEN time_spent ELSE 0 END), 0) as completed_spent
-            FROM jira_issues WHERE sprint IS NOT NULL
-            GROUP BY sprint
-        ) as stats
-        WHERE stats.sprint = (
-            SELECT sprint FROM jira_issues WHERE sprint IS NOT NULL
-            GROUP BY sprint
-            ORDER BY CAST(SUBSTR(sprint, STRPOS(sprint, '#') + 1) AS INTEGER) DESC
-            LIMIT 1
-        )
+@app.route('/api/statistics')
+@versioned(data_version.JIRA, cache=True)
+def get_statistics():
+    with db_cursor() as cursor:
+        return jsonify(statistics_data(cursor))
+
+
+def current_sprint_stats_data(cursor):
+    cursor.execute(f"""
+        WITH current_sprint AS ({CURRENT_SPRINT_SQL})
+        SELECT s.name as sprint,
+            SUM(r.total_tasks)::int as total_tasks,
+            SUM(r.completed_tasks)::int as completed_tasks,
+            SUM(r.in_progress_tasks)::int as in_progress_tasks,
+            SUM(r.open_tasks)::int as open_tasks,
+            COALESCE(SUM(r.total_estimate), 0) as total_estimated,
+            COALESCE(SUM(r.total_spent), 0) as total_spent,
+            COALESCE(SUM(r.completed_spent), 0) as completed_spent
+        FROM current_sprint s
+        JOIN rollup_sprint r ON r.sprint_id = s.id
+        GROUP BY s.name
     """)
     result = cursor.fetchone()
-    cursor.close()
-    conn.close()
     if not result:
-        return jsonify({'error': 'Нет данных по спринтам', 'sprint_name': None})
+        return {'error': 'Нет данных по спринтам', 'sprint_name': None}
     SPRINT_CAPACITY = 80
     total_estimated  = float(result['total_estimated'])
     total_spent      = float(result['total_spent'])
@@ -186,7 +537,7 @@ def get_current_sprint_stats():
         workload_status = 'normal'
     else:
         workload_status = 'light'
-    return jsonify({
+    return {
         'sprint_name': result['sprint'],
         'sprint_capacity': SPRINT_CAPACITY,
         'total_tasks': result['total_tasks'],
@@ -202,65 +553,380 @@ def get_current_sprint_stats():
         'workload_percent': round(workload_percent, 1),
         'time_used_percent': round(time_used_percent, 1),
         'workload_status': workload_status
+    }
+
+
+@app.route('/api/current-sprint-stats')
+@versioned(data_version.JIRA, cache=True)
+def get_current_sprint_stats():
+    with db_cursor() as cursor:
+        return jsonify(current_sprint_stats_data(cursor))
+
+
+# Время последней успешной синхронизации - по частичному индексу
+# idx_sync_runs_last_ok, а не по всей jira_issues: с тех пор как
+# неизменившиеся задачи не перезаписываются, MAX(last_synced) - время
+# последнего изменения данных, а не синхронизации
+LAST_SYNC_SQL = """
+SELECT MAX(finished_at) AS last_synced
+FROM sync_runs
+WHERE status = 'ok' AND mode IN ('full', 'incremental')
+"""
+
+
+@app.route('/api/bootstrap')
+@versioned(data_version.JIRA, data_version.SYNC, cache=True)
+def get_bootstrap():
+    """Все, что нужно для первого экрана дашборда, одним запросом: карточки,
+    текущий спринт и значения фильтров. Список задач страница грузит
+    отдельно, через /api/issues.
+
+    Данные читаются одним подключением из одного снимка БД (REPEATABLE
+    READ), поэтому цифры согласованы, даже если синхронизация идет прямо
+    сейчас.
+    """
+    with db_cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        statistics = statistics_data(cursor)
+        current_sprint = current_sprint_stats_data(cursor)
+        filters = issue_filters_data(cursor)
+        cursor.execute("SELECT to_regclass('sync_runs') IS NOT NULL AS exists")
+        last_synced = None
+        if cursor.fetchone()['exists']:
+            cursor.execute(LAST_SYNC_SQL)
+            last_synced = cursor.fetchone()['last_synced']
+    return jsonify({
+        'statistics': statistics,
+        'current_sprint': current_sprint,
+        'issue_filters': filters,
+        'last_synced': format_date(last_synced) if last_synced else None,
     })
 
 
 @app.route('/api/issue/<issue_key>')
+@versioned(data_version.JIRA)
 def get_issue_details(issue_key):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM jira_issues WHERE issue_key = %s", (issue_key,))
-    issue = cursor.fetchone()
-    if not issue:
-        cursor.close()
-        conn.close()
-        return jsonify({'error': 'Issue not found'}), 404
-    cursor.execute("""
-        SELECT target_issue_key, link_type_name, direction, direction_label,
-               target_summary, target_status, target_priority
-        FROM jira_issue_links WHERE source_issue_key = %s
-    """, (issue_key,))
-    links = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with db_cursor() as cursor:
+        cursor.execute("SELECT * FROM jira_issues WHERE issue_key = %s", (issue_key,))
+        issue = cursor.fetchone()
+        if not issue:
+            return jsonify({'error': 'Issue not found'}), 404
+        cursor.execute("""
+            SELECT target_issue_key, link_type_name, direction, direction_label,
+                   target_summary, target_status, target_priority
+            FROM jira_issue_links WHERE source_issue_key = %s
+        """, (issue_key,))
+        links = cursor.fetchall()
     issue['created_date'] = format_date(issue['created_date'])
     issue['updated_date'] = format_date(issue['updated_date'])
     issue['last_synced']  = format_date(issue['last_synced'])
     return jsonify({'issue': issue, 'links': links})
 
 
+EPIC_TYPES = ('Эпик', 'Epic', 'эпик', 'epic')
+DONE_STATUSES = ('Готово', 'Закрыта', 'Done', 'Closed')
+
+# Раскладка (graph_layout.py) и индекс (graph_index.py) графа связей, свои
+# у каждого процесса; пересчитываются при смене версии данных jira
+graph_layouts = GraphLayout()
+link_graphs = GraphIndex(GRAPH_BLOCKING_LINK_TYPES, DONE_STATUSES)
+
+
+# Предел limit списков компонент и циклов
+GRAPH_LIST_LIMIT = 1000
+
+
+def jira_version():
+    """Версия данных jira текущего запроса (ее читает versioned) или None"""
+    versions = g.get('data_versions')
+    return versions.get(data_version.JIRA) if versions else None
+
+
+def load_link_graph(conn):
+    """Строки задач и связей для построения индекса графа"""
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+        cursor.execute(GRAPH_ISSUES_SQL)
+        issues = cursor.fetchall()
+        cursor.execute(GRAPH_LINKS_SQL)
+        links = cursor.fetchall()
+    return issues, links
+
+
+def current_link_graph():
+    """Индекс графа связей для версии данных текущего запроса"""
+    def load():
+        with db_connection() as conn:
+            return load_link_graph(conn)
+    return link_graphs.get(jira_version(), load)
+
+
 @app.route('/api/graph')
+@versioned(data_version.JIRA)
 def get_graph_data():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT i.issue_key, i.summary, i.status, i.issue_type,
-               i.priority, i.assignee, i.sprint
-        FROM jira_issues i
-        WHERE i.issue_key IN (
-            SELECT DISTINCT source_issue_key FROM jira_issue_links
-            UNION
-            SELECT DISTINCT target_issue_key FROM jira_issue_links
-        )
-        OR LOWER(i.issue_type) LIKE '%epic%'
-        OR LOWER(i.issue_type) = 'эпик'
-    """)
-    nodes = cursor.fetchall()
-    cursor.execute("""
-        SELECT source_issue_key, target_issue_key, link_type_name,
-               direction_label, direction, target_status, target_priority
-        FROM jira_issue_links
-    """)
-    edges = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify({'nodes': nodes, 'edges': edges})
+    """Граф связей: задачи со связями и эпики (список узлов - из индекса
+    графа), у узлов - координаты x, y из раскладки на сервере"""
+    version = jira_version()
+
+    def nodes(conn):
+        graph = link_graphs.get(version, lambda: load_link_graph(conn))
+        keys = graph.graph_keys()
+        positions = graph_layouts.positions(version, lambda: (keys, graph.link_pairs()))
+        for node in iter_query(conn, 'graph_nodes', """
+            SELECT issue_key, summary, status, issue_type, priority, assignee, sprint
+            FROM jira_issues
+            WHERE issue_key = ANY(%s)
+        """, (keys,)):
+            position = positions.get(node['issue_key'])
+            if position is not None:
+                node['x'], node['y'] = position
+            yield node
+
+    return stream_response(lambda conn: [
+        ('nodes', nodes(conn)),
+        ('edges', iter_query(conn, 'graph_edges', """
+            SELECT source_issue_key, target_issue_key, link_type_name,
+                   direction_label, direction, target_status, target_priority
+            FROM jira_issue_links
+        """)),
+    ], snapshot=True)
+
+
+@app.route('/api/graph/components')
+@versioned(data_version.JIRA)
+def get_graph_components():
+    """Компоненты связности графа (по всем типам связей) от больших к
+    меньшим. Параметры: min_size (по умолчанию 2), limit (50); issue -
+    только компонента этой задачи."""
+    min_size = int_arg('min_size', 2, 1)
+    limit = int_arg('limit', 50, 1, GRAPH_LIST_LIMIT)
+    graph = current_link_graph()
+    issue_key = request.args.get('issue')
+    if issue_key:
+        if issue_key not in graph.ids:
+            return jsonify({'error': 'Issue not found'}), 404
+        issues = graph.component_issues(int(graph.component[graph.ids[issue_key]]))
+        return jsonify({'issue_key': issue_key, 'size': len(issues), 'issues': issues})
+    return jsonify(graph.components(min_size=min_size, limit=limit))
+
+
+@app.route('/api/graph/blockers/<issue_key>')
+@versioned(data_version.JIRA)
+def get_issue_blockers(issue_key):
+    """Все задачи, которые блокируют задачу, напрямую или через цепочку"""
+    graph = current_link_graph()
+    if issue_key not in graph.ids:
+        return jsonify({'error': 'Issue not found'}), 404
+    return jsonify({'issue_key': issue_key, 'blockers': graph.transitive(graph.ids[issue_key], dependents=False)})
+
+
+@app.route('/api/graph/dependents/<issue_key>')
+@versioned(data_version.JIRA)
+def get_issue_dependents(issue_key):
+    """Все задачи, которые задача блокирует, напрямую или через цепочку"""
+    graph = current_link_graph()
+    if issue_key not in graph.ids:
+        return jsonify({'error': 'Issue not found'}), 404
+    return jsonify({'issue_key': issue_key, 'dependents': graph.transitive(graph.ids[issue_key], dependents=True)})
+
+
+@app.route('/api/graph/cycles')
+@versioned(data_version.JIRA)
+def get_blocking_cycles():
+    """Циклы блокировок: группы задач, которые блокируют друг друга"""
+    limit = int_arg('limit', 50, 1, GRAPH_LIST_LIMIT)
+    return jsonify(current_link_graph().cycles_list(limit=limit))
+
+
+@app.route('/api/graph/critical-path')
+@versioned(data_version.JIRA)
+def get_critical_path():
+    """Самая тяжелая по оставшейся оценке цепочка блокировок; issue - цепочка,
+    которая ведет к этой задаче"""
+    graph = current_link_graph()
+    issue_key = request.args.get('issue')
+    if issue_key and issue_key not in graph.ids:
+        return jsonify({'error': 'Issue not found'}), 404
+    return jsonify(graph.critical_path(graph.ids[issue_key] if issue_key else None))
+
+
+# Окрестность задачи в графе связей: глубина по умолчанию и предельная,
+# ограничения на число узлов и связей в ответе
+NEIGHBORHOOD_DEPTH = 2
+NEIGHBORHOOD_MAX_DEPTH = 4
+NEIGHBORHOOD_MAX_NODES = 200
+NEIGHBORHOOD_MAX_EDGES = 1000
+NEIGHBORHOOD_NODES_LIMIT = 2000
+NEIGHBORHOOD_EDGES_LIMIT = 10000
+
+# Обход связей в обе стороны от задачи (связь хранится у задачи-источника,
+# у второй задачи - своя встречная строка, если та синхронизирована).
+# UNION убирает повторы (задача, глубина), поэтому на каждом шаге строк не
+# больше, чем задач в окрестности; шаг - два поиска по индексам
+# uq_issue_link (source_issue_key) и idx_target_issue
+# Задача известна, если она сохранена или на нее ссылается сохраненная
+# (такие узлы тоже есть в графе и их окрестность можно открыть)
+NEIGHBORHOOD_ROOT_SQL = """
+SELECT EXISTS (SELECT 1 FROM jira_issues WHERE issue_key = %(key)s)
+    OR EXISTS (SELECT 1 FROM jira_issue_links WHERE target_issue_key = %(key)s) AS known
+"""
+
+NEIGHBORHOOD_NODES_SQL = """
+WITH RECURSIVE walk(issue_key, depth) AS (
+    SELECT %(key)s::varchar, 0
+    UNION
+    SELECT CASE WHEN l.source_issue_key = w.issue_key
+                THEN l.target_issue_key ELSE l.source_issue_key END,
+           w.depth + 1
+    FROM walk w
+    JOIN jira_issue_links l
+      ON l.source_issue_key = w.issue_key OR l.target_issue_key = w.issue_key
+    WHERE w.depth < %(depth)s
+      AND (%(any_type)s OR l.link_type_name = ANY(%(link_types)s::text[]))
+      AND (%(sprint)s::text IS NULL OR EXISTS (
+          SELECT 1 FROM jira_issues s
+          WHERE s.issue_key = CASE WHEN l.source_issue_key = w.issue_key
+                                   THEN l.target_issue_key ELSE l.source_issue_key END
+            AND s.sprint = %(sprint)s
+      ))
+),
+nearest AS (
+    SELECT issue_key, MIN(depth) AS depth FROM walk
+    GROUP BY issue_key
+    ORDER BY MIN(depth), issue_key
+    LIMIT %(max_nodes)s
+)
+SELECT n.issue_key, n.depth, i.summary, i.status, i.issue_type,
+       i.priority, i.assignee, i.sprint
+FROM nearest n
+LEFT JOIN jira_issues i ON i.issue_key = n.issue_key
+ORDER BY n.depth, n.issue_key
+"""
+
+NEIGHBORHOOD_EDGES_SQL = """
+SELECT source_issue_key, target_issue_key, link_type_name,
+       direction_label, direction, target_status, target_priority
+FROM jira_issue_links
+WHERE source_issue_key = ANY(%(keys)s::text[]) AND target_issue_key = ANY(%(keys)s::text[])
+  AND (%(any_type)s OR link_type_name = ANY(%(link_types)s::text[]))
+ORDER BY source_issue_key, target_issue_key, link_type_name
+LIMIT %(max_edges)s
+"""
+
+
+@app.route('/api/graph/neighborhood/<issue_key>')
+@versioned(data_version.JIRA, cache=True)
+def get_graph_neighborhood(issue_key):
+    """Подграф связей в пределах depth шагов от задачи.
+
+    Параметры: depth (по умолчанию 2, не больше 4), link_type (имя типа
+    связи, можно несколько), sprint (обходить только задачи спринта),
+    max_nodes, max_edges. Ближние к задаче узлы имеют приоритет; если
+    что-то не поместилось в ограничения, truncated = true. Неизвестная
+    задача - 404.
+    """
+    depth = int_arg('depth', NEIGHBORHOOD_DEPTH, 0, NEIGHBORHOOD_MAX_DEPTH)
+    max_nodes = int_arg('max_nodes', NEIGHBORHOOD_MAX_NODES, 1, NEIGHBORHOOD_NODES_LIMIT)
+    max_edges = int_arg('max_edges', NEIGHBORHOOD_MAX_EDGES, 1, NEIGHBORHOOD_EDGES_LIMIT)
+    link_types = request.args.getlist('link_type')
+    params = {
+        'key': issue_key, 'depth': depth,
+        'any_type': not link_types, 'link_types': link_types,
+        'sprint': request.args.get('sprint') or None,
+    }
+    with db_cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cursor.execute(NEIGHBORHOOD_ROOT_SQL, params)
+        if not cursor.fetchone()['known']:
+            return jsonify({'error': 'Issue not found'}), 404
+        # По одной лишней строке - чтобы знать, обрезан ли ответ
+        cursor.execute(NEIGHBORHOOD_NODES_SQL, {**params, 'max_nodes': max_nodes + 1})
+        nodes = cursor.fetchall()
+        truncated = len(nodes) > max_nodes
+        nodes = nodes[:max_nodes]
+        cursor.execute(NEIGHBORHOOD_EDGES_SQL, {
+            **params, 'keys': [node['issue_key'] for node in nodes], 'max_edges': max_edges + 1
+        })
+        edges = cursor.fetchall()
+    if len(edges) > max_edges:
+        truncated = True
+        edges = edges[:max_edges]
+    return jsonify({
+        'root': issue_key, 'depth': depth,
+        'nodes': nodes, 'edges': edges, 'truncated': truncated,
+    })
+
+
+# Квартальный отчет одним запросом: задачи квартала читаются один раз
+# (MATERIALIZED CTE) и из них собираются итоги, разбивки по статусам и
+# спринтам и направления. Направление задачи - по первой метке, найденной в
+# label_directions (порядок меток - WITH ORDINALITY), иначе 'Прочее'
+QUARTERLY_REPORT_SQL = """
+WITH quarter_issues AS MATERIALIZED (
+    SELECT issue_key, summary, status, labels, sprint, updated_date,
+           time_original_estimate, time_spent,
+           status IN %(done_statuses)s AS done
+    FROM jira_issues
+    WHERE created_date >= %(date_from)s AND created_date <= %(date_to)s
+      AND (issue_type IS NULL OR issue_type NOT IN %(epic_types)s)
+),
+issue_directions AS (
+    SELECT q.*, COALESCE((
+        SELECT d.direction
+        FROM unnest(q.labels) WITH ORDINALITY AS l(label, position)
+        JOIN label_directions d ON d.label = l.label
+        ORDER BY l.position
+        LIMIT 1
+    ), 'Прочее') AS direction
+    FROM quarter_issues q
+),
+directions AS (
+    SELECT direction AS name,
+           COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE done) AS done,
+           ROUND(COALESCE(SUM(time_original_estimate), 0), 1) AS estimated,
+           ROUND(COALESCE(SUM(time_spent), 0), 1) AS spent,
+           json_agg(json_build_object(
+               'key', issue_key, 'summary', summary, 'status', status,
+               'labels', COALESCE(labels, '{}'), 'spent', COALESCE(time_spent, 0)
+           ) ORDER BY updated_date DESC) AS tasks,
+           MAX(updated_date) AS last_updated
+    FROM issue_directions
+    GROUP BY direction
+),
+by_status AS (
+    SELECT status, COUNT(*) AS cnt FROM quarter_issues GROUP BY status
+),
+by_sprint AS (
+    SELECT sprint,
+           COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE done) AS done,
+           ROUND(COALESCE(SUM(time_original_estimate), 0), 1) AS estimated,
+           ROUND(COALESCE(SUM(time_spent), 0), 1) AS spent
+    FROM quarter_issues WHERE sprint IS NOT NULL
+    GROUP BY sprint
+)
+SELECT
+    (SELECT COUNT(*) FROM quarter_issues) AS total_issues,
+    (SELECT COUNT(*) FILTER (WHERE done) FROM quarter_issues) AS total_done,
+    (SELECT ROUND(COALESCE(SUM(time_original_estimate), 0), 1) FROM quarter_issues) AS total_estimated,
+    (SELECT ROUND(COALESCE(SUM(time_spent), 0), 1) FROM quarter_issues) AS total_spent,
+    COALESCE((SELECT json_agg(json_build_object('status', status, 'cnt', cnt) ORDER BY cnt DESC)
+              FROM by_status), '[]') AS by_status,
+    COALESCE((SELECT json_agg(json_build_object('sprint', sprint, 'total', total, 'done', done,
+                                                'estimated', estimated, 'spent', spent) ORDER BY sprint)
+              FROM by_sprint), '[]') AS by_sprint,
+    COALESCE((SELECT json_agg(json_build_object('name', name, 'total', total, 'done', done,
+                                                'estimated', estimated, 'spent', spent, 'tasks', tasks)
+                              ORDER BY total DESC, last_updated DESC NULLS FIRST)
+              FROM directions), '[]') AS directions
+"""
 
 
 @app.route('/api/quarterly-report')
+@versioned(data_version.JIRA, cache=True)
 def get_quarterly_report():
     quarter = request.args.get('quarter', 'Q2')
-    year = int(request.args.get('year', datetime.now().year))
+    year = int_arg('year', datetime.now().year)
     quarter_bounds = {
         'Q1': (1, 3), 'Q2': (4, 6), 'Q3': (7, 9), 'Q4': (10, 12)
     }
@@ -268,97 +934,14 @@ def get_quarterly_report():
     date_from = datetime(year, start_month, 1)
     last_day = calendar.monthrange(year, end_month)[1]
     date_to = datetime(year, end_month, last_day, 23, 59, 59)
-    EPIC_TYPES = ('Эпик', 'Epic', 'эпик', 'epic')
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT issue_key, summary, status, issue_type,
-               labels, epic_link, sprint,
-               time_original_estimate, time_spent,
-               created_date, updated_date
-        FROM jira_issues
-        WHERE created_date >= %s AND created_date <= %s
-          AND (issue_type IS NULL OR issue_type NOT IN %s)
-        ORDER BY updated_date DESC
-    """, (date_from, date_to, EPIC_TYPES))
-    issues = cursor.fetchall()
-    cursor.execute("""
-        SELECT status, COUNT(*) as cnt
-        FROM jira_issues
-        WHERE created_date >= %s AND created_date <= %s
-          AND (issue_type IS NULL OR issue_type NOT IN %s)
-        GROUP BY status ORDER BY cnt DESC
-    """, (date_from, date_to, EPIC_TYPES))
-    by_status = cursor.fetchall()
-    cursor.execute("""
-        SELECT sprint,
-               COUNT(*) as total,
-               COUNT(CASE WHEN status IN ('Готово','Закрыта','Done','Closed') THEN 1 END) as done,
-               COALESCE(ROUND(SUM(time_original_estimate)::numeric, 1), 0) as estimated,
-               COALESCE(ROUND(SUM(time_spent)::numeric, 1), 0) as spent
-        FROM jira_issues
-        WHERE created_date >= %s AND created_date <= %s
-          AND sprint IS NOT NULL
-          AND (issue_type IS NULL OR issue_type NOT IN %s)
-        GROUP BY sprint ORDER BY sprint
-    """, (date_from, date_to, EPIC_TYPES))
-    by_sprint = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    direction_map = {
-        'Тех.Аудит':    'Технический SEO',
-        'Оптимизация':  'Технический SEO',
-        'SERP_Google':  'Технический SEO',
-        'Яндекс.Поиск':'Технический SEO',
-        'Микроразметка':'Микроразметка',
-        'Статья':       'Контент',
-        'Блог':         'Контент',
-        'Контент_План': 'Контент',
-        'Аналитика_SEO':'Аналитика',
-        'Отчеты_SEO':   'Аналитика',
-        'Автоматизация':'Аналитика',
-        'Запросы':      'Контент',
-        'Линкбилдинг':  'Линкбилдинг',
-        'Партнеры':     'Линкбилдинг',
-    }
-    directions = {}
-    for issue in issues:
-        labels = issue.get('labels') or []
-        matched_dir = None
-        for label in labels:
-            if label in direction_map:
-                matched_dir = direction_map[label]
-                break
-        if not matched_dir:
-            matched_dir = 'Прочее'
-        if matched_dir not in directions:
-            directions[matched_dir] = {
-                'name': matched_dir, 'tasks': [],
-                'total': 0, 'done': 0,
-                'estimated': 0.0, 'spent': 0.0
-            }
-        d = directions[matched_dir]
-        d['tasks'].append({
-            'key': issue['issue_key'],
-            'summary': issue['summary'],
-            'status': issue['status'],
-            'labels': labels,
-            'spent': float(issue['time_spent'] or 0)
+    with db_cursor() as cursor:
+        cursor.execute(QUARTERLY_REPORT_SQL, {
+            'date_from': date_from, 'date_to': date_to,
+            'epic_types': EPIC_TYPES, 'done_statuses': DONE_STATUSES,
         })
-        d['total'] += 1
-        if issue['status'] in ('Готово', 'Закрыта', 'Done', 'Closed'):
-            d['done'] += 1
-        d['estimated'] += float(issue['time_original_estimate'] or 0)
-        d['spent'] += float(issue['time_spent'] or 0)
-    for d in directions.values():
-        d['estimated'] = round(d['estimated'], 1)
-        d['spent'] = round(d['spent'], 1)
-    directions_sorted = sorted(directions.values(), key=lambda x: x['total'], reverse=True)
-    total_issues = len(issues)
-    done_statuses = ('Готово', 'Закрыта', 'Done', 'Closed')
-    total_done = sum(1 for i in issues if i['status'] in done_statuses)
-    total_estimated = round(sum(float(i['time_original_estimate'] or 0) for i in issues), 1)
-    total_spent = round(sum(float(i['time_spent'] or 0) for i in issues), 1)
+        report = cursor.fetchone()
+    total_issues = report['total_issues']
+    total_done = report['total_done']
     done_pct = round(total_done / total_issues * 100) if total_issues else 0
     return jsonify({
         'quarter': quarter, 'year': year,
@@ -366,32 +949,30 @@ def get_quarterly_report():
         'date_to': date_to.strftime('%d.%m.%Y'),
         'summary': {
             'total_issues': total_issues, 'total_done': total_done,
-            'done_pct': done_pct, 'total_estimated': total_estimated,
-            'total_spent': total_spent,
+            'done_pct': done_pct, 'total_estimated': float(report['total_estimated']),
+            'total_spent': float(report['total_spent']),
         },
-        'by_status': [dict(r) for r in by_status],
-        'by_sprint': [dict(r) for r in by_sprint],
-        'directions': directions_sorted,
+        'by_status': report['by_status'],
+        'by_sprint': report['by_sprint'],
+        'directions': report['directions'],
     })
 
 
 @app.route('/api/gsc-data')
+@versioned(data_version.GSC)
 def get_gsc_data():
     quarter = request.args.get('quarter', 'Q2')
-    year = int(request.args.get('year', datetime.now().year))
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT quarter, year,
-               clicks, impressions, avg_position, ctr,
-               clicks_prev, impressions_prev, position_prev, ctr_prev,
-               notes, updated_at
-        FROM seo_quarterly_gsc
-        WHERE quarter = %s AND year = %s
-    """, (quarter, year))
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    year = int_arg('year', datetime.now().year)
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT quarter, year,
+                   clicks, impressions, avg_position, ctr,
+                   clicks_prev, impressions_prev, position_prev, ctr_prev,
+                   notes, updated_at
+            FROM seo_quarterly_gsc
+            WHERE quarter = %s AND year = %s
+        """, (quarter, year))
+        row = cursor.fetchone()
     if not row:
         return jsonify({'found': False, 'quarter': quarter, 'year': year})
     def f(v): return float(v) if v is not None else None
@@ -416,37 +997,155 @@ def save_gsc_data():
     body = request.get_json()
     def iv(k): return int(body[k]) if body.get(k) not in (None, '', 0) else None
     def fv(k): return float(body[k]) if body.get(k) not in (None, '', 0) else None
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO seo_quarterly_gsc
-            (quarter, year, clicks, impressions, avg_position, ctr,
-             clicks_prev, impressions_prev, position_prev, ctr_prev,
-             notes, updated_at)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, CURRENT_TIMESTAMP)
-        ON CONFLICT (quarter, year) DO UPDATE SET
-            clicks           = EXCLUDED.clicks,
-            impressions      = EXCLUDED.impressions,
-            avg_position     = EXCLUDED.avg_position,
-            ctr              = EXCLUDED.ctr,
-            clicks_prev      = EXCLUDED.clicks_prev,
-            impressions_prev = EXCLUDED.impressions_prev,
-            position_prev    = EXCLUDED.position_prev,
-            ctr_prev         = EXCLUDED.ctr_prev,
-            notes            = EXCLUDED.notes,
-            updated_at       = CURRENT_TIMESTAMP
-    """, (
-        body.get('quarter'), int(body.get('year')),
-        iv('clicks'), iv('impressions'), fv('avg_position'), fv('ctr'),
-        iv('clicks_prev'), iv('impressions_prev'), fv('position_prev'), fv('ctr_prev'),
-        body.get('notes')
-    ))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO seo_quarterly_gsc
+                (quarter, year, clicks, impressions, avg_position, ctr,
+                 clicks_prev, impressions_prev, position_prev, ctr_prev,
+                 notes, updated_at)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, CURRENT_TIMESTAMP)
+            ON CONFLICT (quarter, year) DO UPDATE SET
+                clicks           = EXCLUDED.clicks,
+                impressions      = EXCLUDED.impressions,
+                avg_position     = EXCLUDED.avg_position,
+                ctr              = EXCLUDED.ctr,
+                clicks_prev      = EXCLUDED.clicks_prev,
+                impressions_prev = EXCLUDED.impressions_prev,
+                position_prev    = EXCLUDED.position_prev,
+                ctr_prev         = EXCLUDED.ctr_prev,
+                notes            = EXCLUDED.notes,
+                updated_at       = CURRENT_TIMESTAMP
+        """, (
+            body.get('quarter'), int(body.get('year')),
+            iv('clicks'), iv('impressions'), fv('avg_position'), fv('ctr'),
+            iv('clicks_prev'), iv('impressions_prev'), fv('position_prev'), fv('ctr_prev'),
+            body.get('notes')
+        ))
+        data_version.bump(cursor, data_version.GSC)
+        cursor.connection.commit()
     return jsonify({'ok': True})
 
 
+# Метрики последнего запуска по каждому JQL в формате Prometheus:
+# (имя метрики, колонка sync_runs, описание)
+SYNC_RUN_METRICS = [
+    ('jira_sync_last_run_timestamp_seconds', 'finished_at', 'Время окончания последнего запуска'),
+    ('jira_sync_last_run_success', 'success', '1 - последний запуск успешен'),
+    ('jira_sync_last_run_duration_seconds', 'duration_seconds', 'Длительность запуска'),
+    ('jira_sync_last_run_fetch_seconds', 'fetch_seconds', 'Ожидание страниц из Jira'),
+    ('jira_sync_last_run_parse_seconds', 'parse_seconds', 'Разбор страниц'),
+    ('jira_sync_last_run_db_seconds', 'db_seconds', 'Запись в PostgreSQL'),
+    ('jira_sync_last_run_http_seconds', 'http_seconds', 'Суммарное время HTTP-запросов страниц'),
+    ('jira_sync_last_run_bytes', 'bytes', 'Получено байт из Jira'),
+    ('jira_sync_last_run_issues', 'issues_saved', 'Сохранено задач'),
+    ('jira_sync_last_run_issues_per_second', 'issues_per_second', 'Скорость синхронизации'),
+    ('jira_sync_last_run_http_retries', 'http_retries', 'Повторов запросов к Jira'),
+    ('jira_sync_last_run_http_throttled', 'http_throttled', 'Ответов 429 от Jira'),
+]
+
+
+def prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+@app.route('/api/sync-status')
+def get_sync_status():
+    """Последние запуски синхронизации (таблица sync_runs пишется jira_sync.py).
+
+    ?format=prometheus - метрики последнего запуска каждого JQL для алертов.
+    """
+    limit = int_arg('limit', 20, 1, 500)
+    with db_cursor() as cursor:
+        cursor.execute("SELECT to_regclass('sync_runs') IS NOT NULL AS exists")
+        if not cursor.fetchone()['exists']:
+            runs, latest = [], []
+        else:
+            cursor.execute("""
+                SELECT id, jql, mode, status, error, started_at, finished_at,
+                       duration_seconds, fetch_seconds, parse_seconds, db_seconds, http_seconds,
+                       pages, bytes, issues_fetched, issues_saved, inserted, changed, unchanged,
+                       deleted, db_rows, http_requests, http_retries, http_throttled
+                FROM sync_runs
+                ORDER BY started_at DESC
+                LIMIT %s
+            """, (limit,))
+            runs = cursor.fetchall()
+            cursor.execute("""
+                SELECT DISTINCT ON (COALESCE(jql, ''), mode)
+                       jql, mode, status, finished_at, duration_seconds, fetch_seconds,
+                       parse_seconds, db_seconds, http_seconds, bytes, issues_saved,
+                       http_retries, http_throttled
+                FROM sync_runs
+                ORDER BY COALESCE(jql, ''), mode, started_at DESC
+            """)
+            latest = cursor.fetchall()
+
+    def f(v): return float(v) if v is not None else None
+    for run in runs + latest:
+        for key, value in run.items():
+            if key.endswith('_seconds'):
+                run[key] = f(value)
+        run['issues_per_second'] = (
+            round(run['issues_saved'] / run['duration_seconds'], 1)
+            if run['issues_saved'] and run['duration_seconds'] else 0
+        )
+
+    if request.args.get('format') == 'prometheus':
+        lines = []
+        for name, column, help_text in SYNC_RUN_METRICS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for run in latest:
+                if column == 'finished_at':
+                    value = run['finished_at'].timestamp()
+                elif column == 'success':
+                    value = int(run['status'] == 'ok')
+                else:
+                    value = run[column] or 0
+                labels = f'jql="{prometheus_label(run["jql"] or "")}",mode="{run["mode"]}"'
+                lines.append(f"{name}{{{labels}}} {value}")
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    for run in runs:
+        run['started_at'] = run['started_at'].isoformat()
+        run['finished_at'] = run['finished_at'].isoformat()
+    return jsonify({'runs': runs})
+
+
+@app.route('/api/cache-status')
+def get_cache_status():
+    """Счетчики кэша ответов, сжатия, раскладки и индекса графа этого
+    процесса (у каждого воркера gunicorn свои).
+
+    ?format=prometheus - те же счетчики в формате Prometheus.
+    """
+    responses = response_cache()
+    stats = responses.stats() if responses is not None else {'enabled': False}
+    compressed = compression.stats.snapshot()
+    if request.args.get('format') == 'prometheus':
+        pid = os.getpid()
+        lines = []
+        for key, value in stats.items():
+            if key == 'enabled':
+                continue
+            kind = 'counter' if key in ('hits', 'misses', 'evictions', 'invalidations') else 'gauge'
+            name = f"dashboard_response_cache_{key}" + ('_total' if kind == 'counter' else '')
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f'{name}{{pid="{pid}"}} {value}')
+        for key in ('responses', 'cached_responses', 'bytes_in', 'bytes_out', 'seconds', 'ratio'):
+            kind = 'gauge' if key == 'ratio' else 'counter'
+            name = f"dashboard_compression_{key}" + ('_total' if kind == 'counter' else '')
+            lines.append(f"# TYPE {name} {kind}")
+            for encoding, counters in compressed.items():
+                lines.append(f'{name}{{pid="{pid}",encoding="{encoding}"}} {counters[key]}')
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+    return jsonify({
+        'pid': os.getpid(), **stats, 'compression': compressed,
+        'graph_layout': graph_layouts.stats(),
+        'graph_index': link_graphs.stats(),
+    })
+
+
 @app.template_filter('format_date')
 def format_date_filter(date_obj):
     return format_date(date_obj)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки API дашборда (app.py) на настоящей БД из .env.
+
+Запуск:
+    python bench_api.py --requests 200
+    python bench_api.py --path /api/statistics --pool-sizes 0 4 --threads 4
+
+Запросы идут через Flask test client, без HTTP-сервера, - в замер попадает
+только работа приложения: подключение к PostgreSQL, запросы, JSON.
+pool_size=0 - прежнее поведение (новое подключение на каждый запрос),
+остальные значения - пул процесса из db_pool.py (PG_POOL_SIZE).
+
+Кэш готовых ответов (response_cache.py, RESPONSE_CACHE_SIZE) на время
+замера отключается: иначе после прогрева /api/statistics и другие
+кэшируемые маршруты отдаются из памяти и пул подключений не участвует.
+С --response-cache кэш остается включенным.
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def run(client, path: str, requests: int, threads: int) -> list:
+    def one(_):
+        started = time.perf_counter()
+        response = client.get(path)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} ответил {response.status_code}: {response.data[:200]!r}")
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержка API дашборда с пулом подключений и без')
+    parser.add_argument('--path', default='/api/statistics')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=1, help='одновременных запросов')
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[0, 4])
+    parser.add_argument('--response-cache', action='store_true',
+                        help='не отключать кэш готовых ответов (RESPONSE_CACHE_SIZE)')
+    args = parser.parse_args()
+
+    import app as dashboard
+    if not args.response_cache:
+        dashboard.RESPONSE_CACHE_SIZE = 0
+    client = dashboard.app.test_client()
+
+    cache = 'включен' if dashboard.RESPONSE_CACHE_SIZE > 0 else 'отключен'
+    print(f"{args.path}: {args.requests} запросов, потоков: {args.threads}, кэш ответов {cache}")
+    print(f"{'пул':>5} {'p50, мс':>9} {'p95, мс':>9} {'среднее, мс':>12} {'запросов/с':>11}")
+    for pool_size in args.pool_sizes:
+        dashboard.PG_POOL_SIZE = pool_size
+        # Прогрев: подключения в пул, планы запросов в кэш PostgreSQL
+        run(client, args.path, min(10, args.requests), args.threads)
+
+        started = time.perf_counter()
+        timings = run(client, args.path, args.requests, args.threads)
+        total = time.perf_counter() - started
+        print(f"{pool_size:>5} {percentile(timings, 0.5) * 1000:>9.1f} "
+              f"{percentile(timings, 0.95) * 1000:>9.1f} {statistics.mean(timings) * 1000:>12.1f} "
+              f"{args.requests / total:>11.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
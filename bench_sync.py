@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки этапов синхронизации (jira_sync.py) без настоящей Jira.
+
+Запуск:
+    python bench_sync.py fetch --issues 2000 --latency 0.05 --workers 1 2 4 8
+    python bench_sync.py fetch --throttle 0.2
+    python bench_sync.py parse --issues 100000
+    python bench_sync.py parse --archive pages.ndjson.gz
+
+fetch - поднимает на localhost mock /rest/api/2/search с искусственной
+задержкой ответа и сравнивает время JiraSync.fetch_all_issues при разном
+числе параллельных запросов страниц. С --throttle mock отвечает 429 на
+заданную долю запросов - видно, сколько повторов сделал jira_client и до
+какого лимита параллельности он опустился.
+
+parse - сравнивает jira_parser.parse_issues с прежним разбором из
+save_issues_to_db (parse_issue на каждую задачу дважды, strptime,
+некомпилированный regex, словари связей) на синтетическом ответе Jira
+или на реальных страницах из архива jira_sync.py --archive.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import re
+from datetime import datetime
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# JiraSync требует эти переменные в окружении - для бенчмарка подойдут любые
+os.environ.setdefault('JIRA_LOGIN', 'bench')
+os.environ.setdefault('JIRA_PASSWORD', 'bench')
+# Mock отвечает 429 с Retry-After: 0 - ждать между повторами по секунде незачем
+os.environ.setdefault('JIRA_HTTP_BACKOFF_BASE', '0.01')
+
+STATUSES = ['Открыто', 'В работе', 'Готово', 'Закрыта']
+TYPES = ['Задача', 'История', 'Эпик', 'Ошибка']
+LABELS = ['Тех.Аудит', 'Статья', 'Блог', 'Аналитика_SEO', 'Линкбилдинг', 'Запросы']
+
+
+def make_issue(n: int, rnd: random.Random) -> dict:
+    """Синтетическая задача в формате ответа /rest/api/2/search"""
+    sprint_no = 1 + n % 30
+    links = []
+    for _ in range(rnd.randint(0, 3)):
+        target = {
+            'key': f"BENCH-{rnd.randint(1, 100000)}",
+            'fields': {
+                'summary': 'Связанная задача',
+                'status': {'name': rnd.choice(STATUSES)},
+                'priority': {'name': 'Medium'},
+            }
+        }
+        direction = rnd.choice(['inwardIssue', 'outwardIssue'])
+        links.append({
+            'id': str(rnd.randint(1, 10 ** 6)),
+            'type': {'id': '10000', 'name': 'Blocks', 'inward': 'is blocked by', 'outward': 'blocks'},
+            direction: target,
+        })
+    return {
+        'key': f"BENCH-{n}",
+        'fields': {
+            'issuetype': {'name': rnd.choice(TYPES)},
+            'status': {'name': rnd.choice(STATUSES)},
+            'created': '2025-12-15T14:34:02.000+0000',
+            'updated': f"2025-12-{1 + n % 28:02d}T{n % 24:02d}:{n % 60:02d}:02.000+0000",
+            'timeoriginalestimate': rnd.choice([None, 3600, 7200, 18000]),
+            'timespent': rnd.choice([None, 1800, 3600]),
+            'customfield_10104': [
+                f"com.atlassian.greenhopper.service.sprint.Sprint@1f2e3d[id={1000 + sprint_no},"
+                f"rapidViewId=42,state=ACTIVE,name=MAR 08.12.25 - 22.12.25 #{sprint_no},"
+                f"startDate=2025-12-08T10:00:00.000+03:00,endDate=2025-12-22T10:00:00.000+03:00,"
+                f"completeDate=<null>,sequence={1000 + sprint_no}]"
+            ],
+            'customfield_10100': f"BENCH-{n - n % 50}" if n % 3 else None,
+            'summary': f"Синтетическая задача №{n}",
+            'assignee': {'displayName': 'Bench User'},
+            'reporter': {'displayName': 'Bench Reporter'},
+            'priority': {'name': rnd.choice(['High', 'Medium', 'Low'])},
+            'labels': rnd.sample(LABELS, rnd.randint(0, 2)),
+            'issuelinks': links,
+        }
+    }
+
+
+def make_issues(count: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    return [make_issue(n, rnd) for n in range(1, count + 1)]
+
+
+class MockJira:
+    """Mock Jira Search API на localhost с фиксированной задержкой ответа"""
+
+    def __init__(self, issues: list, latency: float, page_limit: int = 100, throttle: float = 0.0):
+        self.issues = issues
+        self.latency = latency
+        self.page_limit = page_limit
+        self.throttle = throttle
+        self.rnd = random.Random(2)
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                start_at = int(query.get('startAt', ['0'])[0])
+                max_results = min(int(query.get('maxResults', ['50'])[0]), mock.page_limit)
+                time.sleep(mock.latency)
+                if mock.rnd.random() < mock.throttle:
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps({
+                    'startAt': start_at,
+                    'maxResults': max_results,
+                    'total': len(mock.issues),
+                    'issues': mock.issues[start_at:start_at + max_results],
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        os.environ['JIRA_URL'] = self.url
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def bench_fetch(args):
+    from jira_sync import JiraSync
+
+    issues = make_issues(args.issues)
+    print(f"Mock Jira: {args.issues} задач, задержка {args.latency * 1000:.0f} мс на страницу, "
+          f"429 на {args.throttle:.0%} запросов")
+    print(f"{'workers':>8} {'время, с':>10} {'ускорение':>10} {'повторов':>9} {'лимит':>6}")
+
+    baseline = None
+    with MockJira(issues, args.latency, throttle=args.throttle):
+        for workers in args.workers:
+            sync = JiraSync(fetch_workers=workers)
+            started = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                fetched = sync.fetch_all_issues('project = BENCH')
+            elapsed = time.perf_counter() - started
+
+            if [i['key'] for i in fetched] != [i['key'] for i in issues]:
+                print(f"ОШИБКА: при workers={workers} задачи собраны не в исходном порядке")
+                return 1
+
+            baseline = baseline or elapsed
+            http = sync.client.stats()
+            print(f"{workers:>8} {elapsed:>10.3f} {baseline / elapsed:>9.1f}x "
+                  f"{http['retries']:>9} {http['concurrency_limit']:>6}")
+    return 0
+
+
+def legacy_parse(issues: list):
+    """Прежний разбор задач из save_issues_to_db - эталон для сравнения"""
+    def parse_date(date_str):
+        if not date_str:
+            return None
+        try:
+            return datetime.strptime(date_str[:19], '%Y-%m-%dT%H:%M:%S')
+        except (ValueError, TypeError):
+            return None
+
+    def hours(seconds):
+        return None if seconds is None else round(seconds / 3600.0, 2)
+
+    def sprint_name(sprint_data):
+        if not sprint_data or len(sprint_data) == 0:
+            return None
+        sprint_str = sprint_data[-1] if isinstance(sprint_data, list) else sprint_data
+        match = re.search(r'name=([^,\]]+)', str(sprint_str))
+        return match.group(1) if match else None
+
+    def parse_issue(issue):
+        fields = issue.get('fields', {})
+        issue_links = fields.get('issuelinks', [])
+        linked = []
+        for link in issue_links:
+            if 'inwardIssue' in link:
+                linked.append(link['inwardIssue']['key'])
+            if 'outwardIssue' in link:
+                linked.append(link['outwardIssue']['key'])
+        return {
+            'issue_key': issue.get('key'),
+            'issue_type': fields.get('issuetype', {}).get('name'),
+            'status': fields.get('status', {}).get('name'),
+            'created_date': parse_date(fields.get('created')),
+            'time_original_estimate': hours(fields.get('timeoriginalestimate')),
+            'time_spent': hours(fields.get('timespent')),
+            'updated_date': parse_date(fields.get('updated')),
+            'sprint': sprint_name(fields.get('customfield_10104')),
+            'epic_link': fields.get('customfield_10100'),
+            'summary': fields.get('summary'),
+            'assignee': fields.get('assignee', {}).get('displayName') if fields.get('assignee') else None,
+            'reporter': fields.get('reporter', {}).get('displayName') if fields.get('reporter') else None,
+            'priority': fields.get('priority', {}).get('name'),
+            'labels': fields.get('labels', []),
+            'linked_issues': linked,
+            'issue_links_raw': issue_links,
+        }
+
+    issues_values, all_links = [], []
+    for issue in issues:
+        parsed = parse_issue(issue)
+        issues_values.append((
+            parsed['issue_key'], parsed['issue_type'], parsed['status'], parsed['created_date'],
+            parsed['time_original_estimate'], parsed['time_spent'], parsed['updated_date'],
+            parsed['sprint'], parsed['epic_link'], parsed['summary'], parsed['assignee'],
+            parsed['reporter'], parsed['priority'], parsed['labels'], parsed['linked_issues'],
+            datetime.now()
+        ))
+        for link in parsed['issue_links_raw']:
+            link_type = link.get('type', {})
+            for side, direction in (('inwardIssue', 'inward'), ('outwardIssue', 'outward')):
+                if side in link:
+                    target = link[side]
+                    all_links.append({
+                        'source_key': parsed['issue_key'],
+                        'target_key': target['key'],
+                        'link_type': link_type.get('id'),
+                        'link_type_name': link_type.get('name'),
+                        'direction': direction,
+                        'direction_label': link_type.get(direction),
+                        'target_summary': target.get('fields', {}).get('summary'),
+                        'target_status': target.get('fields', {}).get('status', {}).get('name'),
+                        'target_priority': target.get('fields', {}).get('priority', {}).get('name'),
+                    })
+    links_values = [tuple(link.values()) for link in all_links]
+    updated_keys = [parsed['issue_key'] for parsed in [parse_issue(i) for i in issues]]
+    return issues_values, links_values, updated_keys
+
+
+def bench_parse(args):
+    from jira_parser import ISSUE_COLUMNS, ISSUE_KEY, CONTENT_HASH, parse_issues
+
+    if args.archive:
+        from page_archive import read_pages
+        issues = [issue for page in read_pages(args.archive) for issue in page]
+        args.issues = len(issues)
+    else:
+        print(f"Генерируем синтетический ответ Jira на {args.issues} задач...")
+        issues = make_issues(args.issues)
+
+    started = time.perf_counter()
+    old_issues, old_links, _ = legacy_parse(issues)
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new_issues, new_links, new_sprints = parse_issues(issues, datetime.now())
+    _ = [row[ISSUE_KEY] for row in new_issues]
+    current = time.perf_counter() - started
+
+    # Строки должны совпадать с прежним разбором (кроме sprint_id, которого
+    # прежде не было, хешей и времени синхронизации)
+    sprint_id = ISSUE_COLUMNS.index('sprint_id')
+    if [r[:-1] for r in old_issues] != [r[:sprint_id] + r[sprint_id + 1:CONTENT_HASH] for r in new_issues] \
+            or old_links != new_links:
+        print("ОШИБКА: результат parse_issues отличается от прежнего разбора")
+        return 1
+
+    print(f"Связей: {len(new_links)}, спринтов: {len(new_sprints)}")
+    print(f"{'разбор':<22} {'время, с':>10} {'задач/с':>12}")
+    for name, elapsed in (('прежний', legacy), ('jira_parser', current)):
+        print(f"{name:<22} {elapsed:>10.3f} {args.issues / elapsed:>12,.0f}")
+    print(f"Ускорение: {legacy / current:.1f}x")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки этапов синхронизации Jira')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch = commands.add_parser('fetch', help='параллельная загрузка страниц из mock Jira')
+    fetch.add_argument('--issues', type=int, default=2000)
+    fetch.add_argument('--latency', type=float, default=0.05, help='задержка ответа на страницу, с')
+    fetch.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    fetch.add_argument('--throttle', type=float, default=0.0, help='доля запросов, на которые mock отвечает 429')
+    fetch.set_defaults(handler=bench_fetch)
+
+    parse = commands.add_parser('parse', help='разбор синтетического ответа Jira')
+    parse.add_argument('--issues', type=int, default=100000)
+    parse.add_argument('--archive', nargs='+', metavar='PATH',
+                       help='взять задачи из архивов страниц вместо синтетических')
+    parse.set_defaults(handler=bench_parse)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Сжатие ответов веб-приложения (app.py) по Accept-Encoding: brotli, если
+установлен пакет brotli (pip install brotli), и gzip.
+
+Обычные ответы сжимаются целиком, потоковые (json_stream.py) - по мере
+отдачи кусков. Ответы из кэша (response_cache.py) сжимаются один раз,
+сильнее, и дальше отдаются готовыми байтами. Счетчики - объем до и после
+сжатия и затраченное время по каждому способу - отдает /api/cache-status.
+"""
+
+import time
+import zlib
+import threading
+from typing import Dict, Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Способы в порядке предпочтения при равном q в Accept-Encoding
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Меньшие ответы не сжимаем: выигрыш меньше заголовков и накладных расходов
+MIN_SIZE = 1024
+
+# Типы, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+# Уровни: ответ на лету - быстро; ответ для кэша сжимается один раз - сильнее
+LEVELS = {'gzip': 6, 'br': 4}
+CACHED_LEVELS = {'gzip': 9, 'br': 9}
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_encoding = {}
+
+    def add(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float, cached: bool = False):
+        with self._lock:
+            stats = self._by_encoding.setdefault(encoding, {
+                'responses': 0, 'cached_responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0
+            })
+            stats['cached_responses' if cached else 'responses'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['seconds'] += seconds
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """{способ: счетчики + ratio (во сколько раз меньше)}"""
+        with self._lock:
+            result = {}
+            for encoding, stats in self._by_encoding.items():
+                result[encoding] = {
+                    **stats,
+                    'seconds': round(stats['seconds'], 3),
+                    'ratio': round(stats['bytes_in'] / stats['bytes_out'], 2) if stats['bytes_out'] else 0.0,
+                }
+            return result
+
+
+stats = CompressionStats()
+
+
+def negotiate(accept_encodings) -> Optional[str]:
+    """Лучший поддерживаемый способ из Accept-Encoding (werkzeug
+    request.accept_encodings) или None - отдавать без сжатия"""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    return mimetype in COMPRESSIBLE_TYPES
+
+
+def compress(data: bytes, encoding: str, cached: bool = False) -> bytes:
+    """Сжимает тело ответа целиком; cached=True - сильнее, для кэша ответов.
+    Отданные из кэша готовые байты учитываются отдельно - count_cached."""
+    level = (CACHED_LEVELS if cached else LEVELS)[encoding]
+    started = time.perf_counter()
+    if encoding == 'br':
+        result = brotli.compress(data, quality=level)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        result = compressor.compress(data) + compressor.flush()
+    stats.add(encoding, len(data), len(result), time.perf_counter() - started)
+    return result
+
+
+def count_cached(encoding: str, bytes_in: int, bytes_out: int):
+    """Учитывает ответ, отданный из кэша уже сжатым (без затрат CPU)"""
+    stats.add(encoding, bytes_in, bytes_out, 0.0, cached=True)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Сжимает поток кусков ответа. Каждый кусок сбрасывается (flush), чтобы
+    клиент получал данные по мере чтения из БД, а не в конце."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=LEVELS['br'])
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(LEVELS['gzip'], zlib.DEFLATED, 31)
+        process = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    bytes_in = bytes_out = 0
+    seconds = 0.0
+    try:
+        for chunk in chunks:
+            started = time.perf_counter()
+            data = process(chunk) + flush()
+            seconds += time.perf_counter() - started
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            if data:
+                yield data
+        started = time.perf_counter()
+        data = finish()
+        seconds += time.perf_counter() - started
+        bytes_out += len(data)
+        yield data
+    finally:
+        stats.add(encoding, bytes_in, bytes_out, seconds)
+        # Клиент мог оборвать ответ: исходный поток держит подключение к БД
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
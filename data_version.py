@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Версия данных дашборда (таблица data_version).
+
+Каждая транзакция, которая меняет данные, увеличивает версию своей
+области: jira - синхронизация и сверка (jira_sync.py), gsc - ручной ввод
+данных Search Console (POST /api/gsc-data), sync - успешный запуск
+синхронизации, даже без изменений (время последней синхронизации). app.py строит из версий ETag и
+Last-Modified и отвечает 304, не выполняя тяжелых запросов, если у
+браузера уже есть актуальный ответ.
+
+Вместе с версией в канал CHANNEL уходит NOTIFY с именем области - его
+PostgreSQL доставляет только после COMMIT. По нему веб-приложение сразу
+чистит кэш ответов (response_cache.py).
+"""
+
+JIRA = 'jira'
+GSC = 'gsc'
+SYNC = 'sync'
+
+CHANNEL = 'data_version'
+
+BUMP_SQL = f"""
+WITH bumped AS (
+    UPDATE data_version
+    SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+    WHERE scope = %s
+    RETURNING scope
+)
+SELECT pg_notify('{CHANNEL}', scope) FROM bumped
+"""
+
+
+def bump(cursor, scope: str):
+    """Увеличивает версию области в текущей транзакции.
+
+    Вызывать последним перед COMMIT: строка версии блокируется до конца
+    транзакции, и чем позже она взята, тем меньше ждут параллельные записи.
+    """
+    cursor.execute(BUMP_SQL, (scope,))
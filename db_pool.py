@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Пул подключений к PostgreSQL для многопоточных процессов (демон
+синхронизации, воркеры веб-приложения).
+
+psycopg2.pool.ThreadedConnectionPool при исчерпании пула сразу бросает
+PoolError - здесь поток вместо этого ждет, пока подключение освободится.
+Подключение, которое долго простаивало, перед выдачей проверяется
+(SELECT 1): оборванное сервером или сетью заменяется новым.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def pg_config_from_env() -> dict:
+    """Параметры подключения к PostgreSQL из переменных окружения"""
+    return {
+        'host': os.getenv('PGHOST'),
+        'user': os.getenv('PGUSER'),
+        'password': os.getenv('PGPASSWORD'),
+        'database': os.getenv('PGDATABASE'),
+        'port': os.getenv('PGPORT', 5432)
+    }
+
+
+class ConnectionPool:
+    def __init__(self, maxconn: int, minconn: int = 1, check_after: float = 30.0, **connect_kwargs):
+        """check_after - через сколько секунд простоя проверять подключение перед выдачей"""
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **(connect_kwargs or pg_config_from_env()))
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.maxconn = maxconn
+        self.check_after = check_after
+        # Когда подключение вернули в пул: {id(conn): time.monotonic()}
+        self._returned_at = {}
+
+    def _is_alive(self, conn) -> bool:
+        if conn.closed:
+            return False
+        returned_at = self._returned_at.get(id(conn))
+        if returned_at is None or time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Берет подключение из пула, при необходимости дожидаясь свободного"""
+        self._slots.acquire()
+        try:
+            # Все подключения в пуле могли оборваться разом (перезапуск PostgreSQL)
+            for _ in range(self.maxconn + 1):
+                conn = self._pool.getconn()
+                if self._is_alive(conn):
+                    return conn
+                self._returned_at.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError('не удалось получить рабочее подключение к PostgreSQL')
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        """Возвращает подключение в пул (незавершенная транзакция откатывается)"""
+        try:
+            close = close or conn.closed
+            if close:
+                self._returned_at.pop(id(conn), None)
+            else:
+                self._returned_at[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Подключение на время блока; при обрыве связи оно закрывается, а не возвращается в пул"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_process_pool = None
+_process_pool_pid = None
+_process_pool_maxconn = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool(maxconn: int, **connect_kwargs) -> Optional[ConnectionPool]:
+    """Пул текущего процесса, создается при первом обращении.
+
+    Подключения нельзя делить между процессами, поэтому после fork (воркеры
+    gunicorn) каждый процесс получает свой пул. maxconn=0 - пул отключен.
+    Если maxconn изменился (так меняет размер пула bench_api.py), пул
+    процесса закрывается и создается заново.
+    """
+    global _process_pool, _process_pool_pid, _process_pool_maxconn
+    if maxconn <= 0:
+        return None
+    pid = os.getpid()
+    if _process_pool_pid != pid or _process_pool_maxconn != maxconn:
+        with _process_pool_lock:
+            if _process_pool_pid != pid:
+                # Пул, унаследованный от родителя, не закрываем: его
+                # подключения принадлежат родительскому процессу
+                _process_pool = ConnectionPool(maxconn, minconn=0, **connect_kwargs)
+                _process_pool_pid = pid
+                _process_pool_maxconn = maxconn
+            elif _process_pool_maxconn != maxconn:
+                _process_pool.closeall()
+                _process_pool = ConnectionPool(maxconn, minconn=0, **connect_kwargs)
+                _process_pool_maxconn = maxconn
+    return _process_pool
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Индекс графа связей задач в памяти веб-приложения (app.py).
+
+Задачи нумеруются подряд (0..n-1), связи хранятся массивами в формате CSR
+(indptr + indices, NumPy): соседи узла v - indices[indptr[v]:indptr[v + 1]].
+Индекс строится один раз на версию данных (data_version) из jira_issues и
+jira_issue_links, все тяжелое считается при построении:
+- компоненты связности по всем связям;
+- граф блокировок (типы связей blocking_types): кто кого блокирует,
+  циклы в нем (сильно связные компоненты, алгоритм Тарьяна) и самая
+  длинная по оставшейся оценке цепочка блокировок, ведущая к каждой задаче.
+
+Ответы на запросы - обход CSR или готовые массивы, без обращения к БД.
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+from graph_layout import component_labels
+
+ISSUES_SQL = """
+SELECT issue_key, issue_type, status,
+       COALESCE(time_original_estimate, 0), COALESCE(time_spent, 0)
+FROM jira_issues
+"""
+
+LINKS_SQL = """
+SELECT source_issue_key, target_issue_key, link_type_name, direction
+FROM jira_issue_links
+"""
+
+
+def is_epic(issue_type: Optional[str]) -> bool:
+    issue_type = (issue_type or '').lower()
+    return 'epic' in issue_type or issue_type == 'эпик'
+
+
+def csr(n: int, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(indptr, indices) списков смежности по парам (источник, цель)"""
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32)
+
+
+def neighbors(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> np.ndarray:
+    """Соседи всех узлов frontier одним массивом (с повторами)"""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=indices.dtype)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return indices[offsets]
+
+
+def reachable(indptr: np.ndarray, indices: np.ndarray, start: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Узлы, достижимые из start, и число шагов до них (обход в ширину
+    целыми уровнями)"""
+    depth = np.full(len(indptr) - 1, -1, dtype=np.int32)
+    depth[start] = 0
+    frontier = np.array([start])
+    level = 0
+    while frontier.size:
+        level += 1
+        found = np.unique(neighbors(indptr, indices, frontier))
+        frontier = found[depth[found] < 0]
+        depth[frontier] = level
+    nodes = np.flatnonzero(depth > 0)
+    return nodes, depth[nodes]
+
+
+def strongly_connected(n: int, indptr: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Номер сильно связной компоненты каждого узла (Тарьян, без рекурсии).
+
+    Компоненты нумеруются в обратном топологическом порядке: у связи
+    u -> v между разными компонентами номер компоненты u больше.
+    """
+    ptr = indptr.tolist()
+    adjacent = indices.tolist()
+    order = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    component = [-1] * n
+    counter = count = 0
+    for root in range(n):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, ptr[root])]
+        while work:
+            v, i = work[-1]
+            if i < ptr[v + 1]:
+                work[-1] = (v, i + 1)
+                w = adjacent[i]
+                if order[w] == -1:
+                    order[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, ptr[w]))
+                elif on_stack[w] and order[w] < low[v]:
+                    low[v] = order[w]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[v] < low[parent]:
+                    low[parent] = low[v]
+            if low[v] == order[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component[w] = count
+                    if w == v:
+                        break
+                count += 1
+    return np.array(component, dtype=np.int64), count
+
+
+def group(labels: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Узлы по группам в формате CSR: узлы группы c - members[bounds[c]:bounds[c + 1]]"""
+    members = np.argsort(labels, kind='stable')
+    bounds = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=count), out=bounds[1:])
+    return bounds, members
+
+
+class LinkGraph:
+    """Неизменяемый индекс одной версии данных"""
+
+    def __init__(self, issues: Iterable[Sequence], links: Iterable[Sequence],
+                 blocking_types: Iterable[str], done_statuses: Iterable[str]):
+        """issues - строки ISSUES_SQL, links - строки LINKS_SQL"""
+        started = time.perf_counter()
+        blocking_types = set(blocking_types)
+        done_statuses = set(done_statuses)
+
+        self.keys = []
+        self.ids = {}
+        statuses, remaining, epic = [], [], []
+        for key, issue_type, status, estimate, spent in issues:
+            self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            statuses.append(status)
+            remaining.append(0.0 if status in done_statuses else max(float(estimate) - float(spent), 0.0))
+            epic.append(is_epic(issue_type))
+
+        linked, blocking = set(), set()
+        for source, target, link_type_name, direction in links:
+            a, b = self._id(source), self._id(target)
+            if a == b:
+                continue
+            linked.add((min(a, b), max(a, b)))
+            if link_type_name in blocking_types:
+                # outward: источник блокирует цель, inward - наоборот
+                blocking.add((a, b) if direction == 'outward' else (b, a))
+
+        n = self.n = len(self.keys)
+        # У задач вне jira_issues (цель связи не синхронизирована) нет статуса и оценки
+        self.statuses = statuses + [None] * (n - len(statuses))
+        self.remaining = np.array(remaining + [0.0] * (n - len(remaining)))
+        epic = np.array(epic + [False] * (n - len(epic)), dtype=bool)
+
+        pairs = np.array(sorted(linked), dtype=np.int64).reshape(-1, 2)
+        self.edge_count = len(pairs)
+        self.indptr, self.indices = csr(n, np.r_[pairs[:, 0], pairs[:, 1]], np.r_[pairs[:, 1], pairs[:, 0]])
+        # Узлы графа связей: задачи со связями и эпики (из jira_issues)
+        has_links = np.diff(self.indptr) > 0
+        self.graph_nodes = np.flatnonzero((has_links | epic)[:len(statuses)])
+
+        labels = component_labels(n, pairs[:, 0], pairs[:, 1])
+        _, self.component = np.unique(labels, return_inverse=True)
+        self.component_count = int(self.component.max()) + 1 if n else 0
+        self.component_bounds, self.component_members = group(self.component, self.component_count)
+
+        blocking = np.array(sorted(blocking), dtype=np.int64).reshape(-1, 2)
+        self.blocking_count = len(blocking)
+        self.blocks = csr(n, blocking[:, 0], blocking[:, 1])
+        self.blocked_by = csr(n, blocking[:, 1], blocking[:, 0])
+        self._critical_chains(blocking)
+        self.seconds = time.perf_counter() - started
+
+    def _id(self, key: str) -> int:
+        """Номер задачи; неизвестная (цель связи вне jira_issues) добавляется"""
+        issue_id = self.ids.get(key)
+        if issue_id is None:
+            issue_id = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+        return issue_id
+
+    def _critical_chains(self, blocking: np.ndarray):
+        """Циклы блокировок и самые длинные цепочки блокировок.
+
+        Сильно связная компонента (цикл) считается одним шагом с суммой
+        оценок задач; по компонентам в топологическом порядке для каждой
+        считается самая тяжелая цепочка, которая в нее приводит.
+        """
+        scc, count = strongly_connected(self.n, *self.blocks)
+        self.scc = scc
+        self.scc_bounds, self.scc_members = group(scc, count)
+        sizes = np.diff(self.scc_bounds)
+        cyclic = np.flatnonzero(sizes > 1)
+        self.cycles = cyclic[np.argsort(-sizes[cyclic], kind='stable')]
+
+        weight = np.bincount(scc, weights=self.remaining, minlength=count)
+        chain = weight.copy()
+        previous = np.full(count, -1, dtype=np.int64)
+        cross = np.stack([scc[blocking[:, 0]], scc[blocking[:, 1]]], axis=1)
+        cross = cross[cross[:, 0] != cross[:, 1]]
+        # Номер компоненты-источника больше - идем от больших номеров к меньшим
+        cross = cross[np.argsort(-cross[:, 0], kind='stable')]
+        chain_list, weight_list, previous_list = chain.tolist(), weight.tolist(), previous.tolist()
+        for u, v in cross.tolist():
+            candidate = chain_list[u] + weight_list[v]
+            if candidate > chain_list[v]:
+                chain_list[v] = candidate
+                previous_list[v] = u
+        self.chain = np.array(chain_list)
+        self.chain_previous = previous_list
+
+    def issue(self, issue_id: int, **extra) -> Dict:
+        return {
+            'issue_key': self.keys[issue_id],
+            'status': self.statuses[issue_id],
+            'remaining': round(float(self.remaining[issue_id]), 2),
+            **extra,
+        }
+
+    def graph_keys(self) -> List[str]:
+        return [self.keys[i] for i in self.graph_nodes.tolist()]
+
+    def link_pairs(self) -> List[Tuple[str, str]]:
+        """Связи (без направления) парами ключей"""
+        keys = self.keys
+        sources = np.repeat(np.arange(self.n), np.diff(self.indptr))
+        mask = sources < self.indices
+        return [(keys[a], keys[b]) for a, b in zip(sources[mask].tolist(), self.indices[mask].tolist())]
+
+    def component_issues(self, number: int) -> List[str]:
+        members = self.component_members[self.component_bounds[number]:self.component_bounds[number + 1]]
+        return sorted(self.keys[i] for i in members.tolist())
+
+    def components(self, min_size: int = 2, limit: int = 50) -> Dict:
+        """Компоненты связности не меньше min_size задач, от больших к меньшим"""
+        sizes = np.diff(self.component_bounds)
+        selected = np.flatnonzero(sizes >= min_size)
+        selected = selected[np.argsort(-sizes[selected], kind='stable')]
+        return {
+            'count': len(selected),
+            'components': [
+                {'size': int(sizes[number]), 'issues': self.component_issues(number)}
+                for number in selected[:limit].tolist()
+            ],
+        }
+
+    def transitive(self, issue_id: int, dependents: bool) -> List[Dict]:
+        """Все, кого задача блокирует (dependents=True) или кто блокирует ее
+        - напрямую или через цепочку; depth - длина кратчайшей цепочки"""
+        nodes, depths = reachable(*(self.blocks if dependents else self.blocked_by), issue_id)
+        order = np.lexsort((nodes, depths))
+        return [self.issue(node, depth=depth)
+                for node, depth in zip(nodes[order].tolist(), depths[order].tolist())]
+
+    def cycles_list(self, limit: int = 50) -> Dict:
+        return {
+            'count': len(self.cycles),
+            'cycles': [
+                sorted(self.keys[i] for i in self.scc_members[self.scc_bounds[c]:self.scc_bounds[c + 1]].tolist())
+                for c in self.cycles[:limit].tolist()
+            ],
+        }
+
+    def critical_path(self, issue_id: Optional[int] = None) -> Dict:
+        """Самая тяжелая по оставшейся оценке цепочка блокировок: ведущая к
+        задаче issue_id или, если она не задана, самая тяжелая во всем графе.
+        Задачи цикла идут одним шагом (in_cycle)."""
+        if self.n == 0:
+            return {'path': [], 'total_remaining': 0.0}
+        end = int(np.argmax(self.chain)) if issue_id is None else int(self.scc[issue_id])
+        steps = []
+        while end != -1:
+            steps.append(end)
+            end = self.chain_previous[end]
+        path = []
+        for step in reversed(steps):
+            members = self.scc_members[self.scc_bounds[step]:self.scc_bounds[step + 1]].tolist()
+            for member in sorted(members, key=self.keys.__getitem__):
+                path.append(self.issue(member, in_cycle=len(members) > 1))
+        total = self.chain[self.scc[issue_id]] if issue_id is not None else self.chain.max()
+        return {'path': path, 'total_remaining': round(float(total), 2)}
+
+    def stats(self) -> Dict:
+        return {
+            'issues': self.n,
+            'links': self.edge_count,
+            'blocking_links': self.blocking_count,
+            'components': int((np.diff(self.component_bounds) > 1).sum()),
+            'cycles': len(self.cycles),
+            'build_seconds': round(self.seconds, 3),
+        }
+
+
+class GraphIndex:
+    """Индекс текущей версии данных; перестраивается при смене версии"""
+
+    def __init__(self, blocking_types: Iterable[str], done_statuses: Iterable[str]):
+        self.blocking_types = tuple(blocking_types)
+        self.done_statuses = tuple(done_statuses)
+        self._lock = threading.Lock()
+        self.version = None
+        self._graph = None
+
+    def get(self, version: Optional[Hashable], load: Callable[[], Tuple[Iterable, Iterable]]) -> LinkGraph:
+        """Индекс версии version; load() -> (строки ISSUES_SQL, строки
+        LINKS_SQL) вызывается только при смене версии. version=None - индекс
+        строится заново и не запоминается."""
+        with self._lock:
+            if version is not None and version == self.version:
+                return self._graph
+            issues, links = load()
+            graph = LinkGraph(issues, links, self.blocking_types, self.done_statuses)
+            if version is not None:
+                self.version = version
+                self._graph = graph
+            return graph
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return self._graph.stats() if self._graph is not None else {}
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Раскладка графа связей задач (GET /api/graph) на сервере.
+
+Браузеру не нужно считать физику vis.js по всему графу: координаты узлов
+приходят вместе с узлами, и граф рисуется сразу, без стабилизации.
+
+Граф делится на компоненты связности, каждая раскладывается отдельно
+силовым алгоритмом Фрюхтермана - Рейнгольда (векторно, NumPy), затем
+компоненты укладываются полками от больших к меньшим. Раскладка
+компоненты зависит только от ее состава (задачи и связи), поэтому:
+- после синхронизации пересчитываются только изменившиеся компоненты,
+  остальные берутся из прошлой раскладки;
+- у всех воркеров gunicorn раскладка одинаковая (случайное начальное
+  положение задается хэшем состава компоненты).
+
+Раскладка хранится в памяти процесса до смены версии данных (data_version).
+"""
+
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Желаемая длина связи (в координатах vis.js)
+SPRING_LENGTH = 180
+# Отступ между компонентами при укладке
+COMPONENT_GAP = 120
+
+# Итераций силового алгоритма
+ITERATIONS = 200
+# До скольких узлов отталкивание считается между всеми парами (O(n^2) за
+# шаг); в больших компонентах каждый узел отталкивается от REPULSION_SAMPLE
+# случайных узлов с весом n / REPULSION_SAMPLE
+EXACT_LIMIT = 500
+REPULSION_SAMPLE = 300
+# Сколько пар узлов отталкивание считает за раз (ограничивает память)
+BLOCK_PAIRS = 2 * 10 ** 6
+
+def component_labels(n: int, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Номер компоненты связности каждого узла - наименьший номер узла в ней.
+
+    Метки распространяются по связям (np.minimum.at) со сжатием путей
+    (labels[labels]), число проходов - порядка логарифма диаметра графа.
+    """
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[sources], labels[targets])
+        updated = labels.copy()
+        np.minimum.at(updated, sources, low)
+        np.minimum.at(updated, targets, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def force_layout(n: int, sources: np.ndarray, targets: np.ndarray, seed: int) -> np.ndarray:
+    """Координаты (n, 2) узлов связной компоненты, центр - в нуле"""
+    if n == 1:
+        return np.zeros((1, 2))
+    if n == 2:
+        return np.array([[-SPRING_LENGTH / 2, 0.0], [SPRING_LENGTH / 2, 0.0]])
+
+    k = float(SPRING_LENGTH)
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-0.5, 0.5, (n, 2)) * k * np.sqrt(n)
+    sample = n if n <= EXACT_LIMIT else REPULSION_SAMPLE
+    repulsion = k * k * n / sample
+    temperature = k * np.sqrt(n) / 10
+    block = max(1, BLOCK_PAIRS // sample)
+
+    for iteration in range(ITERATIONS):
+        x, y = positions[:, 0], positions[:, 1]
+        others = slice(None) if sample == n else rng.choice(n, sample, replace=False)
+        other_x, other_y = x[others], y[others]
+        displacement = np.zeros((n, 2))
+        # Отталкивание: k^2 / d вдоль разности координат (пара узла с самим
+        # собой дает нулевую разность)
+        for start in range(0, n, block):
+            dx = x[start:start + block, None] - other_x[None, :]
+            dy = y[start:start + block, None] - other_y[None, :]
+            weight = repulsion / np.maximum(dx * dx + dy * dy, 0.01)
+            displacement[start:start + block, 0] = (dx * weight).sum(axis=1)
+            displacement[start:start + block, 1] = (dy * weight).sum(axis=1)
+        # Притяжение по связям: d^2 / k
+        delta = positions[sources] - positions[targets]
+        distance = np.sqrt((delta ** 2).sum(axis=1))
+        force = delta * (distance / k)[:, None]
+        np.subtract.at(displacement, sources, force)
+        np.add.at(displacement, targets, force)
+        # Сдвиг не больше текущей "температуры", которая линейно остывает
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+        step = temperature * (1 - iteration / ITERATIONS)
+        positions += displacement * (np.minimum(length, step) / length)[:, None]
+
+    return positions - (positions.min(axis=0) + positions.max(axis=0)) / 2
+
+
+def pack_components(sizes: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Центры прямоугольников (ширина, высота) при укладке полками: слева
+    направо, новая полка - когда ряд шире примерно квадратной укладки"""
+    area = sum((w + COMPONENT_GAP) * (h + COMPONENT_GAP) for w, h in sizes)
+    row_width = max(np.sqrt(area) * 1.2, max(w for w, _ in sizes) + COMPONENT_GAP)
+    centers = []
+    x = y = row_height = 0.0
+    for w, h in sizes:
+        if x > 0 and x + w > row_width:
+            x, y = 0.0, y + row_height + COMPONENT_GAP
+            row_height = 0.0
+        centers.append((x + w / 2, y + h / 2))
+        x += w + COMPONENT_GAP
+        row_height = max(row_height, h)
+    return centers
+
+
+class GraphLayout:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self._positions = {}
+        # Раскладки компонент по хэшу состава: {signature: (keys, coords)}
+        self._components = {}
+        self.computed = self.reused = 0
+        self.seconds = 0.0
+
+    def positions(self, version: Optional[Hashable], load_graph: Callable[[], Tuple[List[str], Iterable[Tuple[str, str]]]]) -> Dict[str, Tuple[int, int]]:
+        """{issue_key: (x, y)} для версии данных version.
+
+        load_graph() -> (ключи узлов, пары (источник, цель)) вызывается
+        только при смене версии; version=None - раскладка не запоминается.
+        Параллельные запросы ждут одного расчета, а не считают каждый свой.
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return self._positions
+            keys, edges = load_graph()
+            positions = self._layout(keys, edges)
+            if version is not None:
+                self.version = version
+                self._positions = positions
+            return positions
+
+    def _layout(self, keys: List[str], edges: Iterable[Tuple[str, str]]) -> Dict[str, Tuple[int, int]]:
+        started = time.perf_counter()
+        n = len(keys)
+        if n == 0:
+            self._components = {}
+            return {}
+        index = {key: i for i, key in enumerate(keys)}
+        # Связь хранится в обе стороны (inward/outward) - для раскладки одна
+        pairs = set()
+        for source, target in edges:
+            a, b = index.get(source), index.get(target)
+            if a is not None and b is not None and a != b:
+                pairs.add((min(a, b), max(a, b)))
+        pairs = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+        sources, targets = pairs[:, 0], pairs[:, 1]
+
+        labels = component_labels(n, sources, targets)
+        node_order = np.argsort(labels, kind='stable')
+        node_bounds = np.flatnonzero(np.diff(labels[node_order])) + 1
+        edge_labels = labels[sources]
+        edge_order = np.argsort(edge_labels, kind='stable')
+        edge_split = np.searchsorted(edge_labels[edge_order], labels[node_order[np.r_[0, node_bounds]]])
+        edge_split = np.r_[edge_split, len(edge_order)]
+
+        local = np.empty(n, dtype=np.int64)
+        components = {}
+        for number, members in enumerate(np.split(node_order, node_bounds)):
+            # Порядок узлов внутри компоненты - по ключу, чтобы состав
+            # однозначно задавал и хэш, и раскладку
+            members = members[np.argsort([keys[i] for i in members])]
+            local[members] = np.arange(len(members))
+            component_edges = edge_order[edge_split[number]:edge_split[number + 1]]
+            local_pairs = np.sort(np.stack([local[sources[component_edges]], local[targets[component_edges]]], axis=1), axis=1)
+            local_pairs = local_pairs[np.lexsort((local_pairs[:, 1], local_pairs[:, 0]))]
+            component_keys = tuple(keys[i] for i in members)
+
+            digest = hashlib.sha1('\n'.join(component_keys).encode('utf-8') + local_pairs.tobytes())
+            signature = digest.hexdigest()
+            cached = self._components.get(signature)
+            if cached is None:
+                coords = force_layout(len(members), local_pairs[:, 0], local_pairs[:, 1],
+                                      seed=int.from_bytes(digest.digest()[:8], 'little'))
+                self.computed += 1
+            else:
+                coords = cached[1]
+                self.reused += 1
+            components[signature] = (component_keys, coords)
+
+        # Большие компоненты - первыми; при равном размере - по хэшу
+        ordered = sorted(components.items(), key=lambda item: (-len(item[1][0]), item[0]))
+        sizes = [tuple(coords.max(axis=0) - coords.min(axis=0)) for _, (_, coords) in ordered]
+        positions = {}
+        for (_, (component_keys, coords)), center in zip(ordered, pack_components(sizes)):
+            shifted = np.rint(coords + center).astype(int)
+            positions.update(zip(component_keys, map(tuple, shifted.tolist())))
+
+        # Хранятся только компоненты текущего графа
+        self._components = components
+        self.seconds = time.perf_counter() - started
+        return positions
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'nodes': len(self._positions),
+                'components': len(self._components),
+                'components_computed': self.computed,
+                'components_reused': self.reused,
+                'last_layout_seconds': round(self.seconds, 3),
+            }
@@ -12,8 +12,12 @@ load_dotenv()
 # SQL для создания таблицы
 CREATE_TABLE_SQL = """
 -- Удаляем старую таблицу если есть
+DROP TABLE IF EXISTS data_version CASCADE;
+DROP TABLE IF EXISTS sync_runs CASCADE;
+DROP TABLE IF EXISTS jira_sync_state CASCADE;
 DROP TABLE IF EXISTS jira_issue_links CASCADE;
 DROP TABLE IF EXISTS jira_issues CASCADE;
+DROP TABLE IF EXISTS jira_sprints CASCADE;
 
 -- Создаем новую таблицу задач
 CREATE TABLE jira_issues (
@@ -61,10 +65,9 @@ CREATE INDEX idx_sprint ON jira_issues(sprint);
 CREATE INDEX idx_epic_link ON jira_issues(epic_link);
 
 -- Создаем индексы для связей
-CREATE INDEX idx_source_issue ON jira_issue_links(source_issue_key);
+-- (поиск по source_issue_key обслуживает уникальный индекс uq_issue_link из UPGRADE_SQL)
 CREATE INDEX idx_target_issue ON jira_issue_links(target_issue_key);
 CREATE INDEX idx_link_type ON jira_issue_links(link_type);
-CREATE INDEX idx_both_issues ON jira_issue_links(source_issue_key, target_issue_key);
 
 -- Комментарии
 COMMENT ON TABLE jira_issues IS 'Таблица для хранения задач из Jira';
@@ -76,6 +79,261 @@ COMMENT ON TABLE jira_issue_links IS 'Детальная информация о
 COMMENT ON COLUMN jira_issue_links.direction IS 'Направление связи: inward или outward';
 """
 
+# Материализованные сводки из UPGRADE_SQL, которые jira_sync.py обновляет
+# после записи
+ROLLUP_VIEWS = ('rollup_totals', 'rollup_status', 'rollup_type', 'rollup_sprint')
+
+# Идемпотентные дополнения схемы: их можно безопасно применять к уже
+# существующей БД, поэтому jira_sync.py выполняет их при каждом запуске
+UPGRADE_SQL = """
+-- Состояние инкрементальной синхронизации по каждому JQL
+CREATE TABLE IF NOT EXISTS jira_sync_state (
+    jql TEXT PRIMARY KEY,
+    watermark TIMESTAMPTZ,
+    last_full_sync TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE jira_sync_state IS 'Состояние инкрементальной синхронизации для каждого JQL';
+COMMENT ON COLUMN jira_sync_state.watermark IS 'Максимальный updated (с часовым поясом) среди уже синхронизированных задач';
+COMMENT ON COLUMN jira_sync_state.last_full_sync IS 'Время последней полной синхронизации';
+
+-- Прежний watermark хранился без часового пояса (смещение из ответа Jira
+-- отбрасывалось), и восстановить момент нельзя. Сбрасываем его: следующий
+-- запуск по каждому JQL будет полным и запишет точный watermark
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'jira_sync_state' AND column_name = 'watermark'
+          AND table_schema = current_schema()
+          AND data_type = 'timestamp without time zone'
+    ) THEN
+        ALTER TABLE jira_sync_state ALTER COLUMN watermark TYPE TIMESTAMPTZ USING NULL;
+    END IF;
+END $$;
+
+-- Хеши содержимого: неизменившиеся задачи и связи синхронизация не перезаписывает
+ALTER TABLE jira_issues ADD COLUMN IF NOT EXISTS content_hash CHAR(32);
+ALTER TABLE jira_issues ADD COLUMN IF NOT EXISTS links_hash CHAR(32);
+
+COMMENT ON COLUMN jira_issues.content_hash IS 'MD5 разобранных полей задачи';
+COMMENT ON COLUMN jira_issues.links_hash IS 'MD5 набора связей задачи';
+
+-- Естественный ключ связи: синхронизация применяет к связям только разницу
+-- (вставки/обновления/удаления) и опирается на ON CONFLICT по этому ключу.
+-- Перед созданием индекса убираем дубли, оставшиеся от прежней схемы;
+-- индексы по source_issue_key и (source, target) покрываются новым индексом
+DO $$
+BEGIN
+    IF to_regclass('uq_issue_link') IS NULL THEN
+        DELETE FROM jira_issue_links a
+        USING jira_issue_links b
+        WHERE a.id > b.id
+          AND a.source_issue_key = b.source_issue_key
+          AND a.target_issue_key = b.target_issue_key
+          AND a.link_type IS NOT DISTINCT FROM b.link_type
+          AND a.direction IS NOT DISTINCT FROM b.direction;
+        CREATE UNIQUE INDEX uq_issue_link
+            ON jira_issue_links (source_issue_key, target_issue_key, link_type, direction);
+        DROP INDEX IF EXISTS idx_source_issue;
+        DROP INDEX IF EXISTS idx_both_issues;
+    END IF;
+END $$;
+
+-- Справочник спринтов из данных спринта задач (customfield_10104).
+-- Текущий спринт ищется по индексу idx_sprints_current, а не разбором
+-- названий всех задач
+CREATE TABLE IF NOT EXISTS jira_sprints (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(500),
+    number INTEGER,
+    state VARCHAR(20),
+    board_id INTEGER,
+    start_date TIMESTAMP,
+    end_date TIMESTAMP,
+    complete_date TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sprints_current
+    ON jira_sprints ((state = 'ACTIVE') DESC, start_date DESC NULLS LAST, id DESC);
+
+-- Данные спринтов (id, состояние, даты) есть только в ответе Jira, поэтому
+-- заполнить sprint_id из уже сохраненных задач нельзя. При добавлении
+-- колонки сбрасываем отметку полной синхронизации: следующий запуск по
+-- каждому JQL будет полным (хеш задачи включает sprint_id, так что
+-- перезапишутся все задачи) и виджеты текущего спринта не останутся пустыми
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'jira_issues' AND column_name = 'sprint_id'
+          AND table_schema = current_schema()
+    ) THEN
+        ALTER TABLE jira_issues ADD COLUMN sprint_id INTEGER
+            REFERENCES jira_sprints(id) ON DELETE SET NULL;
+        UPDATE jira_sync_state SET last_full_sync = NULL;
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_sprint_id ON jira_issues(sprint_id);
+
+COMMENT ON TABLE jira_sprints IS 'Спринты Jira: номер, состояние (ACTIVE/CLOSED/FUTURE) и даты';
+COMMENT ON COLUMN jira_sprints.number IS 'Номер из названия спринта (#24), если есть';
+COMMENT ON COLUMN jira_issues.sprint_id IS 'Последний спринт задачи (jira_sprints.id)';
+
+-- Постраничная выдача /api/issues: на каждую сортировку индекс
+-- (выражение сортировки, issue_key) - страница читается с места, где
+-- закончилась предыдущая, без сортировки всей таблицы
+CREATE INDEX IF NOT EXISTS idx_issues_page_updated
+    ON jira_issues ((COALESCE(updated_date, '-infinity'::timestamp)), issue_key);
+CREATE INDEX IF NOT EXISTS idx_issues_page_summary
+    ON jira_issues ((COALESCE(summary, '')), issue_key);
+CREATE INDEX IF NOT EXISTS idx_issues_page_assignee
+    ON jira_issues ((COALESCE(assignee, '')), issue_key);
+CREATE INDEX IF NOT EXISTS idx_issues_page_estimate
+    ON jira_issues ((COALESCE(time_original_estimate, 0)), issue_key);
+CREATE INDEX IF NOT EXISTS idx_issues_page_spent
+    ON jira_issues ((COALESCE(time_spent, 0)), issue_key);
+CREATE INDEX IF NOT EXISTS idx_issue_type ON jira_issues(issue_type);
+CREATE INDEX IF NOT EXISTS idx_priority ON jira_issues(priority);
+
+-- Квартальный отчет: задачи квартала без эпиков по диапазону created_date;
+-- GIN - поиск задач по меткам (labels && / @>)
+CREATE INDEX IF NOT EXISTS idx_created_type ON jira_issues(created_date, issue_type);
+CREATE INDEX IF NOT EXISTS idx_labels ON jira_issues USING GIN (labels);
+
+-- Версия данных по областям (см. data_version.py): растет с каждой
+-- записывающей транзакцией, из нее app.py строит ETag/Last-Modified.
+-- changed_at тоже входит в ETag, поэтому пересоздание таблицы не вернет
+-- старые ETag
+CREATE TABLE IF NOT EXISTS data_version (
+    scope VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO data_version (scope) VALUES ('jira'), ('gsc'), ('sync') ON CONFLICT DO NOTHING;
+
+COMMENT ON TABLE data_version IS 'Версия данных: jira - синхронизация, gsc - данные Search Console, sync - успешные запуски синхронизации';
+
+-- Направления квартального отчета по меткам задач. Задача относится к
+-- направлению первой (по порядку меток в задаче) метки из таблицы, без
+-- подходящих меток - к 'Прочее'. Таблица редактируется вручную и при
+-- пересоздании схемы не удаляется; правка увеличивает версию данных jira,
+-- чтобы отчет пересчитался
+CREATE TABLE IF NOT EXISTS label_directions (
+    label VARCHAR(255) PRIMARY KEY,
+    direction VARCHAR(255) NOT NULL
+);
+INSERT INTO label_directions (label, direction) VALUES
+    ('Тех.Аудит', 'Технический SEO'),
+    ('Оптимизация', 'Технический SEO'),
+    ('SERP_Google', 'Технический SEO'),
+    ('Яндекс.Поиск', 'Технический SEO'),
+    ('Микроразметка', 'Микроразметка'),
+    ('Статья', 'Контент'),
+    ('Блог', 'Контент'),
+    ('Контент_План', 'Контент'),
+    ('Аналитика_SEO', 'Аналитика'),
+    ('Отчеты_SEO', 'Аналитика'),
+    ('Автоматизация', 'Аналитика'),
+    ('Запросы', 'Контент'),
+    ('Линкбилдинг', 'Линкбилдинг'),
+    ('Партнеры', 'Линкбилдинг')
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION label_directions_changed() RETURNS trigger AS $$
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+    WHERE scope = 'jira';
+    PERFORM pg_notify('data_version', 'jira');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- По строкам, а не по оператору: повторный посев выше (ON CONFLICT DO
+-- NOTHING) ничего не вставляет и версию не трогает
+DROP TRIGGER IF EXISTS trg_label_directions_changed ON label_directions;
+CREATE TRIGGER trg_label_directions_changed
+    AFTER INSERT OR UPDATE OR DELETE ON label_directions
+    FOR EACH ROW EXECUTE PROCEDURE label_directions_changed();
+
+COMMENT ON TABLE label_directions IS 'Метка задачи -> направление квартального отчета';
+
+-- Сводки для дашборда (/api/statistics, /api/current-sprint-stats):
+-- jira_sync.py обновляет их в конце каждого запуска, изменившего данные
+-- (REFRESH ... CONCURRENTLY - чтение не блокируется). Уникальные индексы
+-- нужны для CONCURRENTLY
+CREATE MATERIALIZED VIEW IF NOT EXISTS rollup_totals AS
+SELECT 1 AS id,
+       (SELECT COUNT(*) FROM jira_issues) AS issues,
+       (SELECT COUNT(*) FROM jira_issue_links) AS links;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rollup_totals ON rollup_totals (id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rollup_status AS
+SELECT status, COUNT(*) AS count FROM jira_issues GROUP BY status;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rollup_status ON rollup_status (status);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rollup_type AS
+SELECT issue_type, COUNT(*) AS count FROM jira_issues GROUP BY issue_type;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rollup_type ON rollup_type (issue_type);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rollup_sprint AS
+SELECT sprint_id, sprint,
+       COUNT(*) AS total_tasks,
+       COUNT(*) FILTER (WHERE status = 'Готово') AS completed_tasks,
+       COUNT(*) FILTER (WHERE status = 'В работе') AS in_progress_tasks,
+       COUNT(*) FILTER (WHERE status = 'Открыто') AS open_tasks,
+       SUM(time_original_estimate) AS total_estimate,
+       SUM(time_spent) AS total_spent,
+       SUM(time_spent) FILTER (WHERE status = 'Готово') AS completed_spent
+FROM jira_issues
+WHERE sprint IS NOT NULL OR sprint_id IS NOT NULL
+GROUP BY sprint_id, sprint;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rollup_sprint ON rollup_sprint (sprint_id, sprint);
+
+COMMENT ON MATERIALIZED VIEW rollup_sprint IS 'Задачи, оценка и списанное время по спринтам';
+
+-- История запусков синхронизации с замерами по этапам (см. sync_metrics.py)
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id SERIAL PRIMARY KEY,
+    jql TEXT,
+    mode VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    error TEXT,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    duration_seconds NUMERIC(12, 3),
+    fetch_seconds NUMERIC(12, 3),
+    parse_seconds NUMERIC(12, 3),
+    db_seconds NUMERIC(12, 3),
+    http_seconds NUMERIC(12, 3),
+    pages INTEGER,
+    bytes BIGINT,
+    issues_fetched INTEGER,
+    issues_saved INTEGER,
+    inserted INTEGER,
+    changed INTEGER,
+    unchanged INTEGER,
+    deleted INTEGER,
+    db_rows INTEGER,
+    http_requests INTEGER,
+    http_retries INTEGER,
+    http_throttled INTEGER,
+    page_timings JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_runs_started ON sync_runs (started_at DESC);
+-- Время последней успешной синхронизации (/api/bootstrap)
+CREATE INDEX IF NOT EXISTS idx_sync_runs_last_ok ON sync_runs (finished_at DESC)
+    WHERE status = 'ok' AND mode IN ('full', 'incremental');
+
+COMMENT ON TABLE sync_runs IS 'Запуски синхронизации: длительность этапов, объемы и повторы запросов к Jira';
+COMMENT ON COLUMN sync_runs.fetch_seconds IS 'Сколько обработка ждала страницы из Jira';
+COMMENT ON COLUMN sync_runs.http_seconds IS 'Суммарное время HTTP-запросов страниц (идут параллельно)';
+COMMENT ON COLUMN sync_runs.page_timings IS 'По каждой странице: startAt, задач, байт, секунд';
+"""
+
 def main():
     # Настройки подключения
     conn_params = {
@@ -101,6 +359,7 @@ def main():
         
         # Выполняем SQL
         cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(UPGRADE_SQL)
         conn.commit()
         
         print("✓ Таблица jira_issues успешно создана!")
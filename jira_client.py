@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Общий HTTP-клиент Jira REST API для jira_sync.py и jira_comments.py.
+
+- Повторяет запрос при сетевых ошибках и ответах 429/502/503/504 с
+  экспоненциальной задержкой и случайным джиттером, а если Jira прислала
+  Retry-After - ждет не меньше указанного.
+- Неидемпотентные запросы (POST) повторяются только там, где Jira их
+  гарантированно не выполнила: 429 и ошибка установки соединения.
+- Ограничивает число одновременных запросов адаптивно (AIMD): каждый 429
+  вдвое уменьшает лимит, медленные ответы уменьшают его понемногу, а
+  быстрые успешные ответы плавно возвращают к максимуму.
+- Считает запросы, повторы, 429 и ошибки - см. stats().
+
+Один экземпляр можно использовать из нескольких потоков.
+"""
+
+import os
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Методы, которые безопасно повторять при любой временной ошибке
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Больше этого не ждем, даже если Retry-After просит дольше
+MAX_RETRY_AFTER = 300.0
+
+
+class JiraHttpError(Exception):
+    """Запрос к Jira не удался (после всех повторов)"""
+
+    def __init__(self, message: str, response: Optional[requests.Response] = None):
+        super().__init__(message)
+        self.response = response
+
+
+class AdaptiveLimiter:
+    """Адаптивный лимит одновременных запросов (additive increase / multiplicative decrease)"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, target_latency: float = 5.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.target_latency = target_latency
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_throttled(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+    def on_success(self, latency: float):
+        with self._cond:
+            if latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                # +1 к лимиту примерно за "окно" из limit успешных запросов
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class JiraHttpClient:
+    def __init__(self, jira_url: str, login: str, password: str, max_concurrency: int = 4):
+        self.jira_url = jira_url.rstrip('/')
+        self.max_retries = int(os.getenv('JIRA_HTTP_MAX_RETRIES', 5))
+        self.backoff_base = float(os.getenv('JIRA_HTTP_BACKOFF_BASE', 1.0))
+        self.backoff_max = float(os.getenv('JIRA_HTTP_BACKOFF_MAX', 60.0))
+        self.limiter = AdaptiveLimiter(
+            max_concurrency,
+            target_latency=float(os.getenv('JIRA_HTTP_TARGET_LATENCY', 5.0))
+        )
+
+        self.session = requests.Session()
+        self.session.auth = (login, password)
+        self.session.headers.update({'Accept': 'application/json'})
+        # Пул соединений должен вмещать все параллельные запросы,
+        # иначе лишние соединения будут открываться и закрываться каждый раз
+        adapter = HTTPAdapter(pool_maxsize=max(1, max_concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'throttled': 0,
+                       'server_errors': 0, 'network_errors': 0, 'failures': 0,
+                       'backoff_seconds': 0.0, 'bytes': 0}
+
+    def url(self, path: str) -> str:
+        return f"{self.jira_url}{path}"
+
+    def _count(self, name: str, value=1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def stats(self) -> Dict:
+        """Счетчики с момента создания клиента и текущий лимит параллельности"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['concurrency_limit'] = round(self.limiter.limit, 2)
+        return stats
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = self._retry_after(response) if response is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, MAX_RETRY_AFTER) + random.uniform(0, self.backoff_base))
+        return delay
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        """Retry-After в секундах: Jira присылает число секунд или HTTP-дату"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Выполняет запрос с повторами и возвращает последний ответ.
+
+        Ответ с ошибкой, которую не повторяют (например, 404), возвращается
+        как есть - проверять статус должен вызывающий код. JiraHttpError
+        бросается, если не удалось подключиться или повторы закончились.
+        """
+        kwargs.setdefault('timeout', 30)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            response = None
+            error = None
+            self._count('requests')
+            self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
+            finally:
+                self.limiter.release()
+            latency = time.monotonic() - started
+
+            if error is not None:
+                self._count('network_errors')
+                # Если соединение так и не установилось, Jira запрос точно не получила
+                retryable = idempotent or isinstance(error, requests.exceptions.ConnectTimeout)
+                message = f"Не удалось выполнить запрос к Jira: {error}"
+            elif response.status_code == 429:
+                self._count('throttled')
+                self.limiter.on_throttled()
+                retryable = True
+                message = f"Jira ограничивает частоту запросов (429): {response.text[:200]}"
+            elif response.status_code in RETRY_STATUSES:
+                self._count('server_errors')
+                retryable = idempotent
+                message = f"Jira API вернул {response.status_code}: {response.text[:200]}"
+            else:
+                self.limiter.on_success(latency)
+                return response
+
+            if not retryable or attempt >= self.max_retries:
+                self._count('failures')
+                raise JiraHttpError(message, response) from error
+
+            delay = self._backoff(attempt, response)
+            self._count('retries')
+            self._count('backoff_seconds', delay)
+            attempt += 1
+            print(f"{message}. Повтор {attempt}/{self.max_retries} через {delay:.1f} с")
+            time.sleep(delay)
+
+    def get_json(self, path: str, **kwargs):
+        """GET по пути REST API; ответ не 2xx превращается в JiraHttpError"""
+        return self.get_json_with_size(path, **kwargs)[0]
+
+    def get_json_with_size(self, path: str, **kwargs) -> Tuple[Any, int]:
+        """Как get_json, но возвращает еще и размер тела ответа в байтах"""
+        response = self.request('GET', self.url(path), **kwargs)
+        if not response.ok:
+            self._count('failures')
+            raise JiraHttpError(
+                f"Jira API вернул {response.status_code}: {response.text[:500]}", response
+            )
+        size = len(response.content)
+        self._count('bytes', size)
+        return response.json(), size
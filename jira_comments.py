@@ -10,8 +10,8 @@
 """
 
 import os
-import requests
 from dotenv import load_dotenv
+from jira_client import JiraHttpClient, JiraHttpError
 
 load_dotenv()
 
@@ -30,18 +30,18 @@ class JiraCommentClient:
         if not all([self.jira_url, self.jira_login, self.jira_password]):
             raise JiraCommentError('JIRA_URL/JIRA_LOGIN/JIRA_PASSWORD не заданы в окружении')
 
-        self.session = requests.Session()
-        self.session.auth = (self.jira_login, self.jira_password)
-        self.session.headers.update({'Accept': 'application/json'})
+        # Повторы при 429/5xx и сетевых сбоях - в JiraHttpClient; POST
+        # (новый комментарий, вложение) повторяется только если Jira его точно не приняла
+        self.http = JiraHttpClient(self.jira_url, self.jira_login, self.jira_password)
 
     def _url(self, path: str) -> str:
-        return f"{self.jira_url}{path}"
+        return self.http.url(path)
 
     def _request(self, method: str, url: str, **kwargs):
         try:
-            return self.session.request(method, url, timeout=15, **kwargs)
-        except requests.exceptions.RequestException as e:
-            raise JiraCommentError(f"Не удалось подключиться к Jira: {e}") from e
+            return self.http.request(method, url, timeout=15, **kwargs)
+        except JiraHttpError as e:
+            raise JiraCommentError(str(e)) from e
 
     def _raise_for_status(self, response):
         if not response.ok:
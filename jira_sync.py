@@ -4,22 +4,222 @@
 """
 
 import os
+import io
 import sys
-import requests
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+import argparse
+from operator import itemgetter
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.extras import execute_values, RealDictCursor
 from dotenv import load_dotenv
 import json
 import re
+from init_database import UPGRADE_SQL, ROLLUP_VIEWS
+from db_pool import pg_config_from_env
+from jira_client import JiraHttpClient, JiraHttpError
+from page_archive import archive_pages, read_pages
+from sync_metrics import SyncMetrics, INSERT_RUN_SQL
+import data_version
+from jira_parser import (
+    ISSUE_COLUMNS, LINK_COLUMNS, SPRINT_COLUMNS, LINK_NATURAL_KEY, ISSUE_KEY, UPDATED_DATE, CONTENT_HASH, LINKS_HASH,
+    parse_issues, parse_jira_datetime, parse_jira_datetime_utc, seconds_to_hours, extract_sprint_name
+)
 
 # Загружаем переменные окружения
 load_dotenv()
 
+# JQL, который синхронизируется по умолчанию (если не передан аргументом)
+DEFAULT_JQL = "assignee=currentUser() AND created >= 2025-10-01 AND created <= 2025-12-16"
+
+# Хвост "ORDER BY ..." нужно оставить в конце JQL при добавлении условия по updated
+ORDER_BY_RE = re.compile(r'\s*\bORDER\s+BY\b.*$', re.IGNORECASE | re.DOTALL)
+
+# JQL сравнивает даты с точностью до минуты (часовой пояс пользователя Jira
+# учитывается в build_incremental_jql), поэтому запрашиваем задачи с
+# небольшим перекрытием - повторно полученные задачи просто перезапишутся
+# теми же данными
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Поля задачи, которые запрашиваются из Jira при синхронизации
+ISSUE_FIELDS = 'key,issuetype,status,created,timeoriginalestimate,timespent,updated,customfield_10104,customfield_10100,summary,assignee,reporter,priority,labels,issuelinks'
+
+# Сверка запрашивает только ключи - такой ответ крошечный, поэтому
+# страницы берем максимального для Jira Server размера
+KEYS_PAGE_SIZE = 1000
+
+# Режимы sync_runs, которые считаются синхронизацией (время последней
+# синхронизации на дашборде); сверка и replay - нет
+SYNC_RUN_MODES = ('full', 'incremental')
+# По сколько ключей кандидатов на удаление сверка перепроверяет в Jira
+# одним запросом (key in (...) в URL)
+VERIFY_KEYS_CHUNK = 200
+
+# Префикс имен advisory-блокировок PostgreSQL, которые не дают двум
+# запускам синхронизации одного JQL (или двум сверкам) идти одновременно
+LOCK_PREFIX = 'jira_sync:'
+
+# Способы записи пачки в БД: copy - COPY в staging-таблицу и слияние одним
+# запросом, values - INSERT ... VALUES через execute_values (запасной путь)
+LOAD_MODES = ('copy', 'values')
+
+# Ошибки, после которых COPY (и временные staging-таблицы) недоступны до
+# конца запуска и нужен запасной путь. Остальные ошибки (данные,
+# взаимоблокировки, сериализация) на values не переключают - с ними запуск
+# падает как обычно
+COPY_UNAVAILABLE_ERRORS = (
+    psycopg2.errors.InsufficientPrivilege,
+    psycopg2.errors.FeatureNotSupported,
+)
+
+ISSUE_COLUMNS_SQL = ', '.join(ISSUE_COLUMNS)
+LINK_COLUMNS_SQL = ', '.join(LINK_COLUMNS)
+
+# Обновление существующей задачи при конфликте по issue_key - общее для
+# обоих способов записи. Строки с теми же хешами не переписываются, даже
+# если попали в запрос (например, при параллельной синхронизации)
+ISSUE_CONFLICT_SQL = """
+ON CONFLICT (issue_key)
+DO UPDATE SET
+    issue_type = EXCLUDED.issue_type,
+    status = EXCLUDED.status,
+    created_date = EXCLUDED.created_date,
+    time_original_estimate = EXCLUDED.time_original_estimate,
+    time_spent = EXCLUDED.time_spent,
+    updated_date = EXCLUDED.updated_date,
+    sprint = EXCLUDED.sprint,
+    epic_link = EXCLUDED.epic_link,
+    summary = EXCLUDED.summary,
+    assignee = EXCLUDED.assignee,
+    reporter = EXCLUDED.reporter,
+    priority = EXCLUDED.priority,
+    labels = EXCLUDED.labels,
+    linked_issues = EXCLUDED.linked_issues,
+    content_hash = EXCLUDED.content_hash,
+    links_hash = EXCLUDED.links_hash,
+    last_synced = CURRENT_TIMESTAMP
+WHERE (jira_issues.content_hash, jira_issues.links_hash)
+    IS DISTINCT FROM (EXCLUDED.content_hash, EXCLUDED.links_hash)
+"""
+
+# При повторной загрузке из архива (replay) версия задачи из архива не
+# перезаписывает более свежую из БД - например, сохраненную синхронизацией
+# без архива или параллельно с replay
+ISSUE_REPLAY_CONFLICT_SQL = ISSUE_CONFLICT_SQL + """    AND (jira_issues.updated_date IS NULL
+         OR EXCLUDED.updated_date >= jira_issues.updated_date)
+"""
+
+# Ключ связи (source, target, link_type, direction) из кортежа связи
+link_key = itemgetter(*(LINK_COLUMNS.index(column) for column in LINK_NATURAL_KEY))
+
+# Вставка новых и обновление изменившихся связей по естественному ключу
+LINK_CONFLICT_SQL = f"""
+ON CONFLICT ({', '.join(LINK_NATURAL_KEY)})
+DO UPDATE SET
+    link_type_name = EXCLUDED.link_type_name,
+    direction_label = EXCLUDED.direction_label,
+    target_summary = EXCLUDED.target_summary,
+    target_status = EXCLUDED.target_status,
+    target_priority = EXCLUDED.target_priority
+WHERE (jira_issue_links.link_type_name, jira_issue_links.direction_label,
+       jira_issue_links.target_summary, jira_issue_links.target_status,
+       jira_issue_links.target_priority)
+    IS DISTINCT FROM (EXCLUDED.link_type_name, EXCLUDED.direction_label,
+                      EXCLUDED.target_summary, EXCLUDED.target_status,
+                      EXCLUDED.target_priority)
+"""
+
+# Справочник спринтов: новые вставляются, у известных обновляются
+# состояние и даты (спринт стартовал, закрыт, перенесен). RETURNING отдает
+# только реально записанные строки - по ним видно, менялись ли данные
+SPRINT_UPSERT_SQL = f"""
+INSERT INTO jira_sprints ({', '.join(SPRINT_COLUMNS)}) VALUES %s
+ON CONFLICT (id)
+DO UPDATE SET
+    name = EXCLUDED.name,
+    number = EXCLUDED.number,
+    state = EXCLUDED.state,
+    board_id = EXCLUDED.board_id,
+    start_date = EXCLUDED.start_date,
+    end_date = EXCLUDED.end_date,
+    complete_date = EXCLUDED.complete_date,
+    updated_at = CURRENT_TIMESTAMP
+WHERE ({', '.join(f'jira_sprints.{column}' for column in SPRINT_COLUMNS[1:])})
+    IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in SPRINT_COLUMNS[1:])})
+RETURNING id
+"""
+
+# Временные staging-таблицы живут до конца подключения и очищаются при
+# каждом COMMIT, поэтому создаются один раз на всю синхронизацию
+CREATE_STAGE_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS jira_issues_stage ON COMMIT DELETE ROWS AS
+    SELECT {ISSUE_COLUMNS_SQL} FROM jira_issues WITH NO DATA;
+CREATE TEMP TABLE IF NOT EXISTS jira_issue_links_stage ON COMMIT DELETE ROWS AS
+    SELECT {LINK_COLUMNS_SQL} FROM jira_issue_links WITH NO DATA;
+"""
+
+# Если одна задача попала в пачку дважды (например, сдвинулась между
+# страницами), берем самую свежую версию - иначе ON CONFLICT упадет
+MERGE_ISSUES_SQL = f"""
+INSERT INTO jira_issues ({ISSUE_COLUMNS_SQL})
+SELECT DISTINCT ON (issue_key) {ISSUE_COLUMNS_SQL}
+FROM jira_issues_stage
+ORDER BY issue_key, updated_date DESC
+"""
+
+MERGE_LINKS_SQL = f"""
+INSERT INTO jira_issue_links ({LINK_COLUMNS_SQL})
+SELECT {LINK_COLUMNS_SQL} FROM jira_issue_links_stage
+""" + LINK_CONFLICT_SQL
+
+# Спецсимволы текстового формата COPY
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def key_order_jql(jql: str) -> str:
+    """JQL со стабильным порядком по ключу (вместо своего ORDER BY)"""
+    return ORDER_BY_RE.sub('', jql) + ' ORDER BY key ASC'
+
+
+def copy_value(value) -> str:
+    """Форматирует значение для текстового формата COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, list):
+        # Литерал массива PostgreSQL: {"a","b"}
+        value = '{' + ','.join(
+            'NULL' if item is None
+            else '"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"'
+            for item in value
+        ) + '}'
+    elif isinstance(value, datetime):
+        value = value.isoformat(sep=' ')
+    else:
+        value = str(value)
+    return value.translate(COPY_ESCAPES)
+
+
+def copy_buffer(rows: List[tuple]) -> io.StringIO:
+    """Собирает строки в буфер для COPY ... FROM STDIN"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(map(copy_value, row)))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
 
 class JiraSync:
-    def __init__(self):
+    def __init__(self, fetch_workers: Optional[int] = None, client: Optional[JiraHttpClient] = None,
+                 db_pool=None, offline: bool = False):
+        """client и db_pool можно передать общими для нескольких экземпляров
+        (так делает демон jira_sync_daemon.py); по умолчанию создаются свои.
+        offline=True - без Jira (для replay): переменные JIRA_* не нужны."""
         # Jira настройки
         jira_url = os.getenv('JIRA_URL')
         # Убираем trailing slash если есть
@@ -28,7 +228,7 @@ class JiraSync:
         self.jira_password = os.getenv('JIRA_PASSWORD')
         
         # Проверяем наличие всех необходимых переменных
-        if not all([self.jira_url, self.jira_login, self.jira_password]):
+        if not offline and not all([self.jira_url, self.jira_login, self.jira_password]):
             print("ОШИБКА: Не все переменные окружения заданы!")
             print(f"JIRA_URL: {'✓' if self.jira_url else '✗'}")
             print(f"JIRA_LOGIN: {'✓' if self.jira_login else '✗'}")
@@ -36,335 +236,910 @@ class JiraSync:
             sys.exit(1)
         
         # PostgreSQL настройки
-        self.pg_config = {
-            'host': os.getenv('PGHOST'),
-            'user': os.getenv('PGUSER'),
-            'password': os.getenv('PGPASSWORD'),
-            'database': os.getenv('PGDATABASE'),
-            'port': os.getenv('PGPORT', 5432)
-        }
+        self.pg_config = pg_config_from_env()
+        self.db_pool = db_pool
         
-        self.session = requests.Session()
-        self.session.auth = (self.jira_login, self.jira_password)
-        self.session.headers.update({'Accept': 'application/json'})
-    
-    def extract_sprint_name(self, sprint_data: Optional[List]) -> Optional[str]:
-        """Извлекает название спринта из массива данных"""
-        if not sprint_data or len(sprint_data) == 0:
-            return None
+        # Как часто инкрементальная синхронизация принудительно делает полную
+        self.full_resync_interval = timedelta(hours=float(os.getenv('JIRA_FULL_RESYNC_HOURS', 24)))
+        
+        # Сколько страниц поиска запрашивать из Jira одновременно
+        self.fetch_workers = max(1, fetch_workers or int(os.getenv('JIRA_FETCH_WORKERS', 4)))
         
-        # Берем последний спринт (активный)
-        sprint_str = sprint_data[-1] if isinstance(sprint_data, list) else sprint_data
+        # По сколько задач сохранять в БД за одну транзакцию
+        self.batch_size = max(1, int(os.getenv('JIRA_SYNC_BATCH_SIZE', 500)))
+        
+        # Способ записи пачек в БД (см. LOAD_MODES)
+        self.load_mode = os.getenv('JIRA_SYNC_LOAD_MODE', 'copy')
+        if self.load_mode not in LOAD_MODES:
+            print(f"ОШИБКА: JIRA_SYNC_LOAD_MODE должен быть одним из: {', '.join(LOAD_MODES)}")
+            sys.exit(1)
+        # Сверка не удаляет задачи, если из БД пропала бы бОльшая их доля -
+        # скорее всего, это ошибка в JQL или сбой на стороне Jira
+        self.reconcile_max_delete_ratio = float(os.getenv('JIRA_RECONCILE_MAX_DELETE_RATIO', 0.5))
         
-        # Извлекаем имя спринта из строки формата:
-        # com.atlassian.greenhopper.service.sprint.Sprint@...[id=1367,...,name=MAR 08.12.25 - 22.12.25 #24,...]
-        match = re.search(r'name=([^,\]]+)', str(sprint_str))
-        if match:
-            return match.group(1)
+        # Сколько строк и за сколько секунд записал каждый способ: {mode: [строк, секунд]}
+        self.load_timings = {}
+        # Итоги сравнения хешей за запуск: новых / изменившихся / без изменений задач
+        self.change_counts = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+        # Замеры текущего запуска (sync/replay/reconcile заводят свои)
+        self.metrics = SyncMetrics(None, 'manual')
+        # Были ли записи в БД после последнего обновления сводок (ROLLUP_VIEWS)
+        self.data_changed = False
         
-        return None
+        # Куда дописывать сырые страницы ответа Jira (см. page_archive.py); пусто - не писать
+        self.archive_path = os.getenv('JIRA_SYNC_ARCHIVE') or None
+        # Идет повторная загрузка из архива: устаревшие версии задач не пишутся
+        self.replaying = False
+        # Часовой пояс пользователя Jira для дат в JQL (см. jira_timezone)
+        self._jira_timezone = None
+        
+        # Повторы, backoff и ограничение параллельности запросов - в JiraHttpClient
+        if offline:
+            self.client = None
+        else:
+            self.client = client or JiraHttpClient(
+                self.jira_url, self.jira_login, self.jira_password, max_concurrency=self.fetch_workers
+            )
+    
+    def extract_sprint_name(self, sprint_data: Optional[List]) -> Optional[str]:
+        """Извлекает название спринта из массива данных"""
+        return extract_sprint_name(sprint_data)
     
-    def fetch_jira_issues(self, jql: str, start_at: int = 0, max_results: int = 100) -> Dict:
-        """Получает задачи из Jira по JQL запросу"""
+    def fetch_jira_issues(self, jql: str, start_at: int = 0, max_results: int = 100,
+                          fields: str = ISSUE_FIELDS, validate_query: bool = True) -> Dict:
+        """Получает задачи из Jira по JQL запросу.
+        
+        validate_query=False - Jira не считает ошибкой несуществующие ключи
+        в условии key in (...), а просто их пропускает.
+        """
         url = f"{self.jira_url}/rest/api/2/search"
         
         params = {
             'jql': jql,
             'startAt': start_at,
             'maxResults': max_results,
-            'fields': 'key,issuetype,status,created,timeoriginalestimate,timespent,updated,customfield_10104,customfield_10100,summary,assignee,reporter,priority,labels,issuelinks'
+            'fields': fields
         }
+        if not validate_query:
+            params['validateQuery'] = 'false'
         
         print(f"Запрос к: {url}")
         print(f"Параметры: jql='{jql}', startAt={start_at}, maxResults={max_results}")
         
         try:
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.ConnectionError as e:
-            print(f"Ошибка подключения к Jira: {e}")
-            print(f"\nПроверьте:")
-            print(f"1. Правильность URL: {self.jira_url}")
-            print(f"2. Доступность сервера (попробуйте: ping {self.jira_url.replace('https://', '').replace('http://', '')})")
-            print(f"3. Подключение к интернету/VPN")
-            sys.exit(1)
-        except requests.exceptions.HTTPError as e:
-            print(f"HTTP ошибка: {e}")
-            print(f"Код ответа: {response.status_code}")
-            print(f"Ответ: {response.text[:500]}")
-            sys.exit(1)
-        except requests.exceptions.RequestException as e:
+            started = time.perf_counter()
+            data, size = self.client.get_json_with_size('/rest/api/2/search', params=params, timeout=30)
+            self.metrics.add_page(start_at, len(data.get('issues', [])), size, time.perf_counter() - started)
+            return data
+        except JiraHttpError as e:
             print(f"Ошибка при запросе к Jira API: {e}")
-            sys.exit(1)
+            if e.response is None:
+                print(f"\nПроверьте:")
+                print(f"1. Правильность URL: {self.jira_url}")
+                print(f"2. Доступность сервера (попробуйте: ping {self.jira_url.replace('https://', '').replace('http://', '')})")
+                print(f"3. Подключение к интернету/VPN")
+            raise
     
-    def fetch_all_issues(self, jql: str) -> List[Dict]:
-        """Получает все задачи, обрабатывая пагинацию"""
-        all_issues = []
-        start_at = 0
-        max_results = 100
+    def iter_issue_pages(self, jql: str, workers: Optional[int] = None,
+                         fields: str = ISSUE_FIELDS, max_results: int = 100,
+                         totals: Optional[List[int]] = None) -> Iterator[List[Dict]]:
+        """Отдает задачи постранично, в исходном порядке.
         
-        while True:
-            print(f"Получаем задачи с {start_at}...")
-            data = self.fetch_jira_issues(jql, start_at, max_results)
-            
-            issues = data.get('issues', [])
-            all_issues.extend(issues)
+        Первая страница запрашивается отдельно: из нее становится известен
+        total (если передан список totals, он туда добавляется), а значит и
+        все остальные startAt. Следующие страницы
+        запрашиваются заранее в фоне, но не более workers одновременно -
+        пока вызывающий код обрабатывает текущую страницу, следующие уже
+        загружаются, а в памяти никогда не лежит больше workers + 1 страниц.
+        """
+        workers = workers or self.fetch_workers
+        
+        print("Получаем задачи с 0...")
+        data = self.fetch_jira_issues(jql, 0, max_results, fields)
+        issues = data.get('issues', [])
+        total = data.get('total', 0)
+        if totals is not None:
+            totals.append(total)
+        received = len(issues)
+        print(f"Получено {received} из {total} задач")
+        
+        if not issues or received >= total:
+            yield issues
+            return
+        
+        # Jira может урезать maxResults до своего лимита - шаг берем из ответа
+        page_size = data.get('maxResults') or max_results
+        offsets = iter(range(page_size, total, page_size))
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
             
-            total = data.get('total', 0)
-            print(f"Получено {len(all_issues)} из {total} задач")
+            def submit_next():
+                start_at = next(offsets, None)
+                if start_at is not None:
+                    pending.append(pool.submit(self.fetch_jira_issues, jql, start_at, page_size, fields))
             
-            if len(all_issues) >= total:
-                break
+            for _ in range(workers):
+                submit_next()
             
-            start_at += max_results
-        
+            try:
+                yield issues
+                while pending:
+                    page = pending.popleft().result()
+                    submit_next()
+                    issues = page.get('issues', [])
+                    received += len(issues)
+                    print(f"Получено {received} из {total} задач")
+                    yield issues
+            finally:
+                # Если обработку прервали, не ждем загрузки ненужных страниц
+                for future in pending:
+                    future.cancel()
+    
+    def fetch_all_issues(self, jql: str, workers: Optional[int] = None) -> List[Dict]:
+        """Получает все задачи, обрабатывая пагинацию"""
+        all_issues = []
+        for issues in self.iter_issue_pages(jql, workers):
+            all_issues.extend(issues)
         return all_issues
     
     def parse_issue(self, issue: Dict) -> Dict:
-        """Парсит данные задачи из Jira в формат для БД"""
-        fields = issue.get('fields', {})
-        
-        # Извлекаем связанные задачи
-        issue_links = fields.get('issuelinks', [])
-        linked_issues_keys = []
-        
-        for link in issue_links:
-            # Может быть inwardIssue или outwardIssue
-            if 'inwardIssue' in link:
-                linked_issues_keys.append(link['inwardIssue']['key'])
-            if 'outwardIssue' in link:
-                linked_issues_keys.append(link['outwardIssue']['key'])
-        
-        # Извлекаем данные
-        parsed = {
-            'issue_key': issue.get('key'),
-            'issue_type': fields.get('issuetype', {}).get('name'),
-            'status': fields.get('status', {}).get('name'),
-            'created_date': self.parse_date(fields.get('created')),
-            'time_original_estimate': self.seconds_to_hours(fields.get('timeoriginalestimate')),
-            'time_spent': self.seconds_to_hours(fields.get('timespent')),
-            'updated_date': self.parse_date(fields.get('updated')),
-            'sprint': self.extract_sprint_name(fields.get('customfield_10104')),
-            'epic_link': fields.get('customfield_10100'),
-            'summary': fields.get('summary'),
-            'assignee': fields.get('assignee', {}).get('displayName') if fields.get('assignee') else None,
-            'reporter': fields.get('reporter', {}).get('displayName') if fields.get('reporter') else None,
-            'priority': fields.get('priority', {}).get('name'),
-            'labels': fields.get('labels', []),
-            'linked_issues': linked_issues_keys,
-            'issue_links_raw': issue_links  # Сохраняем для детальной таблицы
-        }
+        """Парсит одну задачу в словарь с полями для БД.
         
+        Синхронизация сама этим методом не пользуется - она разбирает пачки
+        задач за один проход через jira_parser.parse_issues.
+        """
+        (row,), _, _ = parse_issues([issue], datetime.now())
+        parsed = dict(zip(ISSUE_COLUMNS, row))
+        del parsed['last_synced']
+        parsed['issue_links_raw'] = (issue.get('fields') or {}).get('issuelinks', [])
         return parsed
     
     def seconds_to_hours(self, seconds: Optional[int]) -> Optional[float]:
         """Конвертирует секунды в часы с округлением до 2 знаков"""
-        if seconds is None:
-            return None
-        return round(seconds / 3600.0, 2)
+        return seconds_to_hours(seconds)
     
     def parse_date(self, date_str: Optional[str]) -> Optional[datetime]:
         """Конвертирует строку даты в datetime объект"""
-        if not date_str:
-            return None
-        
-        try:
-            # Формат: 2025-12-15T14:34:02.000+0000
-            return datetime.strptime(date_str[:19], '%Y-%m-%dT%H:%M:%S')
-        except (ValueError, TypeError):
-            return None
+        return parse_jira_datetime(date_str)
     
     def get_db_connection(self):
-        """Создает подключение к PostgreSQL"""
+        """Создает подключение к PostgreSQL (или берет из общего пула)"""
         try:
+            if self.db_pool:
+                return self.db_pool.getconn()
             conn = psycopg2.connect(**self.pg_config)
             return conn
         except psycopg2.Error as e:
             print(f"Ошибка подключения к PostgreSQL: {e}")
             sys.exit(1)
     
+    def release_db_connection(self, conn):
+        """Закрывает подключение или возвращает его в общий пул"""
+        if self.db_pool:
+            self.db_pool.putconn(conn)
+        else:
+            conn.close()
+    
+    @contextmanager
+    def run_lock(self, *names: str):
+        """Advisory-блокировки PostgreSQL на время запуска.
+        
+        Отдает True, если захвачены все блокировки names, и False, если хотя
+        бы одну держит другой процесс или поток (тогда не держим ни одной).
+        Сверка берет блокировки всех JQL, которые сверяет, - чтобы не идти
+        одновременно с их синхронизацией. Блокировки сессионные: если процесс
+        упадет, PostgreSQL снимет их вместе с подключением.
+        """
+        conn = self.get_db_connection()
+        conn.autocommit = True
+        cursor = conn.cursor()
+        held = []
+        
+        try:
+            for name in names:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (LOCK_PREFIX + name,))
+                if not cursor.fetchone()[0]:
+                    break
+                held.append(name)
+            yield len(held) == len(names)
+        finally:
+            for name in held:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (LOCK_PREFIX + name,))
+            cursor.close()
+            conn.autocommit = False
+            self.release_db_connection(conn)
+    
     def init_database(self):
-        """Инициализирует базу данных (создает таблицу если не существует)"""
+        """Инициализирует базу данных (создает таблицы если не существуют)"""
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
         try:
-            with open('init_db.sql', 'r', encoding='utf-8') as f:
-                sql = f.read()
-                cursor.execute(sql)
-                conn.commit()
-                print("База данных инициализирована успешно")
+            if os.path.exists('init_db.sql'):
+                with open('init_db.sql', 'r', encoding='utf-8') as f:
+                    cursor.execute(f.read())
+            cursor.execute(UPGRADE_SQL)
+            conn.commit()
+            print("База данных инициализирована успешно")
         except Exception as e:
             print(f"Ошибка при инициализации БД: {e}")
             conn.rollback()
         finally:
             cursor.close()
-            conn.close()
+            self.release_db_connection(conn)
     
-    def save_issues_to_db(self, issues: List[Dict]):
-        """Сохраняет задачи в PostgreSQL"""
-        if not issues:
-            print("Нет задач для сохранения")
-            return
+    def get_sync_state(self, jql: str) -> Optional[Dict]:
+        """Возвращает сохраненное состояние инкрементальной синхронизации для JQL"""
+        conn = self.get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
+        try:
+            cursor.execute(
+                "SELECT watermark, last_full_sync FROM jira_sync_state WHERE jql = %s",
+                (jql,)
+            )
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+            self.release_db_connection(conn)
+    
+    def save_sync_state(self, jql: str, watermark: Optional[datetime], full: bool):
+        """Сдвигает watermark вперед (но никогда назад) и отмечает полную синхронизацию"""
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
-        # SQL для вставки задач с обновлением при конфликте
-        insert_issues_sql = """
-        INSERT INTO jira_issues (
-            issue_key, issue_type, status, created_date, 
-            time_original_estimate, time_spent, updated_date, 
-            sprint, epic_link, summary, assignee, reporter, 
-            priority, labels, linked_issues, last_synced
-        ) VALUES %s
-        ON CONFLICT (issue_key) 
-        DO UPDATE SET
-            issue_type = EXCLUDED.issue_type,
-            status = EXCLUDED.status,
-            created_date = EXCLUDED.created_date,
-            time_original_estimate = EXCLUDED.time_original_estimate,
-            time_spent = EXCLUDED.time_spent,
-            updated_date = EXCLUDED.updated_date,
-            sprint = EXCLUDED.sprint,
-            epic_link = EXCLUDED.epic_link,
-            summary = EXCLUDED.summary,
-            assignee = EXCLUDED.assignee,
-            reporter = EXCLUDED.reporter,
-            priority = EXCLUDED.priority,
-            labels = EXCLUDED.labels,
-            linked_issues = EXCLUDED.linked_issues,
-            last_synced = CURRENT_TIMESTAMP
+        try:
+            cursor.execute("""
+                INSERT INTO jira_sync_state (jql, watermark, last_full_sync, updated_at)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (jql)
+                DO UPDATE SET
+                    watermark = GREATEST(jira_sync_state.watermark, EXCLUDED.watermark),
+                    last_full_sync = COALESCE(EXCLUDED.last_full_sync, jira_sync_state.last_full_sync),
+                    updated_at = CURRENT_TIMESTAMP
+            """, (jql, watermark, datetime.now() if full else None))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.release_db_connection(conn)
+    
+    def jira_timezone(self) -> tzinfo:
+        """Часовой пояс пользователя Jira (/rest/api/2/myself) - в нем Jira
+        читает даты в JQL. Запрашивается один раз на экземпляр.
+        
+        Если пояс узнать не удалось, берется UTC-12: дата в нем не позже
+        того же момента в любом поясе, поэтому изменения не пропускаются
+        (запрашивается лишнее, до суток).
         """
+        if self._jira_timezone is None:
+            try:
+                self._jira_timezone = ZoneInfo(self.client.get_json('/rest/api/2/myself', timeout=30)['timeZone'])
+            except (JiraHttpError, KeyError, ValueError, ZoneInfoNotFoundError) as e:
+                print(f"ВНИМАНИЕ: не удалось узнать часовой пояс пользователя Jira ({e}) - "
+                      f"watermark переводим в UTC-12")
+                self._jira_timezone = timezone(timedelta(hours=-12))
+        return self._jira_timezone
+    
+    def build_incremental_jql(self, jql: str, watermark: datetime) -> str:
+        """Добавляет к JQL условие updated >= watermark, сохраняя ORDER BY в конце.
         
-        # Подготавливаем данные для вставки задач
-        issues_values = []
-        all_links = []  # Для сохранения связей
-        
-        for issue in issues:
-            parsed = self.parse_issue(issue)
-            issues_values.append((
-                parsed['issue_key'],
-                parsed['issue_type'],
-                parsed['status'],
-                parsed['created_date'],
-                parsed['time_original_estimate'],
-                parsed['time_spent'],
-                parsed['updated_date'],
-                parsed['sprint'],
-                parsed['epic_link'],
-                parsed['summary'],
-                parsed['assignee'],
-                parsed['reporter'],
-                parsed['priority'],
-                parsed['labels'],
-                parsed['linked_issues'],
-                datetime.now()
-            ))
-            
-            # Собираем связи для детальной таблицы
-            source_key = parsed['issue_key']
-            for link in parsed['issue_links_raw']:
-                link_type = link.get('type', {})
-                
-                # Обрабатываем inward связи
-                if 'inwardIssue' in link:
-                    target = link['inwardIssue']
-                    all_links.append({
-                        'source_key': source_key,
-                        'target_key': target['key'],
-                        'link_type': link_type.get('id'),
-                        'link_type_name': link_type.get('name'),
-                        'direction': 'inward',
-                        'direction_label': link_type.get('inward'),
-                        'target_summary': target.get('fields', {}).get('summary'),
-                        'target_status': target.get('fields', {}).get('status', {}).get('name'),
-                        'target_priority': target.get('fields', {}).get('priority', {}).get('name')
-                    })
-                
-                # Обрабатываем outward связи
-                if 'outwardIssue' in link:
-                    target = link['outwardIssue']
-                    all_links.append({
-                        'source_key': source_key,
-                        'target_key': target['key'],
-                        'link_type': link_type.get('id'),
-                        'link_type_name': link_type.get('name'),
-                        'direction': 'outward',
-                        'direction_label': link_type.get('outward'),
-                        'target_summary': target.get('fields', {}).get('summary'),
-                        'target_status': target.get('fields', {}).get('status', {}).get('name'),
-                        'target_priority': target.get('fields', {}).get('priority', {}).get('name')
-                    })
+        watermark - момент с часовым поясом; в JQL он пишется временем
+        пользователя Jira (см. jira_timezone).
+        """
+        match = ORDER_BY_RE.search(jql)
+        base = jql[:match.start()] if match else jql
+        order_by = f" {match.group(0).strip()}" if match else ''
+        
+        since = (watermark - WATERMARK_OVERLAP).astimezone(self.jira_timezone()).strftime('%Y/%m/%d %H:%M')
+        condition = f'updated >= "{since}"'
+        
+        if base.strip():
+            return f"({base.strip()}) AND {condition}{order_by}"
+        return f"{condition}{order_by}"
+    
+    def save_issues_to_db(self, issues: List[Dict], conn=None) -> bool:
+        """Разбирает и сохраняет задачи в PostgreSQL одной транзакцией.
+        
+        Если conn не передан, открывает собственное подключение.
+        Возвращает True, если транзакция зафиксирована.
+        """
+        if not issues:
+            print("Нет задач для сохранения")
+            return True
+        
+        issue_rows, link_rows, sprint_rows = parse_issues(issues, datetime.now())
+        saved = self.save_rows(issue_rows, link_rows, sprint_rows, conn)
+        self.refresh_rollups()
+        return saved
+    
+    def save_rows(self, issue_rows: List[tuple], link_rows: List[tuple], sprint_rows: List[tuple],
+                  conn=None) -> bool:
+        """Сохраняет разобранные строки задач, их связей и спринтов одной транзакцией.
+        
+        По content_hash/links_hash из БД определяет, что изменилось: пишутся
+        только новые и изменившиеся задачи, а у задач с изменившимся набором
+        связей применяется только разница со связями в БД (см. diff_links).
+        Неизменившиеся строки не трогаются вовсе (включая last_synced).
+        При replay задачи, которые в БД обновлены позже (updated_date), тоже
+        не пишутся - ни сами задачи, ни их связи.
+        
+        Пишет способом self.load_mode; если COPY недоступен (например, нет
+        прав на временные таблицы), до конца запуска переключается на
+        INSERT ... VALUES. Если conn не передан, открывает собственное
+        подключение. Возвращает True, если транзакция зафиксирована.
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_db_connection()
+        cursor = conn.cursor()
         
         try:
-            # Сохраняем задачи
-            execute_values(cursor, insert_issues_sql, issues_values)
-            print(f"✓ Сохранено/обновлено {len(issues_values)} задач")
+            # Если задача попала в пачку дважды, остается последняя версия
+            rows_by_key = {row[ISSUE_KEY]: row for row in issue_rows}
+            cursor.execute(
+                "SELECT issue_key, content_hash, links_hash, updated_date FROM jira_issues WHERE issue_key = ANY(%s)",
+                (list(rows_by_key),)
+            )
+            stored = {}
+            stored_updated = {}
+            for key, content_hash, links_hash, updated_date in cursor.fetchall():
+                stored[key] = (content_hash, links_hash)
+                stored_updated[key] = updated_date
             
-            # Удаляем старые связи для обновленных задач
-            updated_keys = [parsed['issue_key'] for parsed in [self.parse_issue(i) for i in issues]]
-            if updated_keys:
-                cursor.execute(
-                    "DELETE FROM jira_issue_links WHERE source_issue_key = ANY(%s)",
-                    (updated_keys,)
-                )
+            changed_rows = []
+            link_keys = set()
+            inserted = changed = 0
+            for key, row in rows_by_key.items():
+                hashes = stored.get(key)
+                stored_date = stored_updated.get(key)
+                if self.replaying and stored_date is not None and (
+                        row[UPDATED_DATE] is None or row[UPDATED_DATE] < stored_date):
+                    # Версия из архива старше сохраненной - как и в
+                    # ISSUE_REPLAY_CONFLICT_SQL, не пишется (считается без изменений)
+                    continue
+                if hashes is None:
+                    inserted += 1
+                elif hashes != (row[CONTENT_HASH], row[LINKS_HASH]):
+                    changed += 1
+                else:
+                    continue
+                changed_rows.append(row)
+                if hashes is None or hashes[1] != row[LINKS_HASH]:
+                    link_keys.add(key)
+            unchanged = len(rows_by_key) - inserted - changed
+            # Единый порядок блокировки строк, чтобы параллельные синхронизации
+            # с пересекающимися задачами не ловили взаимоблокировки
+            changed_rows.sort(key=itemgetter(ISSUE_KEY))
+            link_upserts, stale_link_ids = self.diff_links(cursor, link_rows, link_keys)
             
-            # Сохраняем связи
-            if all_links:
-                links_sql = """
-                INSERT INTO jira_issue_links (
-                    source_issue_key, target_issue_key, link_type, link_type_name,
-                    direction, direction_label, target_summary, target_status, target_priority
-                ) VALUES %s
-                """
-                
-                links_values = [
-                    (
-                        link['source_key'],
-                        link['target_key'],
-                        link['link_type'],
-                        link['link_type_name'],
-                        link['direction'],
-                        link['direction_label'],
-                        link['target_summary'],
-                        link['target_status'],
-                        link['target_priority']
-                    )
-                    for link in all_links
-                ]
-                
-                execute_values(cursor, links_sql, links_values)
-                print(f"✓ Сохранено {len(links_values)} связей между задачами")
+            # Спринты пишутся до задач: jira_issues.sprint_id ссылается на них
+            # (в том же порядке, что и задачи, - против взаимоблокировок)
+            sprint_rows = sorted(sprint_rows)
             
+            mode = self.load_mode
+            started = time.perf_counter()
+            sprints_written = 0
+            if mode == 'copy':
+                try:
+                    sprints_written = self.write_sprints(cursor, sprint_rows)
+                    if changed_rows:
+                        self.write_rows_copy(cursor, changed_rows, link_upserts, stale_link_ids)
+                except COPY_UNAVAILABLE_ERRORS as e:
+                    conn.rollback()
+                    print(f"COPY-загрузка недоступна ({e}), переключаемся на INSERT ... VALUES")
+                    self.load_mode = mode = 'values'
+                    started = time.perf_counter()
+            if mode == 'values':
+                sprints_written = self.write_sprints(cursor, sprint_rows)
+                if changed_rows:
+                    self.write_rows_values(cursor, changed_rows, link_upserts, stale_link_ids)
+            # Пачка без изменений не сбрасывает ETag дашборда
+            if changed_rows or sprints_written:
+                data_version.bump(cursor, data_version.JIRA)
             conn.commit()
+            self.data_changed = self.data_changed or bool(changed_rows or sprints_written)
+            elapsed = time.perf_counter() - started
+            
+            self.change_counts['inserted'] += inserted
+            self.change_counts['changed'] += changed
+            self.change_counts['unchanged'] += unchanged
+            
+            if not changed_rows:
+                print(f"✓ {unchanged} задач без изменений - запись в БД не нужна")
+                return True
+            
+            rows = len(changed_rows) + len(link_upserts) + len(stale_link_ids)
+            timing = self.load_timings.setdefault(mode, [0, 0.0])
+            timing[0] += rows
+            timing[1] += elapsed
+            print(f"✓ Задач: новых {inserted}, изменено {changed}, без изменений {unchanged}; "
+                  f"связей добавлено/обновлено {len(link_upserts)}, удалено {len(stale_link_ids)} "
+                  f"за {elapsed:.2f} с ({rows / elapsed if elapsed else 0:,.0f} строк/с, {mode})")
+            return True
             
         except Exception as e:
             print(f"Ошибка при сохранении в БД: {e}")
             conn.rollback()
+            return False
         finally:
             cursor.close()
-            conn.close()
+            if own_conn:
+                self.release_db_connection(conn)
+    
+    def diff_links(self, cursor, link_rows: List[tuple], link_keys: Iterable[str]) -> Tuple[List[tuple], List[int]]:
+        """Сравнивает связи задач из link_keys с сохраненными в БД.
+        
+        Возвращает (связи для вставки или обновления, id связей для удаления).
+        Связи сопоставляются по естественному ключу LINK_NATURAL_KEY.
+        link_rows должны содержать связи одной версии каждой задачи (см.
+        load_pages) - связи, которых в ней нет, удаляются.
+        """
+        if not link_keys:
+            return [], []
+        
+        incoming = {}
+        for row in link_rows:
+            if row[0] in link_keys:
+                incoming[link_key(row)] = row
+        
+        cursor.execute(
+            f"SELECT id, {LINK_COLUMNS_SQL} FROM jira_issue_links WHERE source_issue_key = ANY(%s)",
+            (list(link_keys),)
+        )
+        stale_ids = []
+        for link_id, *stored in cursor.fetchall():
+            stored = tuple(stored)
+            row = incoming.get(link_key(stored))
+            if row is None:
+                stale_ids.append(link_id)
+            elif row == stored:
+                del incoming[link_key(stored)]
+        
+        return list(incoming.values()), stale_ids
+    
+    def issue_conflict_sql(self) -> str:
+        """ON CONFLICT для записи задач: при replay - с проверкой updated_date"""
+        return ISSUE_REPLAY_CONFLICT_SQL if self.replaying else ISSUE_CONFLICT_SQL
+    
+    def write_sprints(self, cursor, sprint_rows: List[tuple]) -> int:
+        """Добавляет новые спринты и обновляет изменившиеся.
+        
+        Возвращает число записанных строк (без изменений - 0).
+        """
+        if not sprint_rows:
+            return 0
+        return len(execute_values(cursor, SPRINT_UPSERT_SQL, sprint_rows, page_size=1000, fetch=True))
+    
+    def write_rows_values(self, cursor, issue_rows: List[tuple], link_rows: List[tuple], stale_link_ids: List[int]):
+        """Записывает пачку через INSERT ... VALUES (execute_values).
+        
+        link_rows вставляются или обновляются по естественному ключу,
+        связи с id из stale_link_ids удаляются.
+        """
+        execute_values(
+            cursor,
+            f"INSERT INTO jira_issues ({ISSUE_COLUMNS_SQL}) VALUES %s" + self.issue_conflict_sql(),
+            issue_rows
+        )
+        
+        if stale_link_ids:
+            cursor.execute("DELETE FROM jira_issue_links WHERE id = ANY(%s)", (stale_link_ids,))
+        
+        if link_rows:
+            execute_values(
+                cursor,
+                f"INSERT INTO jira_issue_links ({LINK_COLUMNS_SQL}) VALUES %s" + LINK_CONFLICT_SQL,
+                link_rows
+            )
+    
+    def write_rows_copy(self, cursor, issue_rows: List[tuple], link_rows: List[tuple], stale_link_ids: List[int]):
+        """Записывает пачку через COPY во временные staging-таблицы и слияние
+        в jira_issues / jira_issue_links по одному запросу на таблицу.
+        
+        link_rows вставляются или обновляются по естественному ключу,
+        связи с id из stale_link_ids удаляются.
+        """
+        cursor.execute(CREATE_STAGE_SQL)
+        
+        cursor.copy_expert(
+            f"COPY jira_issues_stage ({ISSUE_COLUMNS_SQL}) FROM STDIN",
+            copy_buffer(issue_rows)
+        )
+        cursor.execute(MERGE_ISSUES_SQL + self.issue_conflict_sql())
+        
+        if stale_link_ids:
+            cursor.execute("DELETE FROM jira_issue_links WHERE id = ANY(%s)", (stale_link_ids,))
+        
+        if link_rows:
+            cursor.copy_expert(
+                f"COPY jira_issue_links_stage ({LINK_COLUMNS_SQL}) FROM STDIN",
+                copy_buffer(link_rows)
+            )
+            cursor.execute(MERGE_LINKS_SQL)
     
-    def sync(self, jql: str):
-        """Основной метод синхронизации"""
+    def load_pages(self, pages: Iterable[List[Dict]]) -> Tuple[int, Optional[datetime], bool]:
+        """Сохраняет поток страниц задач пачками по batch_size.
+        
+        Каждая страница разбирается сразу по получении (сырой JSON дальше не
+        хранится), а каждая пачка фиксируется отдельной транзакцией в одном
+        подключении. Возвращает (число сохраненных задач, максимальный updated
+        среди них - с часовым поясом, в UTC, True если все пачки сохранены).
+        На первой же ошибке останавливается.
+        
+        Пачка хранит по одной версии задачи: если задача снова пришла на
+        следующей странице (сдвинулась при обновлении или повторилась в
+        архиве), ее строка и связи заменяются целиком. Иначе связи обеих
+        версий смешались бы, и удаленная в новой версии связь осталась бы.
+        """
+        saved = 0
+        watermark = batch_watermark = None
+        # {issue_key: строка задачи}, {issue_key: [строки связей задачи]}
+        issue_rows, link_rows, sprint_rows = {}, {}, {}
+        self.load_timings = {}
+        self.change_counts = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+        conn = self.get_db_connection()
+        
+        def flush() -> bool:
+            nonlocal saved, watermark, batch_watermark
+            links = [link for issue_links in link_rows.values() for link in issue_links]
+            if not self.save_rows(list(issue_rows.values()), links, list(sprint_rows.values()), conn):
+                return False
+            saved += len(issue_rows)
+            if batch_watermark and (watermark is None or batch_watermark > watermark):
+                watermark = batch_watermark
+            batch_watermark = None
+            issue_rows.clear()
+            link_rows.clear()
+            sprint_rows.clear()
+            return True
+        
+        def timed_flush() -> bool:
+            with metrics.phase('db'):
+                return flush()
+        
+        metrics = self.metrics
+        pages = iter(pages)
+        try:
+            while True:
+                with metrics.phase('fetch'):
+                    issues = next(pages, None)
+                if issues is None:
+                    break
+                with metrics.phase('parse'):
+                    page_issues, page_links, page_sprints = parse_issues(issues, datetime.now())
+                    # Строки задач хранят updated без часового пояса, а
+                    # watermark нужен точным моментом - берем его из ответа
+                    for issue in issues:
+                        updated = parse_jira_datetime_utc((issue.get('fields') or {}).get('updated'))
+                        if updated and (batch_watermark is None or updated > batch_watermark):
+                            batch_watermark = updated
+                page_link_rows = {row[ISSUE_KEY]: [] for row in page_issues}
+                for link in page_links:
+                    page_link_rows[link[0]].append(link)
+                issue_rows.update((row[ISSUE_KEY], row) for row in page_issues)
+                link_rows.update(page_link_rows)
+                sprint_rows.update((row[0], row) for row in page_sprints)
+                if len(issue_rows) >= self.batch_size and not timed_flush():
+                    return saved, watermark, False
+            if issue_rows and not timed_flush():
+                return saved, watermark, False
+            return saved, watermark, True
+        finally:
+            self.release_db_connection(conn)
+            metrics.counts['issues_saved'] += saved
+            metrics.counts['db_rows'] += sum(rows for rows, _ in self.load_timings.values())
+            for name, count in self.change_counts.items():
+                metrics.counts[name] += count
+            print(f"Итого задач: новых {self.change_counts['inserted']}, "
+                  f"изменено {self.change_counts['changed']}, "
+                  f"без изменений {self.change_counts['unchanged']}")
+            for mode, (rows, seconds) in self.load_timings.items():
+                print(f"Запись в БД ({mode}): {rows} строк за {seconds:.2f} с "
+                      f"({rows / seconds if seconds else 0:,.0f} строк/с)")
+    
+    def sync(self, jql: str, full: bool = False):
+        """Основной метод синхронизации.
+        
+        По умолчанию инкрементальная: из Jira запрашиваются только задачи,
+        обновленные после сохраненного watermark. Полная синхронизация
+        выполняется по флагу full, при первом запуске для JQL и раз в
+        JIRA_FULL_RESYNC_HOURS часов.
+        """
         print(f"Начинаем синхронизацию с JQL: {jql}")
-        print("-" * 60)
         
-        # Получаем задачи из Jira
-        issues = self.fetch_all_issues(jql)
+        state = self.get_sync_state(jql)
+        if not full:
+            if not state or not state['watermark']:
+                print("Нет сохраненного watermark - выполняем полную синхронизацию")
+                full = True
+            elif not state['last_full_sync'] or \
+                    datetime.now() - state['last_full_sync'] >= self.full_resync_interval:
+                print("Подошло время периодической полной синхронизации")
+                full = True
         
-        if not issues:
-            print("Задачи не найдены")
-            return
+        if full:
+            fetch_jql = jql
+        else:
+            fetch_jql = self.build_incremental_jql(jql, state['watermark'])
+            print(f"Инкрементальная синхронизация, watermark: {state['watermark']}")
+        print("-" * 60)
         
-        # Сохраняем в БД
-        self.save_issues_to_db(issues)
+        with self.track_run(jql, 'full' if full else 'incremental') as metrics:
+            # Страницы из Jira сразу разбираются и сохраняются пачками, поэтому
+            # в памяти никогда не лежит весь результат JQL
+            pages = self.iter_issue_pages(fetch_jql)
+            if self.archive_path:
+                pages = archive_pages(pages, self.archive_path, fetch_jql)
+                print(f"Сырые страницы дописываются в архив {self.archive_path}")
+            saved, watermark, ok = self.load_pages(pages)
+            
+            if not saved:
+                print("Задачи не найдены")
+            
+            # Watermark сдвигается только если все пачки зафиксированы,
+            # иначе следующий запуск пропустил бы несохраненные изменения
+            if ok:
+                self.save_sync_state(jql, watermark, full)
+                if watermark:
+                    print(f"Новый watermark: {watermark}")
+            else:
+                metrics.status = 'failed'
         
         print("-" * 60)
         print("Синхронизация завершена")
     
+    def replay(self, paths: List[str]) -> bool:
+        """Заново разбирает и сохраняет задачи из архивов страниц, без Jira.
+        
+        Страницы читаются потоком и сохраняются теми же пачками, что и при
+        синхронизации. Watermark не меняется. Версия задачи из архива
+        пишется, только если она не старше сохраненной в БД (по
+        updated_date), поэтому более свежие данные - например, от
+        синхронизаций без архива - replay не откатывает.
+        """
+        print(f"Повторная загрузка из архива: {', '.join(paths)}")
+        print("-" * 60)
+        self.replaying = True
+        try:
+            with self.track_run(None, 'replay') as metrics:
+                saved, _, ok = self.load_pages(read_pages(paths))
+                if not ok:
+                    metrics.status = 'failed'
+        finally:
+            self.replaying = False
+        print("-" * 60)
+        print(f"Повторная загрузка {'завершена' if ok else 'прервана ошибкой'}, задач: {saved}")
+        return ok
+    
+    def reconcile(self, jqls: List[str], force: bool = False) -> int:
+        """Удаляет из БД задачи, которые удалены в Jira или вышли из области JQL.
+        
+        Объединение результатов jqls считается полной областью таблицы
+        jira_issues: все сохраненные задачи вне него удаляются вместе со
+        своими связями (ON DELETE CASCADE), поэтому jqls должны включать все
+        JQL из jira_sync_state. Из Jira запрашиваются только
+        ключи, большими страницами и параллельно, поэтому сверка намного
+        дешевле полной синхронизации. Если удалить пришлось бы больше
+        JIRA_RECONCILE_MAX_DELETE_RATIO задач, без force ничего не удаляется.
+        Возвращает число удаленных задач.
+        """
+        print(f"Сверка ключей задач с Jira по {len(jqls)} JQL")
+        print("-" * 60)
+        
+        with self.track_run(' OR '.join(f"({jql})" for jql in jqls), 'reconcile') as metrics:
+            deleted = self.reconcile_keys(jqls, force)
+            metrics.counts['deleted'] = deleted
+            return deleted
+    
+    def synced_jqls(self) -> List[str]:
+        """JQL, которые уже синхронизировались в эту БД (jira_sync_state)"""
+        conn = self.get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT jql FROM jira_sync_state ORDER BY jql")
+                jqls = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            return jqls
+        finally:
+            self.release_db_connection(conn)
+    
+    def reconcile_keys(self, jqls: List[str], force: bool) -> int:
+        """Сверка без замеров - см. reconcile.
+        
+        jqls должны покрывать все JQL из jira_sync_state - иначе задачи
+        остальных JQL выглядели бы удаленными, и сверка ничего не делает.
+        Страницы ключей запрашиваются в стабильном порядке (ORDER BY key), но
+        задача, удаленная во время обхода, все равно сдвигает страницы и
+        следующая за ней может быть пропущена. Поэтому кандидаты на удаление
+        перед удалением запрашиваются из Jira по ключам: если хоть один из
+        них найден, обход был неполным, и сверка ничего не удаляет. Удаляются
+        только строки, записанные до начала обхода (last_synced <
+        scan_started): задачу, сохраненную параллельной синхронизацией, обход
+        мог не застать.
+        """
+        uncovered = sorted(set(self.synced_jqls()) - set(jqls))
+        if uncovered:
+            print(f"ОШИБКА: сверка не покрывает синхронизируемые в эту БД JQL: "
+                  f"{'; '.join(uncovered)} - их задачи были бы удалены. Сверяйте все JQL "
+                  f"или удалите ненужные из jira_sync_state")
+            self.metrics.status = 'failed'
+            return 0
+        
+        conn = self.get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT LOCALTIMESTAMP")
+                scan_started = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            self.release_db_connection(conn)
+        
+        jira_keys = set()
+        for jql in jqls:
+            jql_keys = set()
+            totals = []
+            with self.metrics.phase('fetch'):
+                for issues in self.iter_issue_pages(key_order_jql(jql), fields='key',
+                                                    max_results=KEYS_PAGE_SIZE, totals=totals):
+                    jql_keys.update(issue['key'] for issue in issues)
+            if len(jql_keys) < totals[0]:
+                print(f"ОШИБКА: по JQL \"{jql}\" получено {len(jql_keys)} ключей из {totals[0]} - "
+                      f"задачи менялись во время сверки, ничего не удаляем. Повторите позже")
+                self.metrics.status = 'failed'
+                return 0
+            jira_keys |= jql_keys
+        
+        conn = self.get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT issue_key, last_synced < %s FROM jira_issues", (scan_started,))
+                stored = cursor.fetchall()
+            conn.commit()
+        finally:
+            self.release_db_connection(conn)
+        missing = [key for key, before_scan in stored if before_scan and key not in jira_keys]
+        print(f"Задач в Jira: {len(jira_keys)}, в БД: {len(stored)}, "
+              f"отсутствуют в Jira: {len(missing)}")
+        
+        if not missing:
+            return 0
+        
+        if not force and len(missing) > len(stored) * self.reconcile_max_delete_ratio:
+            print(f"ОШИБКА: сверка удалила бы {len(missing)} из {len(stored)} задач - "
+                  f"это больше порога JIRA_RECONCILE_MAX_DELETE_RATIO="
+                  f"{self.reconcile_max_delete_ratio}. Проверьте JQL или запустите с --force")
+            self.metrics.status = 'failed'
+            return 0
+        
+        found = self.find_keys(jqls, missing)
+        if found:
+            print(f"ОШИБКА: {len(found)} задач, пропущенных обходом, есть в Jira "
+                  f"({', '.join(found[:20])}{' ...' if len(found) > 20 else ''}) - "
+                  f"задачи менялись во время сверки, ничего не удаляем. Повторите позже")
+            self.metrics.status = 'failed'
+            return 0
+        
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "DELETE FROM jira_issues WHERE issue_key = ANY(%s) AND last_synced < %s RETURNING issue_key",
+                (missing, scan_started)
+            )
+            missing = [row[0] for row in cursor.fetchall()]
+            data_version.bump(cursor, data_version.JIRA)
+            conn.commit()
+            self.data_changed = True
+            print(f"✓ Удалено {len(missing)} задач (и их связи): "
+                  f"{', '.join(missing[:20])}{' ...' if len(missing) > 20 else ''}")
+            return len(missing)
+        except Exception as e:
+            print(f"Ошибка при сверке с БД: {e}")
+            conn.rollback()
+            self.metrics.status = 'failed'
+            return 0
+        finally:
+            cursor.close()
+            self.release_db_connection(conn)
+    
+    def find_keys(self, jqls: List[str], keys: List[str]) -> List[str]:
+        """Какие из keys Jira находит в области jqls (запросы по ключам,
+        пачками по VERIFY_KEYS_CHUNK; несуществующие ключи Jira пропускает).
+        Задачу, перенесенную в другой проект, Jira находит по старому ключу,
+        но отдает с новым - такие ключи найденными не считаются."""
+        scope = ' OR '.join(f"({ORDER_BY_RE.sub('', jql)})" for jql in jqls)
+        wanted = set(keys)
+        found = []
+        with self.metrics.phase('fetch'):
+            for start in range(0, len(keys), VERIFY_KEYS_CHUNK):
+                chunk = keys[start:start + VERIFY_KEYS_CHUNK]
+                jql = f"({scope}) AND key in ({', '.join(chunk)})"
+                data = self.fetch_jira_issues(jql, 0, len(chunk), 'key', validate_query=False)
+                found.extend(issue['key'] for issue in data.get('issues', []) if issue['key'] in wanted)
+        return found
+    
+    
+    @contextmanager
+    def track_run(self, jql: Optional[str], mode: str):
+        """Заводит замеры запуска, а по его окончании печатает их и сохраняет в sync_runs.
+        
+        Запуск считается успешным, если внутри не было исключения и
+        metrics.status не выставлен явно в failed.
+        """
+        # В offline-режиме (replay) HTTP-клиента нет - и считать нечего
+        http = self.client.stats if self.client else dict
+        self.metrics = metrics = SyncMetrics(jql, mode, http())
+        try:
+            yield metrics
+        except BaseException as e:
+            # Зафиксированные до ошибки пачки тоже должны попасть в сводки
+            self.refresh_rollups()
+            metrics.finish('failed', f"{type(e).__name__}: {e}", http())
+            raise
+        else:
+            self.refresh_rollups()
+            metrics.finish('ok' if metrics.status == 'running' else metrics.status, None, http())
+        finally:
+            metrics.report()
+            self.save_sync_run(metrics)
+    
+    def refresh_rollups(self):
+        """Пересчитывает сводки дашборда (ROLLUP_VIEWS), если данные менялись.
+        
+        REFRESH ... CONCURRENTLY не блокирует чтение сводок веб-приложением.
+        Версия данных увеличивается в той же транзакции: ответы, собранные
+        из старых сводок, не останутся в кэше. Ошибка не роняет запуск -
+        данные уже сохранены, а сводки обновит следующий запуск.
+        """
+        if not self.data_changed:
+            return
+        try:
+            conn = self.get_db_connection()
+        except SystemExit:
+            return
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        try:
+            with self.metrics.phase('db'):
+                for view in ROLLUP_VIEWS:
+                    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                data_version.bump(cursor, data_version.JIRA)
+                conn.commit()
+            self.data_changed = False
+            print(f"Сводки дашборда обновлены за {time.perf_counter() - started:.2f} с")
+        except psycopg2.Error as e:
+            print(f"Не удалось обновить сводки дашборда: {e}")
+            conn.rollback()
+        finally:
+            cursor.close()
+            self.release_db_connection(conn)
+    
+    def save_sync_run(self, metrics: SyncMetrics):
+        """Сохраняет замеры запуска; ошибка записи не должна ронять синхронизацию.
+        
+        Успешная синхронизация меняет версию области sync - по ней
+        обновляется время последней синхронизации на дашборде, даже если
+        данные не изменились.
+        """
+        try:
+            conn = self.get_db_connection()
+        except SystemExit:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute(INSERT_RUN_SQL, metrics.as_row())
+            if metrics.status == 'ok' and metrics.mode in SYNC_RUN_MODES:
+                data_version.bump(cursor, data_version.SYNC)
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Не удалось сохранить замеры запуска в sync_runs: {e}")
+            conn.rollback()
+        finally:
+            cursor.close()
+            self.release_db_connection(conn)
+    
     def get_statistics(self):
         """Выводит статистику из БД"""
         conn = self.get_db_connection()
@@ -420,29 +1195,78 @@ class JiraSync:
             
         finally:
             cursor.close()
-            conn.close()
+            self.release_db_connection(conn)
 
 
 def main():
     """Главная функция"""
+    parser = argparse.ArgumentParser(description='Синхронизация задач из Jira в PostgreSQL')
+    parser.add_argument('jql', nargs='?', default=DEFAULT_JQL,
+                        help='JQL запрос (по умолчанию - DEFAULT_JQL)')
+    parser.add_argument('--full', action='store_true',
+                        help='полная синхронизация вместо инкрементальной')
+    parser.add_argument('--workers', type=int,
+                        help='число параллельных запросов страниц (по умолчанию JIRA_FETCH_WORKERS)')
+    parser.add_argument('--load-mode', choices=LOAD_MODES,
+                        help='способ записи в БД (по умолчанию JIRA_SYNC_LOAD_MODE или copy)')
+    parser.add_argument('--reconcile', action='store_true',
+                        help='вместо синхронизации удалить из БД задачи, которых больше нет '
+                             'в Jira (по всем синхронизированным в БД JQL)')
+    parser.add_argument('--force', action='store_true',
+                        help='при --reconcile удалять даже сверх JIRA_RECONCILE_MAX_DELETE_RATIO')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='дописывать сырые страницы Jira в архив (по умолчанию JIRA_SYNC_ARCHIVE)')
+    parser.add_argument('--replay', metavar='PATH', nargs='+',
+                        help='вместо синхронизации загрузить задачи из архивов страниц, без Jira')
+    args = parser.parse_args()
+    
     # Создаем экземпляр синхронизатора
-    sync = JiraSync()
+    sync = JiraSync(fetch_workers=args.workers, offline=bool(args.replay))
+    if args.load_mode:
+        sync.load_mode = args.load_mode
+    if args.archive:
+        sync.archive_path = args.archive
     
-    # Инициализируем БД (создаем таблицу если не существует)
+    # Инициализируем БД (создаем таблицы если не существуют)
     sync.init_database()
     
-    # JQL запрос (можно изменить на нужный)
-    jql = "assignee=currentUser() AND created >= 2025-10-01 AND created <= 2025-12-16"
+    if args.replay:
+        if not sync.replay(args.replay):
+            sys.exit(1)
+        sync.get_statistics()
+        return
     
-    # Можно также принимать JQL из аргументов командной строки
-    if len(sys.argv) > 1:
-        jql = sys.argv[1]
+    # Сверка удаляет все задачи вне своей области, поэтому сверяет все JQL,
+    # которые синхронизировались в эту БД (и переданный)
+    reconcile_jqls = sorted(set(sync.synced_jqls()) | {args.jql}) if args.reconcile else []
     
-    # Синхронизируем
-    sync.sync(jql)
+    # Запуски одного JQL (в том числе из демона) не должны пересекаться,
+    # а сверка - идти одновременно с синхронизацией своих JQL
+    lock_names = ('reconcile', *reconcile_jqls) if args.reconcile else (args.jql,)
+    with sync.run_lock(*lock_names) as acquired:
+        if not acquired:
+            print("Такая синхронизация уже выполняется в другом процессе - пропускаем запуск")
+            return
+        
+        try:
+            if args.reconcile:
+                # Сверяем набор ключей с Jira
+                sync.reconcile(reconcile_jqls, force=args.force)
+            else:
+                # Синхронизируем
+                sync.sync(args.jql, full=args.full)
+        except JiraHttpError:
+            # Подробности уже выведены; watermark не сдвинут, задачи не удалены
+            print(f"Jira недоступна, запуск прерван. Запросов: {sync.client.stats()}")
+            sys.exit(1)
     
     # Выводим статистику
     sync.get_statistics()
+    
+    # Неудачный или остановленный проверкой запуск (он записан в sync_runs
+    # как failed) - ненулевой код выхода для cron/systemd
+    if sync.metrics.status != 'ok':
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Демон синхронизации Jira -> PostgreSQL для нескольких JQL-источников.
+
+Заменяет набор cron-записей `python jira_sync.py "<jql>"`: процесс
+запускается один раз, каждый источник синхронизируется в своем потоке со
+своим интервалом, а HTTP-клиент Jira и пул подключений к PostgreSQL общие.
+Запуски одного источника не пересекаются - ни друг с другом, ни с ручным
+`jira_sync.py` того же JQL (advisory-блокировка PostgreSQL по JQL). Сверка
+берет блокировки всех источников и идет, только пока ни один не
+синхронизируется.
+
+Запуск:
+    python jira_sync_daemon.py sync_sources.json
+
+Формат конфига - см. sync_sources.example.json:
+    sources[].name              - имя источника (для логов)
+    sources[].jql               - JQL запрос
+    sources[].interval_minutes  - как часто синхронизировать
+    sources[].full_resync_hours - как часто делать полную синхронизацию
+                                  (по умолчанию JIRA_FULL_RESYNC_HOURS)
+    reconcile_interval_minutes  - как часто сверять ключи со всеми JQL
+                                  (jira_sync.py --reconcile); не задан - не сверять
+"""
+
+import sys
+import json
+import signal
+import argparse
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from jira_sync import JiraSync
+from jira_client import JiraHttpClient
+from db_pool import ConnectionPool
+
+
+def log(message: str):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+
+def load_sources(path: str) -> Dict:
+    """Читает и проверяет конфиг источников"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    sources = config.get('sources') or []
+    if not sources:
+        raise ValueError('в конфиге нет ни одного источника (sources)')
+
+    names = set()
+    for source in sources:
+        for field in ('name', 'jql', 'interval_minutes'):
+            if not source.get(field):
+                raise ValueError(f"у источника {source.get('name', '?')} не задано поле {field}")
+        if source['name'] in names:
+            raise ValueError(f"имя источника {source['name']} повторяется")
+        names.add(source['name'])
+
+    return config
+
+
+class SyncDaemon:
+    def __init__(self, config: Dict):
+        self.config = config
+        self.sources: List[Dict] = config['sources']
+        self.stop_event = threading.Event()
+
+        # Один экземпляр JiraSync на источник (у каждого свое состояние
+        # запуска), но HTTP-клиент Jira и пул подключений к БД общие. Клиент
+        # общий и ради лимита запросов: Jira ограничивает частоту на пользователя,
+        # поэтому после 429 должны притормозить все источники сразу
+        probe = JiraSync()
+        self.client = JiraHttpClient(
+            probe.jira_url, probe.jira_login, probe.jira_password,
+            max_concurrency=probe.fetch_workers * len(self.sources)
+        )
+        # На источник: подключение под блокировку + подключение под запись
+        # + короткие запросы состояния; плюс столько же для сверки
+        self.db_pool = ConnectionPool(maxconn=3 * (len(self.sources) + 1))
+
+        self.syncs = {}
+        for source in self.sources:
+            sync = JiraSync(client=self.client, db_pool=self.db_pool)
+            if source.get('full_resync_hours'):
+                sync.full_resync_interval = timedelta(hours=float(source['full_resync_hours']))
+            self.syncs[source['name']] = sync
+
+    def run_guarded(self, name: str, lock_names: List[str], job: Callable[[JiraSync], None], sync: JiraSync):
+        """Выполняет job под advisory-блокировками; ошибки не останавливают демон"""
+        try:
+            with sync.run_lock(*lock_names) as acquired:
+                if not acquired:
+                    log(f"{name}: предыдущий запуск еще идет - пропускаем")
+                    return
+                log(f"{name}: старт")
+                job(sync)
+                # Ошибки сохранения и проверки сверки не бросают исключений,
+                # а только помечают запуск failed
+                if sync.metrics.status != 'ok':
+                    log(f"{name}: запуск завершился ошибкой (sync_runs: {sync.metrics.status})")
+                    return
+                log(f"{name}: готово")
+        # JiraHttpError и sys.exit из get_db_connection - в демоне это
+        # ошибка одного запуска, а не всего процесса
+        except (Exception, SystemExit):
+            log(f"{name}: ошибка\n{traceback.format_exc()}")
+
+    def schedule(self, interval: timedelta, run: Callable[[], None]):
+        """Запускает run каждые interval, пока демон не остановят"""
+        while not self.stop_event.is_set():
+            started = datetime.now()
+            run()
+            elapsed = datetime.now() - started
+            self.stop_event.wait(max(0.0, (interval - elapsed).total_seconds()))
+
+    def start(self) -> List[threading.Thread]:
+        self.syncs[self.sources[0]['name']].init_database()
+
+        threads = []
+        for source in self.sources:
+            sync = self.syncs[source['name']]
+            run = (lambda source=source, sync=sync: self.run_guarded(
+                source['name'], [source['jql']], lambda s: s.sync(source['jql']), sync
+            ))
+            interval = timedelta(minutes=float(source['interval_minutes']))
+            threads.append(threading.Thread(
+                target=self.schedule, args=(interval, run), name=source['name']
+            ))
+
+        if self.config.get('reconcile_interval_minutes'):
+            jqls = [source['jql'] for source in self.sources]
+            sync = JiraSync(client=self.client, db_pool=self.db_pool)
+            # Сверка держит блокировки всех источников: синхронизация, идущая
+            # во время обхода ключей, могла бы записать задачу, которой обход
+            # не видел
+            run = lambda: self.run_guarded('сверка', ['reconcile', *jqls], lambda s: s.reconcile(jqls), sync)
+            interval = timedelta(minutes=float(self.config['reconcile_interval_minutes']))
+            threads.append(threading.Thread(
+                target=self.schedule, args=(interval, run), name='reconcile'
+            ))
+
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def stop(self, *args):
+        log("Получен сигнал остановки - ждем завершения текущих запусков")
+        self.stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Демон синхронизации Jira с несколькими JQL-источниками')
+    parser.add_argument('config', help='JSON-конфиг источников (см. sync_sources.example.json)')
+    args = parser.parse_args()
+
+    try:
+        config = load_sources(args.config)
+    except (OSError, ValueError) as e:
+        print(f"ОШИБКА в конфиге {args.config}: {e}")
+        return 1
+
+    daemon = SyncDaemon(config)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+
+    log(f"Демон запущен, источников: {len(daemon.sources)}")
+    threads = daemon.start()
+    # join с таймаутом, чтобы главный поток успевал обрабатывать сигналы
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+    daemon.db_pool.closeall()
+    log("Демон остановлен")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Потоковая отдача больших JSON-ответов веб-приложения (app.py).
+
+Строки читаются серверным (именованным) курсором PostgreSQL пачками по
+ITER_SIZE и сразу сериализуются: в памяти воркера нет ни всего результата
+запроса, ни всей JSON-строки. Клиент получает ответ кусками (chunked) по
+CHUNK_SIZE байт.
+
+Сериализатор - orjson, если установлен (pip install orjson), иначе
+стандартный json. Decimal отдается числом, даты - строкой ISO 8601; даты
+для показа лучше форматировать прямо в SQL (см. app.sql_date).
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+import psycopg2.extensions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Строк за один FETCH серверного курсора
+ITER_SIZE = 2000
+# Размер куска ответа: мелкие куски - лишние системные вызовы и накладные
+# расходы chunked-кодирования
+CHUNK_SIZE = 64 * 1024
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(value: Any) -> bytes:
+    """Значение в JSON (UTF-8, без лишних пробелов)"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def iter_rows(cursor) -> Iterator[Dict]:
+    """Строки курсора словарями {колонка: значение}.
+
+    Курсор отдает кортежи (это дешевле RealDictRow), словари собираются
+    здесь по одному на строку; у серверного курсора описание колонок
+    появляется только после первого FETCH.
+    """
+    columns = None
+    for row in cursor:
+        if columns is None:
+            columns = [column[0] for column in cursor.description]
+        yield dict(zip(columns, row))
+
+
+def iter_query(conn, name: str, sql: str, params: Optional[tuple] = None) -> Iterator[Dict]:
+    """Строки запроса через серверный курсор name, словарями.
+
+    Запрос выполняется при первом обращении к итератору, поэтому несколько
+    iter_query на одном подключении читаются по очереди. Серверный курсор
+    живет только внутри транзакции - подключение не должно быть в autocommit.
+    """
+    with conn.cursor(name=name, cursor_factory=psycopg2.extensions.cursor) as cursor:
+        cursor.itersize = ITER_SIZE
+        cursor.execute(sql, params)
+        yield from iter_rows(cursor)
+
+
+def stream_object(fields: Iterable[Tuple[str, Any]]) -> Iterator[bytes]:
+    """JSON-объект из пар (ключ, значение) кусками по CHUNK_SIZE.
+
+    Значение-итератор отдается массивом по мере чтения, значение-функция
+    вызывается, когда до него дошла очередь (например, next_cursor,
+    известный только после последней строки), остальное сериализуется
+    целиком.
+    """
+    buffer = bytearray(b'{')
+    for index, (key, value) in enumerate(fields):
+        if index:
+            buffer += b','
+        buffer += dumps(key) + b':'
+        if callable(value):
+            value = value()
+        if isinstance(value, Iterator):
+            buffer += b'['
+            for item_index, item in enumerate(value):
+                if item_index:
+                    buffer += b','
+                buffer += dumps(item)
+                if len(buffer) >= CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+            buffer += b']'
+        else:
+            buffer += dumps(value)
+    buffer += b'}'
+    yield bytes(buffer)
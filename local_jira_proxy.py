@@ -17,6 +17,7 @@ JIRA_PASSWORD - те же, что использует jira_sync.py.
 
 import os
 import sys
+import threading
 from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -38,6 +39,20 @@ CORS(app)
 
 PORT = int(os.getenv('JIRA_PROXY_PORT', 5057))
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> JiraCommentClient:
+    """Один клиент на процесс: общий пул соединений и адаптивный лимит запросов к Jira.
+    Flask обслуживает запросы в нескольких потоках - создаем под блокировкой."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = JiraCommentClient()
+    return _client
+
 
 @app.after_request
 def allow_private_network(response):
@@ -50,7 +65,7 @@ def allow_private_network(response):
 @app.route('/api/issue/<issue_key>/comments')
 def get_issue_comments(issue_key):
     try:
-        client = JiraCommentClient()
+        client = get_client()
         comments = client.list_comments(issue_key)
         attachments = client.list_attachments(issue_key)
         return jsonify({'comments': comments, 'attachments': attachments})
@@ -65,7 +80,7 @@ def add_issue_comment(issue_key):
     if not text:
         return jsonify({'error': 'Пустой текст комментария'}), 400
     try:
-        client = JiraCommentClient()
+        client = get_client()
         comment = client.add_comment(issue_key, text)
         return jsonify(comment)
     except JiraCommentError as e:
@@ -77,7 +92,7 @@ def update_issue_comment(issue_key, comment_id):
     body = request.get_json() or {}
     text = body.get('text', '')
     try:
-        client = JiraCommentClient()
+        client = get_client()
         comment = client.update_comment(issue_key, comment_id, text)
         return jsonify(comment)
     except JiraCommentError as e:
@@ -93,7 +108,7 @@ def upload_issue_attachment(issue_key):
     if not file or not file.filename:
         return jsonify({'error': 'Файл не передан'}), 400
     try:
-        client = JiraCommentClient()
+        client = get_client()
         attachments = client.upload_attachment(
             issue_key,
             filename=file.filename,
@@ -108,7 +123,7 @@ def upload_issue_attachment(issue_key):
 @app.route('/api/attachment/<attachment_id>/content')
 def get_attachment_content(attachment_id):
     try:
-        client = JiraCommentClient()
+        client = get_client()
         content, mime_type, filename = client.get_attachment_content(attachment_id)
         return Response(content, mimetype=mime_type, headers={
             'Content-Disposition': f'inline; filename="{filename}"'
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Архив сырых страниц ответа Jira Search API (gzip + NDJSON, только дозапись).
+
+Каждая страница - одна JSON-строка {"jql", "start_at", "fetched_at",
+"issues"}, сжатая отдельным gzip-членом. Склеенные gzip-члены читаются как
+один поток, поэтому архив можно дописывать из нескольких запусков (и
+процессов): страница пишется в файл одним вызовом write в режиме append.
+
+Из архива `jira_sync.py --replay` заново разбирает и сохраняет задачи без
+обращения к Jira - например, после изменения парсера или схемы БД.
+"""
+
+import gzip
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List
+
+# Сжатие по умолчанию (9) заметно медленнее почти без выигрыша в размере
+COMPRESS_LEVEL = 6
+
+
+def write_page(path: str, jql: str, start_at: int, issues: List[Dict]):
+    """Дописывает страницу задач в конец архива"""
+    record = {
+        'jql': jql,
+        'start_at': start_at,
+        'fetched_at': datetime.now().isoformat(timespec='seconds'),
+        'issues': issues,
+    }
+    line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+    with open(path, 'ab', buffering=0) as f:
+        f.write(gzip.compress(line, compresslevel=COMPRESS_LEVEL))
+
+
+def archive_pages(pages: Iterable[List[Dict]], path: str, jql: str) -> Iterator[List[Dict]]:
+    """Пропускает поток страниц дальше, по пути дописывая каждую в архив"""
+    start_at = 0
+    for issues in pages:
+        write_page(path, jql, start_at, issues)
+        start_at += len(issues)
+        yield issues
+
+
+def read_pages(paths: Iterable[str]) -> Iterator[List[Dict]]:
+    """Отдает страницы из архивов по одной, в порядке записи.
+
+    В памяти держится только текущая страница. Оборванный или поврежденный
+    хвост архива (процесс упал посреди записи) пропускается с
+    предупреждением; остальные архивы читаются дальше.
+    """
+    for path in paths:
+        pages = 0
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        print(f"ВНИМАНИЕ: {path}: поврежденная строка после {pages} страниц - пропускаем")
+                        continue
+                    pages += 1
+                    yield record['issues']
+            except EOFError:
+                print(f"ВНИМАНИЕ: {path}: архив оборван после {pages} страниц")
+            except (gzip.BadGzipFile, zlib.error, OSError, UnicodeDecodeError) as e:
+                # Мусор на месте следующего gzip-члена (например, частично
+                # записанный заголовок) или поврежденные сжатые данные
+                print(f"ВНИМАНИЕ: {path}: архив поврежден после {pages} страниц ({e})")
+        print(f"Архив {path}: прочитано страниц {pages}")
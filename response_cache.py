@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Кэш готовых ответов тяжелых маршрутов веб-приложения (app.py).
+
+Ключ ответа - маршрут, параметры запроса и ETag версии данных
+(data_version.py), поэтому после синхронизации старые ответы просто
+перестают находиться. Чтобы они не занимали память до вытеснения, процесс
+слушает канал PostgreSQL `data_version` (LISTEN): data_version.bump шлет в
+него NOTIFY при COMMIT, и ответы изменившейся области удаляются сразу.
+
+Размер ограничен числом ответов и суммарным объемом (вместе со сжатыми
+вариантами, см. compression.py); при переполнении вытесняются давно не
+запрашивавшиеся (LRU).
+"""
+
+import os
+import time
+import select
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from data_version import CHANNEL
+
+# Сколько ждать перед повторным подключением слушателя после обрыва
+LISTEN_RETRY_MIN = 5
+LISTEN_RETRY_MAX = 300
+
+
+class CachedResponse:
+    """Готовый ответ: тело, тип, области данных и сжатые варианты тела"""
+    __slots__ = ('body', 'mimetype', 'scopes', 'variants')
+
+    def __init__(self, body: bytes, mimetype: str, scopes: Tuple[str, ...]):
+        self.body = body
+        self.mimetype = mimetype
+        self.scopes = scopes
+        # {способ сжатия: байты}, заполняется по мере запросов
+        self.variants = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.variants.values())
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> CachedResponse; порядок - от давно запрошенных к недавним
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Ответ или None; учитывается в hits/misses"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, body: bytes, mimetype: str, scopes: Tuple[str, ...]) -> CachedResponse:
+        """Сохраняет ответ; слишком большой для кэша не сохраняется"""
+        entry = CachedResponse(body, mimetype, scopes)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            self._evict()
+        return entry
+
+    def add_variant(self, key: Hashable, entry: CachedResponse, encoding: str, data: bytes):
+        """Добавляет к ответу сжатый вариант (если ответ еще в кэше)"""
+        with self._lock:
+            if self._entries.get(key) is not entry or encoding in entry.variants:
+                return
+            entry.variants[encoding] = data
+            self._bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, scope: Optional[str] = None):
+        """Удаляет ответы, зависящие от области scope (None - все)"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if scope is None or scope in entry.scopes]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class VersionListener(threading.Thread):
+    """Фоновый поток: LISTEN на канале data_version, на каждое уведомление
+    вызывает on_change(scope). После обрыва переподключается и вызывает
+    on_change(None) - пропущенные уведомления неизвестны."""
+
+    def __init__(self, on_change: Callable[[Optional[str]], None], **connect_kwargs):
+        super().__init__(name='data-version-listener', daemon=True)
+        self.on_change = on_change
+        self.connect_kwargs = connect_kwargs
+
+    def run(self):
+        self.retry = LISTEN_RETRY_MIN
+        while True:
+            try:
+                self.listen()
+            except psycopg2.Error as e:
+                print(f"Слушатель data_version: {e}; повтор через {self.retry} с")
+            self.on_change(None)
+            time.sleep(self.retry)
+            self.retry = min(self.retry * 2, LISTEN_RETRY_MAX)
+
+    def listen(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self.retry = LISTEN_RETRY_MIN
+            while True:
+                # Таймаут - чтобы обрыв без RST все равно обнаружился poll-ом
+                select.select([conn], [], [], 60)
+                conn.poll()
+                while conn.notifies:
+                    self.on_change(conn.notifies.pop(0).payload or None)
+        finally:
+            conn.close()
+
+
+_process_cache = None
+_process_cache_pid = None
+_process_cache_lock = threading.Lock()
+
+
+def process_cache(max_entries: int, max_bytes: int, **connect_kwargs) -> Optional[ResponseCache]:
+    """Кэш текущего процесса со своим слушателем data_version; создается при
+    первом обращении (после fork - заново, как db_pool.process_pool).
+    max_entries=0 - кэш отключен."""
+    global _process_cache, _process_cache_pid
+    if max_entries <= 0:
+        return None
+    pid = os.getpid()
+    if _process_cache_pid != pid:
+        with _process_cache_lock:
+            if _process_cache_pid != pid:
+                cache = ResponseCache(max_entries, max_bytes)
+                VersionListener(cache.invalidate, **connect_kwargs).start()
+                _process_cache = cache
+                _process_cache_pid = pid
+    return _process_cache
@@ -1,4 +1,6 @@
-let allIssues = [];
+let loadedIssues = [];
+let nextIssuesCursor = null;
+let issueFilterOptions = { type: [], status: [], priority: [], sprint: [] };
 let sortColumn = null;
 let sortDirection = 'asc';
 let network = null;
@@ -43,7 +45,7 @@ function sortTable(column) {
         sortColumn = column;
         sortDirection = 'asc';
     }
-    applyTableFilters();
+    loadIssuesPage();
 }
 
 let activeFilters = {
@@ -52,61 +54,62 @@ let activeFilters = {
     priority: '',
     sprint: ''
 };
-
-function applyTableFilters() {
-    activeFilters.type = document.getElementById('filterType')?.value || '';
-    activeFilters.status = document.getElementById('filterStatus')?.value || '';
-    activeFilters.priority = document.getElementById('filterPriority')?.value || '';
-    activeFilters.sprint = document.getElementById('filterSprint')?.value || '';
-
-    let filtered = allIssues.filter(issue => {
-        if (activeFilters.type && issue.issue_type !== activeFilters.type) return false;
-        if (activeFilters.status && issue.status !== activeFilters.status) return false;
-        if (activeFilters.priority && issue.priority !== activeFilters.priority) return false;
-        if (activeFilters.sprint && issue.sprint !== activeFilters.sprint) return false;
-        return true;
+let searchQuery = '';
+
+// Фильтры, сортировка и поиск выполняются на сервере: /api/issues отдает
+// задачи страницами, следующая страница запрашивается по next_cursor
+function issuesQuery(cursor) {
+    const params = new URLSearchParams();
+    Object.entries(activeFilters).forEach(([name, value]) => {
+        if (value) params.set(name, value);
     });
-
+    if (searchQuery) params.set('q', searchQuery);
     if (sortColumn) {
-        filtered = [...filtered].sort((a, b) => {
-            let aVal = a[sortColumn];
-            let bVal = b[sortColumn];
-
-            if (aVal === null || aVal === undefined || aVal === '') aVal = '';
-            if (bVal === null || bVal === undefined || bVal === '') bVal = '';
-
-            if (sortColumn === 'time_original_estimate' || sortColumn === 'time_spent') {
-                aVal = parseFloat(aVal) || 0;
-                bVal = parseFloat(bVal) || 0;
-            }
-
-            if (aVal < bVal) return sortDirection === 'asc' ? -1 : 1;
-            if (aVal > bVal) return sortDirection === 'asc' ? 1 : -1;
-            return 0;
-        });
+        params.set('sort', sortColumn);
+        params.set('dir', sortDirection);
     }
+    if (cursor) params.set('cursor', cursor);
+    return `/api/issues?${params}`;
+}
 
-    renderIssuesTable(filtered);
+async function loadIssuesPage(append = false) {
+    const response = await fetch(issuesQuery(append ? nextIssuesCursor : null));
+    const page = await response.json();
+    loadedIssues = append ? loadedIssues.concat(page.issues) : page.issues;
+    nextIssuesCursor = page.next_cursor;
+    renderIssuesTable(loadedIssues);
+}
 
-    if (document.getElementById('filterType')) {
-        document.getElementById('filterType').value = activeFilters.type;
-        document.getElementById('filterStatus').value = activeFilters.status;
-        document.getElementById('filterPriority').value = activeFilters.priority;
-        document.getElementById('filterSprint').value = activeFilters.sprint;
+async function loadMoreIssues() {
+    try {
+        await loadIssuesPage(true);
+    } catch (error) {
+        console.error('Ошибка загрузки задач:', error);
     }
 }
 
+function applyTableFilters() {
+    activeFilters.type = document.getElementById('filterType')?.value || '';
+    activeFilters.status = document.getElementById('filterStatus')?.value || '';
+    activeFilters.priority = document.getElementById('filterPriority')?.value || '';
+    activeFilters.sprint = document.getElementById('filterSprint')?.value || '';
+    loadIssuesPage();
+}
+
 function clearTableFilters() {
     activeFilters = { type: '', status: '', priority: '', sprint: '' };
     sortColumn = null;
     sortDirection = 'asc';
-    renderIssuesTable(allIssues);
+    loadIssuesPage();
 }
 
+// Первый экран строится из одного ответа /api/bootstrap (карточки, спринты,
+// текущий спринт, значения фильтров), а список задач догружается следом
 async function loadData() {
     try {
-        const statsResponse = await fetch('/api/statistics');
-        const stats = await statsResponse.json();
+        const response = await fetch('/api/bootstrap');
+        const data = await response.json();
+        const stats = data.statistics;
 
         document.getElementById('totalIssues').textContent = stats.total;
         document.getElementById('totalLinks').textContent = stats.total_links;
@@ -117,19 +120,17 @@ async function loadData() {
         document.getElementById('inProgress').textContent = inProgressCount;
         document.getElementById('completed').textContent = completedCount;
 
-        const issuesResponse = await fetch('/api/issues');
-        allIssues = await issuesResponse.json();
+        if (data.last_synced) {
+            document.getElementById('lastSync').textContent =
+                `Последняя синхронизация: ${data.last_synced}`;
+        }
 
-        renderIssuesTable(allIssues);
         renderSprintsTable(stats.by_sprint);
         renderStatusTable(stats.by_status);
+        renderSprintStats(data.current_sprint);
 
-        if (allIssues.length > 0) {
-            document.getElementById('lastSync').textContent =
-                `Последняя синхронизация: ${allIssues[0].last_synced}`;
-        }
-
-        await loadSprintStats();
+        issueFilterOptions = data.issue_filters;
+        await loadIssuesPage();
 
     } catch (error) {
         console.error('Ошибка загрузки данных:', error);
@@ -140,41 +141,42 @@ async function loadData() {
 async function loadSprintStats() {
     try {
         const response = await fetch('/api/current-sprint-stats');
-        const stats = await response.json();
-
-        if (stats.error) {
-            document.getElementById('sprintLoadPercent').textContent = 'N/A';
-            document.getElementById('sprintName').textContent = 'Нет данных';
-            return;
-        }
-
-        document.getElementById('sprintLoadPercent').textContent = `${stats.workload_percent}%`;
-        document.getElementById('sprintName').textContent = stats.sprint_name;
-
-        const icon = document.getElementById('sprintLoadIcon');
-        const card = document.getElementById('sprintLoadCard');
-
-        if (stats.workload_status === 'overloaded') {
-            icon.textContent = '🔴';
-            card.style.borderLeft = '5px solid #e74c3c';
-        } else if (stats.workload_status === 'full') {
-            icon.textContent = '🟡';
-            card.style.borderLeft = '5px solid #f39c12';
-        } else if (stats.workload_status === 'normal') {
-            icon.textContent = '🟢';
-            card.style.borderLeft = '5px solid #27ae60';
-        } else {
-            icon.textContent = '⚪';
-            card.style.borderLeft = '5px solid #95a5a6';
-        }
-
-        renderSprintLoadDetails(stats);
-
+        renderSprintStats(await response.json());
     } catch (error) {
         console.error('Ошибка загрузки статистики спринта:', error);
     }
 }
 
+function renderSprintStats(stats) {
+    if (stats.error) {
+        document.getElementById('sprintLoadPercent').textContent = 'N/A';
+        document.getElementById('sprintName').textContent = 'Нет данных';
+        return;
+    }
+
+    document.getElementById('sprintLoadPercent').textContent = `${stats.workload_percent}%`;
+    document.getElementById('sprintName').textContent = stats.sprint_name;
+
+    const icon = document.getElementById('sprintLoadIcon');
+    const card = document.getElementById('sprintLoadCard');
+
+    if (stats.workload_status === 'overloaded') {
+        icon.textContent = '🔴';
+        card.style.borderLeft = '5px solid #e74c3c';
+    } else if (stats.workload_status === 'full') {
+        icon.textContent = '🟡';
+        card.style.borderLeft = '5px solid #f39c12';
+    } else if (stats.workload_status === 'normal') {
+        icon.textContent = '🟢';
+        card.style.borderLeft = '5px solid #27ae60';
+    } else {
+        icon.textContent = '⚪';
+        card.style.borderLeft = '5px solid #95a5a6';
+    }
+
+    renderSprintLoadDetails(stats);
+}
+
 function renderSprintLoadDetails(stats) {
     const statusText = {
         'light': 'Лёгкая загрузка',
@@ -309,10 +311,10 @@ function getRecommendations(stats) {
 }
 
 function renderIssuesTable(issues) {
-    const types = [...new Set(allIssues.map(i => i.issue_type).filter(Boolean))].sort();
-    const statuses = [...new Set(allIssues.map(i => i.status).filter(Boolean))].sort();
-    const priorities = [...new Set(allIssues.map(i => i.priority).filter(Boolean))].sort();
-    const sprints = [...new Set(allIssues.map(i => i.sprint).filter(Boolean))].sort().reverse();
+    const types = issueFilterOptions.type;
+    const statuses = issueFilterOptions.status;
+    const priorities = issueFilterOptions.priority;
+    const sprints = issueFilterOptions.sprint;
 
     const html = `
 <div style="display: flex; gap: 10px; margin-bottom: 20px; flex-wrap: wrap; align-items: center;">
@@ -369,8 +371,16 @@ function renderIssuesTable(issues) {
             `).join('')}
         </tbody>
     </table>
-</div>`;
+</div>
+${nextIssuesCursor ? `
+<div style="text-align: center; margin-top: 15px;">
+    <button onclick="loadMoreIssues()" class="refresh-btn" style="padding: 10px 20px;">⬇ Показать ещё</button>
+</div>` : ''}`;
     document.getElementById('issuesTable').innerHTML = html;
+
+    ['Type', 'Status', 'Priority', 'Sprint'].forEach(name => {
+        document.getElementById(`filter${name}`).value = activeFilters[name.toLowerCase()];
+    });
 }
 
 function renderSprintsTable(sprints) {
@@ -501,44 +511,14 @@ function showIssueDetails(issueKey) {
 
 document.addEventListener('DOMContentLoaded', () => {
     const searchBox = document.getElementById('searchBox');
+    let searchTimer = null;
+    // Поиск тоже серверный - ждем паузы в наборе, чтобы не слать запрос на каждую букву
     searchBox.addEventListener('input', (e) => {
-        const query = e.target.value.toLowerCase();
-        let filtered = allIssues.filter(issue => {
-            if (activeFilters.type && issue.issue_type !== activeFilters.type) return false;
-            if (activeFilters.status && issue.status !== activeFilters.status) return false;
-            if (activeFilters.priority && issue.priority !== activeFilters.priority) return false;
-            if (activeFilters.sprint && issue.sprint !== activeFilters.sprint) return false;
-            return true;
-        });
-        if (query) {
-            filtered = filtered.filter(issue =>
-                issue.issue_key.toLowerCase().includes(query) ||
-                (issue.summary && issue.summary.toLowerCase().includes(query)) ||
-                (issue.assignee && issue.assignee.toLowerCase().includes(query))
-            );
-        }
-        if (sortColumn) {
-            filtered = [...filtered].sort((a, b) => {
-                let aVal = a[sortColumn];
-                let bVal = b[sortColumn];
-                if (aVal === null || aVal === undefined || aVal === '') aVal = '';
-                if (bVal === null || bVal === undefined || bVal === '') bVal = '';
-                if (sortColumn === 'time_original_estimate' || sortColumn === 'time_spent') {
-                    aVal = parseFloat(aVal) || 0;
-                    bVal = parseFloat(bVal) || 0;
-                }
-                if (aVal < bVal) return sortDirection === 'asc' ? -1 : 1;
-                if (aVal > bVal) return sortDirection === 'asc' ? 1 : -1;
-                return 0;
-            });
-        }
-        renderIssuesTable(filtered);
-        if (document.getElementById('filterType')) {
-            document.getElementById('filterType').value = activeFilters.type;
-            document.getElementById('filterStatus').value = activeFilters.status;
-            document.getElementById('filterPriority').value = activeFilters.priority;
-            document.getElementById('filterSprint').value = activeFilters.sprint;
-        }
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            searchQuery = e.target.value.trim();
+            loadIssuesPage();
+        }, 300);
     });
 });
 
@@ -584,73 +564,15 @@ async function loadSEOTasks() {
 
 loadData();
 
+// Граф целиком тяжел для vis.js на тысячах узлов, поэтому можно открыть
+// окрестность одной задачи: /api/graph/neighborhood (двойной клик по узлу
+// или поле "Ключ задачи" над графом)
 async function loadGraphVisualization() {
     try {
         const response = await fetch('/api/graph');
         const data = await response.json();
         graphData = data;
-
-        const nodes = data.nodes.map(node => {
-            const tooltip = [
-                `${node.issue_key}`,
-                `Название: ${node.summary || '-'}`,
-                `Статус: ${node.status || '-'}`,
-                `Тип: ${node.issue_type || '-'}`,
-                `Приоритет: ${node.priority || '-'}`,
-                `Исполнитель: ${node.assignee || '-'}`
-            ].join('\n');
-
-            let shape = 'box';
-            let borderWidth = 2;
-            const issueType = (node.issue_type || '').toLowerCase();
-
-            if (issueType.includes('epic') || issueType === 'эпик') {
-                shape = 'hexagon';
-                borderWidth = 3;
-            } else if (issueType.includes('story') || issueType.includes('история')) {
-                shape = 'ellipse';
-                borderWidth = 2;
-            } else {
-                shape = 'box';
-                borderWidth = 2;
-            }
-
-            return {
-                id: node.issue_key,
-                label: node.issue_key,
-                title: tooltip,
-                color: {
-                    background: getNodeColor(node.status),
-                    border: getNodeBorderColor(node.status),
-                    highlight: {
-                        background: getNodeColor(node.status),
-                        border: '#667eea'
-                    },
-                    hover: {
-                        background: getNodeColor(node.status),
-                        border: '#667eea'
-                    }
-                },
-                font: { size: 12, color: '#333', bold: true },
-                shape: shape,
-                margin: 10,
-                borderWidth: borderWidth,
-                borderWidthSelected: 4
-            };
-        });
-
-        const edges = data.edges.map((edge, idx) => ({
-            id: idx,
-            from: edge.source_issue_key,
-            to: edge.target_issue_key,
-            label: edge.direction_label,
-            arrows: 'to',
-            color: edge.direction === 'inward' ? '#e74c3c' : '#3498db',
-            font: { size: 9 },
-            smooth: { type: 'curvedCW', roundness: 0.15 }
-        }));
-
-        renderGraph(nodes, edges);
+        renderGraph(toGraphNodes(data.nodes), toGraphEdges(data.edges));
 
     } catch (error) {
         console.error('Ошибка загрузки графа:', error);
@@ -659,6 +581,94 @@ async function loadGraphVisualization() {
     }
 }
 
+async function loadFocusedGraph(issueKey) {
+    issueKey = (issueKey || document.getElementById('graphFocusKey')?.value || '').trim().toUpperCase();
+    if (!issueKey) return;
+    const depth = document.getElementById('graphFocusDepth')?.value || 2;
+    try {
+        const response = await fetch(`/api/graph/neighborhood/${encodeURIComponent(issueKey)}?depth=${depth}`);
+        const data = await response.json();
+        if (!response.ok) {
+            alert(response.status === 404 ? `Задача ${issueKey} не найдена` : `Ошибка: ${data.error}`);
+            return;
+        }
+        graphData = data;
+        renderGraph(toGraphNodes(data.nodes, data.root), toGraphEdges(data.edges), data.truncated);
+        document.getElementById('graphFocusKey').value = issueKey;
+    } catch (error) {
+        console.error('Ошибка загрузки окрестности задачи:', error);
+    }
+}
+
+function toGraphNodes(graphNodes, rootKey = null) {
+    return graphNodes.map(node => {
+        const tooltip = [
+            `${node.issue_key}`,
+            `Название: ${node.summary || '-'}`,
+            `Статус: ${node.status || '-'}`,
+            `Тип: ${node.issue_type || '-'}`,
+            `Приоритет: ${node.priority || '-'}`,
+            `Исполнитель: ${node.assignee || '-'}`
+        ].join('\n');
+
+        let shape = 'box';
+        let borderWidth = 2;
+        const issueType = (node.issue_type || '').toLowerCase();
+
+        if (issueType.includes('epic') || issueType === 'эпик') {
+            shape = 'hexagon';
+            borderWidth = 3;
+        } else if (issueType.includes('story') || issueType.includes('история')) {
+            shape = 'ellipse';
+            borderWidth = 2;
+        } else {
+            shape = 'box';
+            borderWidth = 2;
+        }
+
+        // Задача, вокруг которой построена окрестность, выделяется
+        const isRoot = node.issue_key === rootKey;
+
+        return {
+            id: node.issue_key,
+            label: node.issue_key,
+            title: tooltip,
+            color: {
+                background: getNodeColor(node.status),
+                border: isRoot ? '#667eea' : getNodeBorderColor(node.status),
+                highlight: {
+                    background: getNodeColor(node.status),
+                    border: '#667eea'
+                },
+                hover: {
+                    background: getNodeColor(node.status),
+                    border: '#667eea'
+                }
+            },
+            font: { size: isRoot ? 16 : 12, color: '#333', bold: true },
+            shape: shape,
+            margin: 10,
+            borderWidth: isRoot ? 5 : borderWidth,
+            borderWidthSelected: 4,
+            // Координаты из раскладки на сервере (только у полного графа)
+            ...(node.x !== undefined ? { x: node.x, y: node.y } : {})
+        };
+    });
+}
+
+function toGraphEdges(graphEdges) {
+    return graphEdges.map((edge, idx) => ({
+        id: idx,
+        from: edge.source_issue_key,
+        to: edge.target_issue_key,
+        label: edge.direction_label,
+        arrows: 'to',
+        color: edge.direction === 'inward' ? '#e74c3c' : '#3498db',
+        font: { size: 9 },
+        smooth: { type: 'curvedCW', roundness: 0.15 }
+    }));
+}
+
 function getNodeColor(status) {
     if (!status) return '#dfe6e9';
     const s = status.toLowerCase();
@@ -677,7 +687,7 @@ function getNodeBorderColor(status) {
     return '#b2bec3';
 }
 
-function renderGraph(nodes, edges) {
+function renderGraph(nodes, edges, truncated = false) {
     const container = document.getElementById('graphContainer');
     if (!container) {
         const linksDiv = document.getElementById('linksTable');
@@ -685,10 +695,19 @@ function renderGraph(nodes, edges) {
             <div style="margin-bottom: 20px; display: flex; gap: 10px; align-items: center;">
                 <button onclick="fitGraph()" class="refresh-btn">📐 По размеру экрана</button>
                 <button onclick="toggleGraphPhysics()" class="refresh-btn">⚡ Физика: <span id="physicsStatus">ВКЛ</span></button>
+                <input id="graphFocusKey" type="text" placeholder="Ключ задачи"
+                       onkeydown="if (event.key === 'Enter') loadFocusedGraph()"
+                       style="padding: 8px; border: 1px solid #ddd; border-radius: 6px; width: 130px;">
+                <select id="graphFocusDepth" style="padding: 8px; border: 1px solid #ddd; border-radius: 6px;">
+                    <option value="1">1 шаг</option>
+                    <option value="2" selected>2 шага</option>
+                    <option value="3">3 шага</option>
+                    <option value="4">4 шага</option>
+                </select>
+                <button onclick="loadFocusedGraph()" class="refresh-btn">🎯 Окрестность</button>
+                <button onclick="loadGraphVisualization()" class="refresh-btn">🌐 Весь граф</button>
                 <div style="flex: 1;"></div>
-                <div style="background: #f9f9f9; padding: 10px 20px; border-radius: 8px;">
-                    <strong>Узлов:</strong> ${nodes.length} | <strong>Связей:</strong> ${edges.length}
-                </div>
+                <div id="graphCounts" style="background: #f9f9f9; padding: 10px 20px; border-radius: 8px;"></div>
             </div>
             <div id="graphContainer" style="width: 100%; height: 600px; border: 2px solid #e0e0e0; border-radius: 10px;"></div>
             
@@ -760,8 +779,16 @@ function renderGraph(nodes, edges) {
         `;
     }
 
+    document.getElementById('graphCounts').innerHTML =
+        `<strong>Узлов:</strong> ${nodes.length} | <strong>Связей:</strong> ${edges.length}` +
+        (truncated ? ' (показана часть)' : '');
+
     const graphContainer = document.getElementById('graphContainer');
 
+    // Если сервер уже разложил граф, физика не нужна - граф рисуется сразу
+    const positioned = nodes.length > 0 && nodes.every(n => n.x !== undefined);
+    document.getElementById('physicsStatus').textContent = positioned ? 'ВЫКЛ' : 'ВКЛ';
+
     const data = {
         nodes: new vis.DataSet(nodes),
         edges: new vis.DataSet(edges)
@@ -778,7 +805,7 @@ function renderGraph(nodes, edges) {
             arrows: { to: { enabled: true, scaleFactor: 0.4 } }
         },
         physics: {
-            enabled: true,
+            enabled: !positioned,
             stabilization: { iterations: 200 },
             barnesHut: {
                 gravitationalConstant: -10000,
@@ -795,7 +822,7 @@ function renderGraph(nodes, edges) {
             keyboard: true
         },
         layout: {
-            improvedLayout: true
+            improvedLayout: !positioned
         }
     };
 
@@ -853,6 +880,12 @@ function renderGraph(nodes, edges) {
             showIssueDetails(nodeId);
         }
     });
+
+    network.on('doubleClick', function (params) {
+        if (params.nodes.length > 0) {
+            loadFocusedGraph(params.nodes[0]);
+        }
+    });
 }
 
 function fitGraph() {
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Замеры одного запуска синхронизации: время по этапам и страницам, объемы,
+скорость записи и повторы запросов к Jira. Сохраняются в таблицу sync_runs,
+откуда их отдает /api/sync-status (app.py).
+
+Этапы:
+    fetch - сколько обработка простаивала в ожидании страниц из Jira
+            (страницы грузятся в фоне, поэтому это не время HTTP-запросов -
+            оно отдельно, http_seconds, суммой по страницам);
+    parse - разбор страниц в строки (jira_parser.parse_issues);
+    db    - запись пачек в PostgreSQL, включая COMMIT.
+"""
+
+import time
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+# Поля sync_runs, которые заполняет SyncMetrics.as_row
+RUN_COLUMNS = (
+    'jql', 'mode', 'status', 'error', 'started_at', 'finished_at', 'duration_seconds',
+    'fetch_seconds', 'parse_seconds', 'db_seconds', 'http_seconds', 'pages', 'bytes',
+    'issues_fetched', 'issues_saved', 'inserted', 'changed', 'unchanged', 'deleted',
+    'db_rows', 'http_requests', 'http_retries', 'http_throttled', 'page_timings'
+)
+
+INSERT_RUN_SQL = f"""
+INSERT INTO sync_runs ({', '.join(RUN_COLUMNS)})
+VALUES ({', '.join(['%s'] * len(RUN_COLUMNS))})
+"""
+
+
+class SyncMetrics:
+    def __init__(self, jql: Optional[str], mode: str, http_stats: Optional[Dict] = None):
+        """mode - full / incremental / replay / reconcile. http_stats - счетчики
+        JiraHttpClient на старте: в итог идет разница (клиент может быть общим)."""
+        self.jql = jql
+        self.mode = mode
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self.duration = 0.0
+        self.status = 'running'
+        self.error = None
+
+        self.phases = {'fetch': 0.0, 'parse': 0.0, 'db': 0.0}
+        self.counts = {'issues_saved': 0, 'inserted': 0, 'changed': 0, 'unchanged': 0,
+                       'deleted': 0, 'db_rows': 0}
+        # Страницы приходят из потоков загрузки - их учет под блокировкой
+        self.pages = []
+        self._lock = threading.Lock()
+        self._http_before = http_stats or {}
+        self.http = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - started
+
+    def add_page(self, start_at: int, issues: int, size: int, seconds: float):
+        with self._lock:
+            self.pages.append({'start_at': start_at, 'issues': issues,
+                               'bytes': size, 'seconds': round(seconds, 3)})
+
+    def finish(self, status: str, error: Optional[str] = None, http_stats: Optional[Dict] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now()
+        self.duration = time.perf_counter() - self._started
+        if http_stats:
+            self.http = {name: http_stats[name] - self._http_before.get(name, 0)
+                         for name in ('requests', 'retries', 'throttled')}
+
+    def as_row(self) -> tuple:
+        with self._lock:
+            pages = sorted(self.pages, key=lambda page: page['start_at'])
+        values = {
+            'jql': self.jql,
+            'mode': self.mode,
+            'status': self.status,
+            'error': self.error,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at or datetime.now(),
+            'duration_seconds': round(self.duration, 3),
+            'fetch_seconds': round(self.phases['fetch'], 3),
+            'parse_seconds': round(self.phases['parse'], 3),
+            'db_seconds': round(self.phases['db'], 3),
+            'http_seconds': round(sum(page['seconds'] for page in pages), 3),
+            'pages': len(pages),
+            'bytes': sum(page['bytes'] for page in pages),
+            'issues_fetched': sum(page['issues'] for page in pages),
+            'http_requests': self.http.get('requests'),
+            'http_retries': self.http.get('retries'),
+            'http_throttled': self.http.get('throttled'),
+            'page_timings': json.dumps(pages),
+            **self.counts,
+        }
+        return tuple(values[column] for column in RUN_COLUMNS)
+
+    def report(self):
+        """Печатает сводку по этапам"""
+        row = dict(zip(RUN_COLUMNS, self.as_row()))
+        rate = row['issues_saved'] / self.duration if self.duration else 0
+        print(f"Этапы: ожидание Jira {row['fetch_seconds']:.2f} с, разбор {row['parse_seconds']:.2f} с, "
+              f"запись в БД {row['db_seconds']:.2f} с; всего {self.duration:.2f} с ({rate:,.0f} задач/с)")
+        if row['pages']:
+            print(f"Страниц: {row['pages']}, {row['bytes'] / 1024 / 1024:.1f} МБ, "
+                  f"HTTP {row['http_seconds']:.2f} с суммарно")
+        if self.http:
+            print(f"Запросов к Jira: {self.http['requests']}, повторов: {self.http['retries']} "
+                  f"(из них 429: {self.http['throttled']})")